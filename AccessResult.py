@@ -0,0 +1,23 @@
+'''
+File: AccessResult.py
+
+AccessResult class: the outcome of one cache access (read or write), which the
+cache's printing wrappers format into the simulator's output
+'''
+
+class AccessResult:
+  __slots__ = ("isWrite", "address", "setIndex", "tag", "offset", "hit", "evictionLine", "ramAddress", "data", "dirty")
+
+  def __init__(self, isWrite, address, setIndex, tag, offset):
+    self.isWrite = isWrite
+    self.address = address
+    self.setIndex = setIndex
+    self.tag = tag
+    self.offset = offset
+    self.hit = False
+    # Line the data was placed in on a miss (-1 on a hit or when no line was allocated)
+    self.evictionLine = -1
+    # Address RAM was accessed at (-1 if RAM was not accessed)
+    self.ramAddress = -1
+    self.data = 0
+    self.dirty = 0
@@ -6,31 +6,60 @@ Section: 511
 E-mail: burdick.alex@tamu.edu, dean27@tamu.edu
 
 CacheEntry class: represents a cache line, which has a valid bit, dirty bit,
-tag, and a computed amount of data blocks
+tag, and a computed amount of data blocks.
+An entry is a view over line number "line" of the cache's line arrays
 '''
 
 class CacheEntry:
-  def __init__(self, tag, blockSize):
-    self.valid = 0
-    self.dirty = 0
-    self.tag = tag
-    self.blocks = ["00"] * blockSize
+  __slots__ = ("cache", "line")
+
+  def __init__(self, cache, line):
+    self.cache = cache
+    self.line = line
+
+  @property
+  def valid(self):
+    return self.cache.valid[self.line]
+
+  @valid.setter
+  def valid(self, value):
+    self.cache.valid[self.line] = value
+
+  @property
+  def dirty(self):
+    return self.cache.dirty[self.line]
+
+  @dirty.setter
+  def dirty(self, value):
+    self.cache.dirty[self.line] = value
+
+  @property
+  def tag(self):
+    return self.cache.tags[self.line]
+
+  @tag.setter
+  def tag(self, value):
+    self.cache.tags[self.line] = value
+
+  # The line's data as a list of hex bytes ("0A")
+  @property
+  def blocks(self):
+    start = self.line * self.cache.blockSize
+    return self.cache.data[start:start + self.cache.blockSize].hex(" ").upper().split(" ")
 
 
   # Formatted output of this cache line
-  def printLine(self):
-    print(str(self.valid) + " " + str(self.dirty) + " " + self.tag, end=" ")
-    for i in range(len(self.blocks)):
-      print(self.blocks[i], end=" ")
+  def printLine(self, tagDigits=2):
+    print(str(self.valid) + " " + str(self.dirty) + " " + "{:X}".format(self.tag).zfill(tagDigits), end=" ")
+    print(" ".join(self.blocks), end=" ")
     print()
   
 
   # Return line's byte at offset
   def readByte(self, offset):
-    return self.blocks[offset]
+    return self.cache.data[self.line * self.cache.blockSize + offset]
 
 
   # Set the line's byte at offset
   def setByte(self, offset, newByte):
-    self.blocks[offset] = newByte
-
+    self.cache.data[self.line * self.cache.blockSize + offset] = newByte
@@ -5,33 +5,76 @@ Date: 04/30/2020
 Section: 511
 E-mail: burdick.alex@tamu.edu, dean27@tamu.edu
 
-Set class: Represents a set in the cache, which contains lines (cache entries)
+Set class: Represents a set in the cache, which contains lines (cache entries).
+A set is a view over the cache's line arrays: lines setIndex * E to setIndex * E + E - 1.
+SetList is the cache's list of sets, making each view the first time it is looked at
 '''
 
 from CacheEntry import CacheEntry
+from replacement import RecencyList, FrequencyBuckets
 
 class Set:
-  def __init__(self, associativity, blockSize):
-    self.associativity = associativity
-    # Use bit is for an LRU replacement policy
-    self.use = ""
-    for i in range(self.associativity):
-      self.use += str(i)
-      
-    # Count the uses of each line for an LFU replacement policy
-    self.timesUsed = [0] * self.associativity
-    
-    # The lines contained in the set, must add new CacheEntry objects to the array for it to work
-    self.lines = []
-    for i in range(self.associativity):
-      line = CacheEntry("00", blockSize)
-      self.lines.append(line)
+  __slots__ = ("cache", "index", "associativity", "firstLine")
+
+  def __init__(self, cache, index):
+    self.cache = cache
+    self.index = index
+    self.associativity = cache.associativity
+    self.firstLine = index * cache.associativity
+
+
+  # The lines contained in the set
+  @property
+  def lines(self):
+    return [CacheEntry(self.cache, self.firstLine + i) for i in range(self.associativity)]
+
+
+  # Use order for an LRU (or FIFO) replacement policy: way numbers from least to most recently used (filled)
+  @property
+  def use(self):
+    if not isinstance(self.cache.replacement, RecencyList):
+      return []
+    return self.cache.replacement.order(self.index)
+
+
+  # The uses of each line for an LFU replacement policy
+  @property
+  def timesUsed(self):
+    if not isinstance(self.cache.replacement, FrequencyBuckets):
+      return []
+    return self.cache.replacement.setCounts(self.index)
 
 
   # Formatted output of this set
-  def printSet(self):
-    for i in range(self.associativity):
-      self.lines[i].printLine()
+  def printSet(self, tagDigits=2):
+    for line in self.lines:
+      line.printLine(tagDigits)
+
+
+class SetList:
+  def __init__(self, cache):
+    self.cache = cache
+    self.views = {}
+
+
+  def __len__(self):
+    return self.cache.numSets
+
 
+  # The view of set index, with the sets left over from before a flush cleared first
+  def __getitem__(self, index):
+    if index < 0:
+      index += self.cache.numSets
+    if not 0 <= index < self.cache.numSets:
+      raise IndexError("set index out of range")
+    self.cache.clearStaleSets()
+    view = self.views.get(index)
+    if view is None:
+      view = Set(self.cache, index)
+      self.views[index] = view
+    return view
 
 
+  def __iter__(self):
+    for index in range(self.cache.numSets):
+      yield self[index]
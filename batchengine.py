@@ -0,0 +1,312 @@
+'''
+File: batchengine.py
+
+Batch simulation of a whole trace at once (Cache.simulateBatch): direct-mapped and LRU caches
+with NumPy array operations, anything else one Cache.access at a time
+'''
+
+from mainmemory import MainMemory
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+# Use the set-parallel LRU engine only when the trace has at least this many accesses per step
+MIN_ACCESSES_PER_STEP = 32
+
+
+class BatchResult:
+  def __init__(self, hits, numHits, numMisses, numWriteBacks):
+    # Per-access hit (True) or miss (False)
+    self.hits = hits
+    self.numHits = numHits
+    self.numMisses = numMisses
+    self.numWriteBacks = numWriteBacks
+
+
+# Simulate every access of addresses (reads, or writes where ops is nonzero) on cache, returns a BatchResult
+def simulateBatch(cache, addresses, ops=None):
+  if (np is None or len(addresses) == 0 or not isinstance(cache.ram, MainMemory) or cache.upperLevels or cache.stats is not None
+      or cache.future is not None or cache.prefetch is not None or cache.timing is not None):
+    return simulateScalar(cache, addresses, ops)
+
+  # The engines read and write the line arrays of every set the trace touches
+  cache.clearStaleSets()
+  addresses = np.asarray(addresses, dtype=np.uint64)
+  if ops is None:
+    writes = np.zeros(len(addresses), dtype=bool)
+  else:
+    writes = np.asarray(ops).astype(bool)
+
+  if cache.associativity == 1:
+    return simulateDirectMapped(cache, addresses, writes)
+  if cache.replacementPolicy == "least_recently_used":
+    result = simulateLRU(cache, addresses, writes)
+    if result is not None:
+      return result
+  return simulateScalar(cache, addresses, writes)
+
+
+# One Cache.access per address
+def simulateScalar(cache, addresses, ops):
+  hits = []
+  startHits = cache.numHits
+  startWriteBacks = cache.numWriteBacks
+  for i in range(len(addresses)):
+    isWrite = ops is not None and bool(ops[i])
+    hits.append(cache.access(int(addresses[i]), isWrite).hit)
+
+  numHits = cache.numHits - startHits
+  if np is not None:
+    hits = np.array(hits, dtype=bool)
+  return BatchResult(hits, numHits, len(addresses) - numHits, cache.numWriteBacks - startWriteBacks)
+
+
+# Sort the accesses by set (keeping trace order within a set), returns the order, the sorted sets/blocks/writes, and where each set's run starts
+def groupBySet(cache, addresses, writes):
+  blocks = addresses >> np.uint64(cache.numBlockOffsetBits)
+  sets = (blocks & np.uint64(cache.setIndexMask)).astype(np.int64)
+  order = np.argsort(sets, kind="stable")
+  sets = sets[order]
+  isGroupStart = np.empty(len(sets), dtype=bool)
+  isGroupStart[0] = True
+  isGroupStart[1:] = sets[1:] != sets[:-1]
+  return order, sets, blocks[order], writes[order], np.flatnonzero(isGroupStart)
+
+
+# Direct-mapped: the line in a set before an access is the block of the set's last access that could allocate
+def simulateDirectMapped(cache, addresses, writes):
+  order, sets, blocks, writes, groupStarts = groupBySet(cache, addresses, writes)
+  n = len(sets)
+  positions = np.arange(n)
+  noWriteAllocate = cache.writeMissPolicy == "no_write_allocate"
+  writeBack = cache.writeHitPolicy == "write_back"
+
+  # Starting line of each access's set (line number = set number when E = 1)
+  setBlockShift = np.uint64(cache.numSetIndexBits)
+  tags = np.frombuffer(cache.tags, dtype=np.uint64)
+  valid = np.frombuffer(cache.valid, dtype=np.uint8).astype(bool)
+  dirty = np.frombuffer(cache.dirty, dtype=np.uint8).astype(bool)
+  startBlock = (tags[sets] << setBlockShift) | sets.astype(np.uint64)
+  startValid = valid[sets]
+
+  # Every access except no-write-allocate writes leaves its block in the line
+  allocates = ~writes if noWriteAllocate else np.ones(n, dtype=bool)
+  groupStart = np.repeat(groupStarts, np.diff(np.append(groupStarts, n)))
+  lastAllocating = np.maximum.accumulate(np.where(allocates, positions, -1))
+  previous = np.empty(n, dtype=np.int64)
+  previous[0] = -1
+  previous[1:] = lastAllocating[:-1]
+  fromTrace = previous >= groupStart
+  residentBlock = np.where(fromTrace, blocks[np.maximum(previous, 0)], startBlock)
+  residentValid = fromTrace | startValid
+  hits = residentValid & (residentBlock == blocks)
+  fills = allocates & ~hits
+
+  # Residencies: the starting line of each set, then one per fill. Residency ids increase through the sorted trace
+  isGroupStart = np.zeros(n, dtype=bool)
+  isGroupStart[groupStarts] = True
+  residency = np.cumsum(isGroupStart.astype(np.int64) + fills) - 1
+  # The id of each set's starting residency (accesses before the set's first fill)
+  startResidency = residency[groupStarts] - fills[groupStarts]
+  isStartResidency = np.zeros(residency[-1] + 1, dtype=bool)
+  isStartResidency[startResidency] = True
+  startDirty = np.zeros(residency[-1] + 1, dtype=bool)
+  startDirty[startResidency] = dirty[sets[groupStarts]] & valid[sets[groupStarts]]
+
+  # A line is dirty if it started dirty or a write hit/filled it (write-back only)
+  residencyDirty = startDirty.copy()
+  if writeBack:
+    dirtying = writes & (hits | fills)
+    residencyDirty |= np.bincount(residency, weights=dirtying, minlength=len(residencyDirty)) > 0
+
+  # Each fill evicts the residency before it, which is in the same set: a fill at the start of a set skips over the set's (empty) starting residency
+  evicted = residency[fills] - 1
+  numWriteBacks = 0
+  if writeBack:
+    evictedValid = np.where(isStartResidency[evicted], startValid[fills], True)
+    numWriteBacks = int((residencyDirty[evicted] & evictedValid).sum())
+
+  # Final line of every set the trace touched: the last residency of the set
+  groupEnds = np.append(groupStarts[1:], n) - 1
+  finalResidency = residency[groupEnds]
+  lastFill = np.maximum.accumulate(np.where(fills, positions, -1))[groupEnds]
+  finalFromTrace = lastFill >= groupStarts
+  finalBlock = np.where(finalFromTrace, blocks[np.maximum(lastFill, 0)], startBlock[groupStarts])
+  finalValid = finalFromTrace | startValid[groupStarts]
+  finalDirty = residencyDirty[finalResidency] & finalValid
+  # A fill anywhere in a set evicted the line it started with, even when the last fill loaded the same block again
+  startEvicted = np.add.reduceat(fills.astype(np.int64), groupStarts) > 0
+  storeFinalLines(cache, sets[groupStarts], finalBlock, finalValid, finalDirty, None, startEvicted)
+
+  return finishBatch(cache, order, hits, writes, numWriteBacks)
+
+
+# LRU: each touched set keeps its lines as a stack from most to least recently used, all sets are updated together one step at a time
+def simulateLRU(cache, addresses, writes):
+  order, sets, blocks, writes, groupStarts = groupBySet(cache, addresses, writes)
+  n = len(sets)
+  groupSizes = np.diff(np.append(groupStarts, n))
+
+  # Process the sets busiest first so the sets still active at step k are always a prefix
+  busiestFirst = np.argsort(-groupSizes, kind="stable")
+  groupStarts = groupStarts[busiestFirst]
+  groupSizes = groupSizes[busiestFirst]
+  numSteps = int(groupSizes[0])
+  if numSteps * MIN_ACCESSES_PER_STEP > n:
+    return None
+  touchedSets = sets[groupStarts]
+  # Number of sets with more than k accesses, for each step k
+  activeAtStep = len(groupSizes) - np.searchsorted(groupSizes[::-1], np.arange(numSteps), side="right")
+
+  E = cache.associativity
+  noWriteAllocate = cache.writeMissPolicy == "no_write_allocate"
+  writeBack = cache.writeHitPolicy == "write_back"
+
+  # Starting stacks, walking each set's recency list from its most recently used line.
+  # Invalid lines sit at the least recently used end in the order they will be filled
+  prev = np.frombuffer(cache.replacement.prev, dtype=np.int64)
+  tail = np.frombuffer(cache.replacement.tail, dtype=np.int64)
+  stackLines = np.empty((len(touchedSets), E), dtype=np.int64)
+  line = tail[touchedSets]
+  for j in range(E):
+    stackLines[:, j] = line
+    line = prev[line]
+  tags = np.frombuffer(cache.tags, dtype=np.uint64)
+  setBlockShift = np.uint64(cache.numSetIndexBits)
+  stackBlocks = (tags[stackLines] << setBlockShift) | touchedSets.astype(np.uint64)[:, None]
+  stackValid = np.frombuffer(cache.valid, dtype=np.uint8)[stackLines].astype(bool)
+  stackDirty = np.frombuffer(cache.dirty, dtype=np.uint8)[stackLines].astype(bool)
+  # Which stack entries still hold the block their line had before the batch, and (by way) which of those lines were evicted
+  stackStarting = np.ones((len(touchedSets), E), dtype=bool)
+  startEvicted = np.zeros((len(touchedSets), E), dtype=bool)
+  firstLines = touchedSets.astype(np.int64) * E
+
+  sortedHits = np.zeros(n, dtype=bool)
+  numWriteBacks = 0
+  columns = np.arange(E)[None, :]
+  for k in range(numSteps):
+    m = int(activeAtStep[k])
+    positions = groupStarts[:m] + k
+    block = blocks[positions]
+    isWrite = writes[positions]
+
+    match = stackValid[:m] & (stackBlocks[:m] == block[:, None])
+    hit = match.any(axis=1)
+    sortedHits[positions] = hit
+
+    # Hits move their line to the front, allocating misses evict the last line and put the new block at the front
+    changes = hit | ~isWrite if noWriteAllocate else np.ones(m, dtype=bool)
+    moved = np.where(hit, match.argmax(axis=1), E - 1)
+    moved = np.where(changes, moved, 0)
+    evictions = changes & ~hit & stackValid[:m, E - 1]
+    if writeBack:
+      numWriteBacks += int((evictions & stackDirty[:m, E - 1]).sum())
+    evictedRows = np.flatnonzero(evictions & stackStarting[:m, E - 1])
+    startEvicted[evictedRows, stackLines[evictedRows, E - 1] - firstLines[evictedRows]] = True
+
+    source = np.where((columns >= 1) & (columns <= moved[:, None]), columns - 1, columns)
+    source[:, 0] = moved
+    stackLines[:m] = np.take_along_axis(stackLines[:m], source, axis=1)
+    stackBlocks[:m] = np.take_along_axis(stackBlocks[:m], source, axis=1)
+    wasDirty = np.take_along_axis(stackDirty[:m], source, axis=1)
+    stackValid[:m] = np.take_along_axis(stackValid[:m], source, axis=1)
+    stackStarting[:m] = np.take_along_axis(stackStarting[:m], source, axis=1)
+    stackStarting[:m, 0] &= hit | ~changes
+
+    # The front line now holds this access's block; it is dirty if it was (on a hit) or is written to under write-back
+    stackBlocks[:m, 0] = np.where(changes, block, stackBlocks[:m, 0])
+    stackValid[:m, 0] |= changes
+    wasDirty[:, 0] = np.where(changes, (wasDirty[:, 0] & hit) | (isWrite & writeBack), wasDirty[:, 0])
+    stackDirty[:m] = wasDirty
+
+  rows = np.arange(len(touchedSets))[:, None]
+  storeFinalLines(cache, touchedSets, stackBlocks, stackValid, stackDirty, stackLines, startEvicted[rows, stackLines - firstLines[:, None]])
+  return finishBatch(cache, order, sortedHits, writes, numWriteBacks)
+
+
+# Write the final lines of the touched sets back into the cache's arrays, line index, and recency lists.
+# For E = 1 the blocks/valid/dirty are one per set, otherwise they are stacks (most recent first) over stackLines.
+# startEvicted tells the lines whose block from before the batch was evicted during it, shaped as the blocks
+def storeFinalLines(cache, touchedSets, blocks, valid, dirty, stackLines, startEvicted):
+  if stackLines is None:
+    lines = touchedSets[:, None]
+    blocks = blocks[:, None]
+    valid = valid[:, None]
+    dirty = dirty[:, None]
+    startEvicted = startEvicted[:, None]
+  else:
+    lines = stackLines
+
+  tags = np.frombuffer(cache.tags, dtype=np.uint64)
+  oldBlocks = (tags[lines] << np.uint64(cache.numSetIndexBits)) | touchedSets.astype(np.uint64)[:, None]
+  oldValid = np.frombuffer(cache.valid, dtype=np.uint8)[lines].astype(bool)
+  oldDirty = np.frombuffer(cache.dirty, dtype=np.uint8)[lines].astype(bool)
+
+  # Update the block -> line index and load the data of lines holding a new block
+  lineOf = cache.lineOf
+  for block in oldBlocks[oldValid].tolist():
+    del lineOf[block]
+  changed = valid & ~(oldValid & (oldBlocks == blocks))
+  for line, block in zip(lines[valid].tolist(), blocks[valid].tolist()):
+    lineOf[block] = line
+  # Dirty blocks that were in the cache before the batch and got evicted still hold data RAM doesn't have,
+  # also when the line holds the same block again at the end (its data is then what RAM gets)
+  evicted = (changed | startEvicted) & oldValid & oldDirty
+  for line, block in zip(lines[evicted].tolist(), oldBlocks[evicted].tolist()):
+    start = line * cache.blockSize
+    cache.ram.writeBlock(block << cache.numBlockOffsetBits, cache.data[start:start + cache.blockSize])
+  for line, block in zip(lines[changed].tolist(), blocks[changed].tolist()):
+    start = line * cache.blockSize
+    cache.data[start:start + cache.blockSize] = cache.ram.readBlock(block << cache.numBlockOffsetBits, cache.blockSize)
+
+  tags[lines] = blocks >> np.uint64(cache.numSetIndexBits)
+  np.frombuffer(cache.valid, dtype=np.uint8)[lines] = valid
+  np.frombuffer(cache.dirty, dtype=np.uint8)[lines] = dirty
+  np.frombuffer(cache.linesInUse, dtype=np.uint64)[touchedSets] = valid.sum(axis=1)
+
+  # The replacement policy sees every line that got a new block (LFU counts restart...)
+  replacement = cache.replacement
+  for line, wasValid, block in zip(lines[changed].tolist(), oldValid[changed].tolist(), blocks[changed].tolist()):
+    replacement.fill(line // cache.associativity, line, wasValid, block)
+
+  # Relink each set's recency list from its stack: the front is the most recently used line
+  if cache.replacementPolicy == "least_recently_used" and stackLines is not None:
+    prev = np.frombuffer(replacement.prev, dtype=np.int64)
+    next = np.frombuffer(replacement.next, dtype=np.int64)
+    prev[lines[:, :-1]] = lines[:, 1:]
+    prev[lines[:, -1]] = -1
+    next[lines[:, 1:]] = lines[:, :-1]
+    next[lines[:, 0]] = -1
+    np.frombuffer(replacement.tail, dtype=np.int64)[touchedSets] = lines[:, 0]
+    np.frombuffer(replacement.head, dtype=np.int64)[touchedSets] = lines[:, -1]
+
+
+# Put the per-access hits (computed in set order) back in trace order and update the cache's counters, memory traffic included
+def finishBatch(cache, order, sortedHits, sortedWrites, numWriteBacks):
+  hits = np.empty(len(order), dtype=bool)
+  hits[order] = sortedHits
+  numHits = int(hits.sum())
+  numMisses = len(hits) - numHits
+  cache.numHits += numHits
+  cache.numMisses += numMisses
+  cache.numWriteBacks += numWriteBacks
+
+  # Misses fill a line except no-write-allocate write misses, which write their byte through like write-through writes do
+  numWrites = int(sortedWrites.sum())
+  numWriteMisses = int((sortedWrites & ~sortedHits).sum())
+  if cache.writeMissPolicy == "no_write_allocate":
+    numFills = numMisses - numWriteMisses
+    numWriteThroughs = numWriteMisses
+    numAllocatedWrites = numWrites - numWriteMisses
+  else:
+    numFills = numMisses
+    numWriteThroughs = 0
+    numAllocatedWrites = numWrites
+  if cache.writeHitPolicy == "write_through":
+    numWriteThroughs += numAllocatedWrites
+  cache.numFillBytes += numFills * cache.blockSize
+  cache.numWriteThroughBytes += numWriteThroughs
+  cache.numWriteBackBytes += numWriteBacks * cache.blockSize
+  return BatchResult(hits, numHits, numMisses, numWriteBacks)
@@ -0,0 +1,6 @@
+'''
+File: benchmarks/__init__.py
+
+Benchmark suite: seeded synthetic trace generators and a runner that times the simulator
+on them, so that two revisions of the simulator can be compared
+'''
@@ -0,0 +1,125 @@
+'''
+File: benchmarks/generators.py
+
+Synthetic access patterns for benchmarking (sequential, strided, uniform, zipfian, pointer
+chasing, looping), each deterministic for a given seed
+'''
+
+from array import array
+from bisect import bisect
+import argparse
+import itertools
+import random
+
+PATTERNS = ["sequential", "strided", "uniform", "zipfian", "pointer_chasing", "looping"]
+
+# Share of accesses that are writes
+WRITE_RATIO = 0.3
+# Distance between the accesses of the strided pattern, size of the blocks of the zipfian pattern and of the nodes of the pointer-chasing pattern
+STRIDE = 64
+# Skew of the zipfian pattern (the k-th most popular block is chosen with weight 1 / k ** ZIPF_EXPONENT)
+ZIPF_EXPONENT = 1.0
+# The looping working set and the pointer-chasing structure take this fraction of the memory
+WORKING_SET_FRACTION = 8
+
+
+def sequential(numAccesses, memorySize, rng):
+  for i in range(numAccesses):
+    yield i % memorySize
+
+
+def strided(numAccesses, memorySize, rng):
+  for i in range(numAccesses):
+    yield (i * STRIDE) % memorySize
+
+
+def uniform(numAccesses, memorySize, rng):
+  for i in range(numAccesses):
+    yield rng.randrange(memorySize)
+
+
+def zipfian(numAccesses, memorySize, rng):
+  numBlocks = max(1, memorySize // STRIDE)
+  cumulativeWeights = list(itertools.accumulate(1.0 / rank ** ZIPF_EXPONENT for rank in range(1, numBlocks + 1)))
+  # Popularity rank to block, so the hot blocks are spread over the memory rather than all at its start
+  blocks = list(range(numBlocks))
+  rng.shuffle(blocks)
+  total = cumulativeWeights[-1]
+  blockSize = min(STRIDE, memorySize)
+  for i in range(numAccesses):
+    rank = min(bisect(cumulativeWeights, rng.random() * total), numBlocks - 1)
+    yield blocks[rank] * blockSize + rng.randrange(blockSize)
+
+
+def pointerChasing(numAccesses, memorySize, rng):
+  numNodes = max(1, memorySize // WORKING_SET_FRACTION // STRIDE)
+  # Sattolo's algorithm: a random permutation that is a single cycle, so the chase visits every node
+  nextNode = list(range(numNodes))
+  for i in range(numNodes - 1, 0, -1):
+    j = rng.randrange(i)
+    nextNode[i], nextNode[j] = nextNode[j], nextNode[i]
+  node = 0
+  for i in range(numAccesses):
+    yield node * STRIDE
+    node = nextNode[node]
+
+
+def looping(numAccesses, memorySize, rng):
+  workingSetSize = max(1, memorySize // WORKING_SET_FRACTION)
+  for i in range(numAccesses):
+    yield (i * 8) % workingSetSize
+
+
+GENERATORS = {
+  "sequential": sequential,
+  "strided": strided,
+  "uniform": uniform,
+  "zipfian": zipfian,
+  "pointer_chasing": pointerChasing,
+  "looping": looping,
+}
+
+
+# numAccesses accesses of the pattern over a memory of addressWidth bits, as (addresses, ops, data) flat arrays
+def generateTrace(pattern, numAccesses, addressWidth, seed=0, writeRatio=WRITE_RATIO):
+  if pattern not in GENERATORS:
+    raise ValueError("Unknown access pattern: " + str(pattern))
+  rng = random.Random(seed)
+  addresses = array("Q", GENERATORS[pattern](numAccesses, 2 ** addressWidth, rng))
+  ops = bytearray(numAccesses)
+  data = bytearray(numAccesses)
+  for i in range(numAccesses):
+    if rng.random() < writeRatio:
+      ops[i] = 1
+      data[i] = rng.randrange(256)
+  return addresses, ops, data
+
+
+# Write a generated trace as cache-read/cache-write commands
+def writeTrace(fileName, addresses, ops, data, addressWidth):
+  digits = (addressWidth + 3) // 4
+  with open(fileName, "w") as traceFile:
+    for i in range(len(ops)):
+      address = "0x" + "{:0{}X}".format(addresses[i], digits)
+      if ops[i]:
+        traceFile.write("cache-write " + address + " 0x" + "{:02X}".format(data[i]) + "\n")
+      else:
+        traceFile.write("cache-read " + address + "\n")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Synthetic trace generator")
+  parser.add_argument("pattern", choices=PATTERNS)
+  parser.add_argument("--accesses", type=int, default=100000)
+  parser.add_argument("--address-width", dest="addressWidth", type=int, default=16)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--write-ratio", dest="writeRatio", type=float, default=WRITE_RATIO)
+  parser.add_argument("--output", required=True, help="trace file to write")
+  args = parser.parse_args()
+
+  addresses, ops, data = generateTrace(args.pattern, args.accesses, args.addressWidth, args.seed, args.writeRatio)
+  writeTrace(args.output, addresses, ops, data, args.addressWidth)
+
+
+if __name__ == "__main__":
+  main()
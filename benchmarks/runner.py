@@ -0,0 +1,156 @@
+'''
+File: benchmarks/runner.py
+
+Benchmark runner: times every generated pattern on every cache configuration, saves the
+results as JSON and compares them with an earlier results file
+'''
+
+from benchmarks.generators import PATTERNS, generateTrace
+from cache import Cache
+from mainmemory import MainMemory
+from replacement import POLICY_NUMBERS
+from sweep import isValidConfig
+import argparse
+import itertools
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+
+# The configuration values of every run, in the order Cache takes them (the pattern comes first)
+CONFIG_FIELDS = ["cacheSize", "blockSize", "associativity", "replacementPolicy", "writeHitPolicy", "writeMissPolicy"]
+
+
+# Replay a generated trace on one configuration, returns the best time of numRepeats runs and the hit rate
+def timeConfig(config, trace, addressWidth, seed, numRepeats):
+  addresses, ops, data = trace
+  best = None
+  for repeat in range(numRepeats):
+    random.seed(seed)
+    ourCache = Cache(MainMemory(addressWidth), *[config[name] for name in CONFIG_FIELDS], False)
+    if ourCache.replacementPolicy == "optimal":
+      ourCache.setFuture(addresses)
+    access = ourCache.access
+
+    start = time.perf_counter()
+    for i in range(len(ops)):
+      if ops[i]:
+        access(addresses[i], True, data[i])
+      else:
+        access(addresses[i])
+    elapsed = time.perf_counter() - start
+    if best is None or elapsed < best:
+      best = elapsed
+
+  numAccesses = len(ops)
+  result = dict(config)
+  result["accesses"] = numAccesses
+  result["hits"] = ourCache.numHits
+  result["hitRate"] = ourCache.numHits / numAccesses if numAccesses > 0 else 0.0
+  result["seconds"] = best
+  result["accessesPerSecond"] = numAccesses / best if best > 0 else 0.0
+  return result
+
+
+# Every pattern on every configuration that can be built, as in sweep.buildGrid
+def runBenchmarks(patterns, values, numAccesses, addressWidth, seed=0, numRepeats=1):
+  results = []
+  for pattern in patterns:
+    trace = generateTrace(pattern, numAccesses, addressWidth, seed)
+    for combination in itertools.product(*[values[name] for name in CONFIG_FIELDS]):
+      config = dict(zip(CONFIG_FIELDS, combination))
+      if not isValidConfig(config, addressWidth):
+        continue
+      result = {"pattern": pattern}
+      result.update(timeConfig(config, trace, addressWidth, seed, numRepeats))
+      results.append(result)
+      print(resultKey(result) + " hit_rate=" + "{:.4f}".format(result["hitRate"])
+        + " accesses_per_second=" + str(int(result["accessesPerSecond"])), file=sys.stderr)
+  return results
+
+
+# Identifies the same run across results files
+def resultKey(result):
+  return " ".join([result["pattern"]] + [name + "=" + str(result[name]) for name in CONFIG_FIELDS])
+
+
+# Commit the simulator is at, None outside of a git checkout
+def currentRevision():
+  try:
+    return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+# Speedup of every run found in both results (baseline seconds / new seconds) and their geometric mean, with hit rate changes
+def printComparison(results, baseline):
+  baselineRuns = {resultKey(result): result for result in baseline["results"]}
+  logSpeedups = []
+  for result in results:
+    old = baselineRuns.get(resultKey(result))
+    if old is None or result["seconds"] <= 0:
+      continue
+    speedup = old["seconds"] / result["seconds"]
+    logSpeedups.append(math.log(speedup))
+    line = resultKey(result) + " speedup:" + "{:.3f}".format(speedup)
+    if result["hits"] != old["hits"]:
+      line += " hit_rate_changed:" + "{:.4f}".format(old["hitRate"]) + "->" + "{:.4f}".format(result["hitRate"])
+    print(line)
+  if logSpeedups:
+    print("compared_runs:" + str(len(logSpeedups)) + " baseline_revision:" + str(baseline["revision"])
+      + " geometric_mean_speedup:" + "{:.3f}".format(math.exp(sum(logSpeedups) / len(logSpeedups))))
+  else:
+    print("compared_runs:0")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Cache simulator benchmarks")
+  parser.add_argument("--patterns", default=",".join(PATTERNS), help="comma-separated access patterns (default all)")
+  parser.add_argument("--accesses", type=int, default=20000, help="accesses per pattern")
+  parser.add_argument("--address-width", dest="addressWidth", type=int, default=16)
+  parser.add_argument("--seed", type=int, default=0)
+  parser.add_argument("--repeat", type=int, default=1, help="runs of each configuration, the fastest is kept")
+  parser.add_argument("--cache-size", dest="cacheSize", default="1024,4096,16384")
+  parser.add_argument("--block-size", dest="blockSize", default="16,64")
+  parser.add_argument("--associativity", dest="associativity", default="4")
+  parser.add_argument("--replacement-policy", dest="replacementPolicy", default=",".join(str(number) for number in range(1, len(POLICY_NUMBERS) + 1)))
+  parser.add_argument("--write-hit-policy", dest="writeHitPolicy", default="1,2")
+  parser.add_argument("--write-miss-policy", dest="writeMissPolicy", default="1,2")
+  parser.add_argument("--output", default="benchmarks.json", help="JSON results file")
+  parser.add_argument("--compare", help="JSON results file of an earlier run to compare against")
+  args = parser.parse_args()
+
+  patterns = args.patterns.split(",")
+  for pattern in patterns:
+    if pattern not in PATTERNS:
+      sys.exit("Unknown access pattern: " + pattern)
+  values = {}
+  for name in CONFIG_FIELDS:
+    values[name] = [int(value) for value in getattr(args, name).split(",")]
+
+  start = time.perf_counter()
+  results = runBenchmarks(patterns, values, args.accesses, args.addressWidth, args.seed, args.repeat)
+  report = {
+    "revision": currentRevision(),
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "accesses": args.accesses,
+    "addressWidth": args.addressWidth,
+    "seed": args.seed,
+    "results": results,
+  }
+  with open(args.output, "w") as f:
+    json.dump(report, f, indent=2)
+
+  if args.compare is not None:
+    with open(args.compare) as f:
+      printComparison(results, json.load(f))
+  print("runs:" + str(len(results)) + " elapsed_seconds:" + "{:.3f}".format(time.perf_counter() - start)
+    + " results:" + args.output)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,198 @@
+'''
+File: binarytrace.py
+
+Binary traces: fixed-width records stored column by column (addresses, ops, data) after
+a 32-byte header, replayed straight from a memory-mapped file without parsing any record
+'''
+
+from tracereader import openTrace, readTrace
+from array import array
+import argparse
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+MAGIC = b"CSTRACE\x00"
+VERSION = 1
+# magic, version, address width (bits), bytes per address, record layout, number of records, padding to 32 bytes
+HEADER = struct.Struct("<8sHBBIQ8x")
+# The only layout so far: the address column, then the op column, then the data column
+LAYOUT_COLUMNS = 0
+
+# Op codes
+OP_READ = 0
+OP_WRITE = 1
+OP_FLUSH = 2
+
+# Array/memoryview type code of each address size
+ADDRESS_TYPES = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+# Records converted between writes to the output
+CHUNK_RECORDS = 1 << 16
+
+
+# Smallest address size that holds addresses of addressWidth bits
+def addressBytesFor(addressWidth):
+  for size in sorted(ADDRESS_TYPES):
+    if 8 * size >= addressWidth:
+      return size
+  raise ValueError("Address width " + str(addressWidth) + " is too large")
+
+
+# Whether a trace file is in the binary format (stdin never is, it can't be mapped)
+def isBinaryTrace(fileName):
+  if fileName == "-":
+    return False
+  with open(fileName, "rb") as f:
+    return f.read(len(MAGIC)) == MAGIC
+
+
+# Convert a text trace (a file from tracereader.openTrace) into a binary trace file, returns the number of records.
+# Addresses are written out as they come, ops and data wait in temporary files until the address column is complete
+def convertTrace(traceFile, outFileName, addressWidth=8):
+  addressBytes = addressBytesFor(addressWidth)
+  numRecords = 0
+
+  with open(outFileName, "wb") as out, tempfile.TemporaryFile() as opsFile, tempfile.TemporaryFile() as dataFile:
+    out.write(bytes(HEADER.size))
+    addresses = array(ADDRESS_TYPES[addressBytes])
+    ops = bytearray()
+    data = bytearray()
+
+    for command, address, value in readTrace(traceFile, addressWidth):
+      if command == "cache-flush":
+        addresses.append(0)
+        ops.append(OP_FLUSH)
+        data.append(0)
+      else:
+        addresses.append(address)
+        ops.append(OP_READ if value is None else OP_WRITE)
+        data.append(0 if value is None else value)
+
+      if len(ops) == CHUNK_RECORDS:
+        numRecords += writeChunk(out, opsFile, dataFile, addresses, ops, data)
+        addresses = array(ADDRESS_TYPES[addressBytes])
+        ops = bytearray()
+        data = bytearray()
+    numRecords += writeChunk(out, opsFile, dataFile, addresses, ops, data)
+
+    for column in (opsFile, dataFile):
+      column.seek(0)
+      shutil.copyfileobj(column, out)
+    out.seek(0)
+    out.write(HEADER.pack(MAGIC, VERSION, addressWidth, addressBytes, LAYOUT_COLUMNS, numRecords))
+
+  return numRecords
+
+
+# Write a chunk of converted records to the columns, returns how many there were
+def writeChunk(out, opsFile, dataFile, addresses, ops, data):
+  if sys.byteorder == "big":
+    addresses.byteswap()
+  out.write(addresses.tobytes())
+  opsFile.write(ops)
+  dataFile.write(data)
+  return len(ops)
+
+
+class BinaryTrace:
+  def __init__(self, fileName):
+    self.fileName = fileName
+    self.file = open(fileName, "rb")
+    self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(self.map) < HEADER.size:
+      self.close()
+      raise ValueError(fileName + " is not a binary trace")
+    magic, version, self.addressWidth, self.addressBytes, layout, self.numRecords = HEADER.unpack_from(self.map)
+    if magic != MAGIC or version != VERSION or layout != LAYOUT_COLUMNS or self.addressBytes not in ADDRESS_TYPES:
+      self.close()
+      raise ValueError(fileName + " is not a binary trace this version can read")
+    if len(self.map) < HEADER.size + (self.addressBytes + 2) * self.numRecords:
+      self.close()
+      raise ValueError(fileName + " is shorter than its header says")
+
+    # Where each column starts in the file
+    self.addressStart = HEADER.size
+    self.opStart = self.addressStart + self.addressBytes * self.numRecords
+    self.dataStart = self.opStart + self.numRecords
+
+    # The columns as memoryviews over the mapped file (the addresses need a copy on big-endian machines)
+    self.buffer = memoryview(self.map)
+    addressColumn = self.buffer[self.addressStart:self.opStart]
+    if sys.byteorder == "little":
+      self.addresses = addressColumn.cast(ADDRESS_TYPES[self.addressBytes])
+    else:
+      self.addresses = array(ADDRESS_TYPES[self.addressBytes], addressColumn)
+      self.addresses.byteswap()
+      addressColumn.release()
+    self.ops = self.buffer[self.opStart:self.dataStart]
+    self.data = self.buffer[self.dataStart:self.dataStart + self.numRecords]
+
+
+  # The columns as NumPy arrays over the mapped file: addresses, ops, data (they must be dropped before closing the trace)
+  def arrays(self):
+    if np is None:
+      raise ImportError("BinaryTrace.arrays needs NumPy")
+    addresses = np.frombuffer(self.map, dtype="<u" + str(self.addressBytes), count=self.numRecords, offset=self.addressStart)
+    ops = np.frombuffer(self.map, dtype=np.uint8, count=self.numRecords, offset=self.opStart)
+    data = np.frombuffer(self.map, dtype=np.uint8, count=self.numRecords, offset=self.dataStart)
+    return addresses, ops, data
+
+
+  # The records as the (command, address, data) tuples tracereader.readTrace yields
+  def commands(self):
+    addresses = self.addresses
+    ops = self.ops
+    data = self.data
+    for i in range(self.numRecords):
+      op = ops[i]
+      if op == OP_READ:
+        yield "cache-read", addresses[i], None
+      elif op == OP_WRITE:
+        yield "cache-write", addresses[i], data[i]
+      else:
+        yield "cache-flush", None, None
+
+
+  # Unmap the file, every view of it has to be released first
+  def close(self):
+    for name in ("addresses", "ops", "data", "buffer"):
+      view = getattr(self, name, None)
+      if isinstance(view, memoryview):
+        view.release()
+    self.map.close()
+    self.file.close()
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self, *exception):
+    self.close()
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Convert a text trace to a binary trace")
+  parser.add_argument("traceFile", help="text trace of cache-read/cache-write/cache-flush commands ('-' for stdin, may be compressed)")
+  parser.add_argument("outFile", help="binary trace to write")
+  parser.add_argument("--address-width", dest="addressWidth", type=int, default=8, help="number of address bits (8 to 64, default 8)")
+  args = parser.parse_args()
+  if args.addressWidth < 8 or args.addressWidth > 64:
+    sys.exit("Invalid address width!")
+
+  with openTrace(args.traceFile) as traceFile:
+    numRecords = convertTrace(traceFile, args.outFile, args.addressWidth)
+  print("records:" + str(numRecords) + " address_bytes:" + str(addressBytesFor(args.addressWidth)) + " output:" + args.outFile)
+
+
+if __name__ == "__main__":
+  main()
@@ -6,20 +6,42 @@ Section: 511
 E-mail: burdick.alex@tamu.edu, dean27@tamu.edu
 
 Cache class: represents the cache to be simulated, which reads from (and writes to)
-its own RAM and contains a computed amount of sets
+its own RAM and contains a computed amount of sets.
+Lines are stored as flat arrays (struct-of-arrays) indexed by line number = set * E + way:
+tags and valid/dirty bits each have one array, and all the line data lives in one
+contiguous bytearray. Replacement metadata is kept by the structures in replacement.py.
+Set and CacheEntry objects are views over them, a set's view is only made when it is looked at.
+The storage is allocated once: clearing the cache (a flush) only starts a new generation and
+empties the block -> line index, and a set left over from an older generation is cleared
+when a block is next loaded into it, or when the whole cache is looked at (clearStaleSets)
 '''
 
-from Set import Set
+from Set import SetList
 from CacheEntry import CacheEntry
-from MainMemory import MainMemory
+from AccessResult import AccessResult
+from events import HumanSink
+from cachestats import CacheStats
+from profiling import Profiler
+from prefetch import PrefetchUnit, PREFETCH_DEGREE
+from timing import TimingModel, HIT_LATENCIES, MISS_PENALTY, MEMORY_LATENCY, MEMORY_BANDWIDTH, WRITE_BUFFER_DEPTH
+from checkpoint import saveCheckpoint, restoreCheckpoint
+from mainmemory import MainMemory
+from replacement import REPLACEMENT_POLICIES, policyName, NextUseIndex, copySetState, copySharedState
+from batchengine import simulateBatch
+from array import array
 from math import log2
-from random import randint
 
 class Cache:
-    def __init__(self, ram, C, B, E, replacementPolicy, writeHitPolicy, writeMissPolicy):
+    def __init__(self, ram, C, B, E, replacementPolicy, writeHitPolicy, writeMissPolicy, verbose=True, events=None):
         # Cache has its own main memory to interact with
         self.ram = ram
 
+        # Where the outcome of every access goes (a sink from events.py), None keeps only the counters.
+        # Without a sink of its own, a verbose cache prints the usual output (the interactive menu's), trace replay turns it off
+        if events is None and verbose:
+          events = HumanSink(self.formatAddress)
+        self.events = events
+
         # C, B, E, and S
         self.cacheSize = int(C)
         self.blockSize = int(B)
@@ -29,25 +51,45 @@ class Cache:
         # b, s, and t
         self.numBlockOffsetBits = int(log2(self.blockSize))
         self.numSetIndexBits = int(log2(self.numSets))
-        self.numTagBits = 8 - (self.numBlockOffsetBits + self.numSetIndexBits)
-
-        # Create the sets for the cache
-        self.sets = []
-        for i in range(self.numSets):
-          blankSet = Set(self.associativity, self.blockSize)
-          self.sets.append(blankSet)
-        
-        # Number of cache hits and cache misses
+        self.addressWidth = ram.addressWidth
+        self.numTagBits = self.addressWidth - (self.numBlockOffsetBits + self.numSetIndexBits)
+        # Hex digits needed to show a tag (at least 2)
+        self.tagDigits = max(2, (self.numTagBits + 3) // 4)
+
+        # Masks and shift used to split an integer address into tag, set index, and block offset
+        self.offsetMask = self.blockSize - 1
+        self.setIndexMask = self.numSets - 1
+        self.tagShift = self.numBlockOffsetBits + self.numSetIndexBits
+
+        # Number of cache hits and cache misses, and dirty lines evicted (write-backs)
         self.numHits = 0
         self.numMisses = 0
-
-        # Converting policies to their string equivalents
-        if int(replacementPolicy) == 1:
-          self.replacementPolicy = "random_replacement"
-        elif int(replacementPolicy) == 2:
-          self.replacementPolicy = "least_recently_used"
-        else:
-          self.replacementPolicy = "least_frequently_used"
+        self.numWriteBacks = 0
+        # Memory traffic (with the level below): bytes read by fills, and bytes written by write-throughs
+        # (and no-write-allocate write misses) and by write-backs
+        self.numFillBytes = 0
+        self.numWriteThroughBytes = 0
+        self.numWriteBackBytes = 0
+        # Miss classification and per-set/per-line counters, see enableStats
+        self.stats = None
+        # Time spent in each phase of the simulation, see enableProfiling
+        self.profiler = None
+        # Next uses of the blocks of the trace being replayed, for optimal replacement (see setFuture)
+        self.future = None
+        # Prefetchers and their counters, see enablePrefetching
+        self.prefetch = None
+        # Cycles, average memory access time and memory bandwidth, see enableTiming
+        self.timing = None
+
+        # Place in a hierarchy (set up by hierarchy.py): how this level shares blocks with the levels above it,
+        # the levels above it to back-invalidate when it evicts a block (inclusive), and whether the level
+        # below wants clean evicted blocks too (exclusive)
+        self.inclusion = "non_inclusive"
+        self.upperLevels = []
+        self.notifyCleanEvictions = False
+
+        # Converting policies to their string equivalents (replacement policies are given by menu number or name)
+        self.replacementPolicy = policyName(replacementPolicy)
         if int(writeHitPolicy) == 1:
           self.writeHitPolicy = "write_through"
         else:
@@ -57,298 +99,395 @@ class Cache:
         else:
           self.writeMissPolicy = "no_write_allocate"
 
+        # Line storage for the cache, and the set views over it
+        self.numLines = self.numSets * self.associativity
+        self.allocateLines()
+        self.sets = SetList(self)
+
 
-    # Read data from an address
+    # Read data from an address (a hex string like "0x1A")
     def cacheRead(self, address):
-        # Convert the hex address to binary equivalent
-        tag, index, offset = self.hexToBinaryString(address[2:])
-        # Convert the tag to hex
-        if len(tag) / 4 != 0:
-          finalLength = int(len(tag) / 4) * 4
-          tag = tag.zfill(finalLength + 4)
-        tag = self.fourBitsToHex(tag).upper()     
-
-        if offset == "":
-          offset = 0
-        else:
-          offset = int(offset, 2)
+        result = self.access(self.parseAddress(address))
+        if self.events is not None:
+          self.events.access(result)
+        return result
+
+
+    # Write data (a hex string like "0xFF") to an address in cache (and RAM if write-through hit policy)
+    def cacheWrite(self, address, data):
+        result = self.access(self.parseAddress(address), True, int(data, 16))
+        if self.events is not None:
+          self.events.access(result)
+        return result
+
+
+    # Start classifying misses and counting per set and per line (cachestats.py), from now on every access goes through the statistics
+    def enableStats(self):
+        self.stats = CacheStats(self)
+        self.access = self.stats.access
+
 
-        # Set selection: Take the set index bits from the address and navigate to that set
-        # If we have a fully-associative cache (1 set), this is trivial
-        if index == "":
-          index = 0
+    # Start timing lookup, fill, replacement, RAM transfer and output (profiling.py), by wrapping the methods of the cache,
+    # its RAM and its event sink. Enable after the event sink is set
+    def enableProfiling(self):
+        self.profiler = Profiler()
+        self.profiler.attach(self)
+
+
+    # Start prefetching with the named prefetchers (prefetch.py), into the cache or into a buffer of bufferSize blocks.
+    # From now on every access goes through the prefetchers
+    def enablePrefetching(self, names, degree=PREFETCH_DEGREE, bufferSize=0):
+        self.prefetch = PrefetchUnit(self, names, degree, bufferSize)
+
+
+    # Start counting cycles (timing.py): hit latency of each level from this one down (the last one for the levels after the list),
+    # miss penalty, memory latency, memory bandwidth (bytes per cycle) and write buffer depth. From now on every access is timed
+    def enableTiming(self, hitLatencies=HIT_LATENCIES, missPenalty=MISS_PENALTY, memoryLatency=MEMORY_LATENCY,
+        memoryBandwidth=MEMORY_BANDWIDTH, writeBufferDepth=WRITE_BUFFER_DEPTH):
+        self.timing = TimingModel(self, hitLatencies, missPenalty, memoryLatency, memoryBandwidth, writeBufferDepth)
+
+
+    # Save the cache's state and its RAM's to a checkpoint file, or restore them from one (checkpoint.py)
+    def checkpoint(self, fileName):
+        saveCheckpoint(self, fileName)
+
+
+    def restore(self, fileName):
+        restoreCheckpoint(self, fileName)
+
+
+    # Zero the hit/miss/write-back and traffic counters, the cache's content stays
+    def resetCounters(self):
+        self.numHits = 0
+        self.numMisses = 0
+        self.numWriteBacks = 0
+        self.numFillBytes = 0
+        self.numWriteThroughBytes = 0
+        self.numWriteBackBytes = 0
+        if self.timing is not None:
+          self.timing.syncCounters()
+
+
+    # Give the addresses of every access the cache is about to make (a trace's, flushes left out), for optimal replacement.
+    # From now on each access also advances the position in the trace, so the accesses have to follow it
+    def setFuture(self, addresses):
+        self.future = NextUseIndex([address >> self.numBlockOffsetBits for address in addresses])
+        self.replacement.future = self.future
+        future = self.future
+        cacheAccess = self.access
+        def access(address, isWrite=False, newByte=None):
+            result = cacheAccess(address, isWrite, newByte)
+            future.position += 1
+            return result
+        self.access = access
+
+
+    # Perform one read or write at an integer address, returns an AccessResult describing what happened.
+    # A write with newByte None goes through the write policies without changing the data (used when only hits/misses matter)
+    def access(self, address, isWrite=False, newByte=None):
+        # Split the address into tag, set index, and block offset with the precomputed shifts/masks
+        blockAddress = address >> self.numBlockOffsetBits
+        offset = address & self.offsetMask
+        index = blockAddress & self.setIndexMask
+        result = AccessResult(isWrite, address, index, blockAddress >> self.numSetIndexBits, offset)
+
+        # Line matching: the valid lines are indexed by the block they hold (tag and set index together)
+        line = self.lineOf.get(blockAddress)
+
+        if line is not None:
+          self.numHits += 1
+          result.hit = True
+          self.replacement.hit(index, line)
         else:
-          index = int(index, 2)
-        theSet = self.sets[index]
-
-        # For formatting and correct checking
-        if len(tag) < 2:
-          tag = tag.zfill(2)
-
-        # Other variables
-        isMiss = True
-        data = ""
-        doReplacement = True
-        hitMessage = "hit:"
-        evictionLineNumber = -1
-        addressMessage = "ram_address:"
-        
-        # Line matching: a hit occurs if the valid bit of a line is set and the tag bits match
-        for i in range(self.associativity):
-          if theSet.lines[i].valid == 1:
-            if tag == theSet.lines[i].tag:
-              # Hit! Update everything we need to update
-              self.numHits += 1
-              hitMessage += "yes"
-              addressMessage += "-1"
-              data = theSet.lines[i].blocks[offset]
-              theSet.timesUsed[i] += 1
-              isMiss = False
-              doReplacement = False
-              break
-
-        # If we have a miss, check if there is a line with valid set to 0 (only in the set)
-        if isMiss:
           self.numMisses += 1
-          hitMessage += "no"
-          addressMessage += address
-
-          for i in range(self.associativity):
-            if theSet.lines[i].valid == 0:
-              theLine = theSet.lines[i]
-
-              # Set the content of the blockSize contiguous bytes from memory to the line's blocks
-              theLine.blocks = self.ram.getBlocks(address, self.blockSize, offset)
-              # Valid bit is now set
-              theLine.valid = 1
-              # Update tag
-              theLine.tag = tag
-
-              # The data block is indicated by the offset
-              data = theLine.blocks[offset]
-
-              doReplacement = False
-              evictionLineNumber = str(i)
-
-              # If we are using an LRU policy, update recentness of the line by removing it from the "use" string of the current set, and then appending it to the end
-              if self.replacementPolicy == "least_recently_used" or self.replacementPolicy == "least_frequently_used":
-                lineNumber = str(i)
-                theSet.use = theSet.use.replace(lineNumber, "")
-                theSet.use += lineNumber
-              
-              # If using an LFU policy, also update the frequency counter at index i of "timesUsed"
-              if self.replacementPolicy == "least_frequently_used":
-                theSet.timesUsed[i] = 0
-
-              break
-
-          # If we get here, all the lines are valid, perform a replacement using the policy
-          if doReplacement:
-
-            # Random replacement: choose a random line in the set to evict and replace with the content starting at address
-            if self.replacementPolicy == "random_replacement":
-              evictionLineNumber = randint(0,self.associativity-1)
-              theSet.use = theSet.use.replace(str(evictionLineNumber),"") + str(evictionLineNumber)
-
-            # Least recently used replacement: choose the last updated line in the set to evict
-            elif self.replacementPolicy == "least_recently_used":
-              # Evicted line is oldest line (first char in "use" for current set, move it to the end of "use")
-              evictionLineNumber = theSet.use[0]
-              theSet.use = theSet.use.replace(str(evictionLineNumber),"") + str(evictionLineNumber)
-
-            # Least frequently used replacement: choose the least frequently updated line to evict
-            else:
-              leastTimesUsed = min(theSet.timesUsed)
-              for i in range(len(theSet.timesUsed)):
-                if(theSet.timesUsed[i] == leastTimesUsed):
-                  evictionLineNumber = i
-                  break
-              theSet.use = theSet.use.replace(str(evictionLineNumber),"") + str(evictionLineNumber)
-            
-            # Now that eviction line is indicated and any frequency/recentness is updated, we can do the replacement
-            theLine = theSet.lines[int(evictionLineNumber)]
-            theLine.blocks = self.ram.getBlocks(address, self.blockSize, offset)
-            theLine.tag = tag
-            data = theLine.blocks[offset]
-
-        # Print the information from the read
-        print("set:" + str(index))
-        print("tag:", end="")
-        # Ensure correct tag output (dont include any leading 0)
-        if tag[0] == "0" and len(tag) > 1:
-          print(tag[1])
-        else:
-          print(tag)
-        print(hitMessage)
-        print("eviction_line:" + str(evictionLineNumber))
-        print(addressMessage)
-        print("data:0x" + data)
-
-
-    # Write data to an address in cache (and RAM if write-through hit policy)
-    def cacheWrite(self, address, data, evictionLineNumber, hadAMiss):
-        # Set-up is the same as cache read: extract the tag, index, and offset bits, set selection, set variables
-        if len(data) > 2:
-          data = data[:2] + data[2:].upper()
-
-        tag, index, offset = self.hexToBinaryString(address[2:])
-        if len(tag) / 4 != 0:
-          finalLength = int(len(tag) / 4) * 4
-          tag = tag.zfill(finalLength + 4)
-        tag = self.fourBitsToHex(tag).upper()
-
-        if offset == "":
-          offset = 0
-        else:
-          offset = int(offset, 2)
+          result.ramAddress = address
+
+          # No-write allocate miss policy: simply write the data to ram
+          if isWrite and self.writeMissPolicy == "no_write_allocate":
+            self.numWriteThroughBytes += 1
+            if newByte is not None:
+              self.ram.writeBlock(address, bytes((newByte,)))
+              result.data = newByte
+            return result
+
+          # Reads and write-allocate misses load the block from ram into a line
+          line = self.fill(index, blockAddress)
+          result.evictionLine = line - index * self.associativity
+
+        position = line * self.blockSize + offset
+        if isWrite:
+          if newByte is not None:
+            self.data[position] = newByte
+          # Write-through hit policy: Write the data to cache and ram
+          if self.writeHitPolicy == "write_through":
+            self.ram.writeBlock(address, self.data[position:position + 1])
+            self.numWriteThroughBytes += 1
+          # Write-back hit policy: Write the data ONLY to the cache and mark the line dirty
+          else:
+            self.dirty[line] = 1
+
+        result.data = self.data[position]
+        result.dirty = self.dirty[line]
+        return result
+
+
+    # Simulate a whole trace at once: addresses and ops (nonzero for writes) are sequences or NumPy arrays.
+    # Returns a BatchResult with per-access hits and the trace's counters (see batchengine.py)
+    def simulateBatch(self, addresses, ops=None):
+        return simulateBatch(self, addresses, ops)
+
+
+    # Load the block at blockAddress (address >> b) into a line of set index, returns the line used.
+    # The block's data comes from the level below unless given (blockData/blockDirty, a block handed down by the level above)
+    def fill(self, index, blockAddress, blockData=None, blockDirty=0):
+        # Fetch first: in a hierarchy, the fetch may back-invalidate or take back lines of this set
+        if blockData is None:
+          blockData, blockDirty = self.ram.fetchBlock(blockAddress << self.numBlockOffsetBits, self.blockSize)
+          self.numFillBytes += self.blockSize
+
+        if self.setGeneration[index] != self.generation:
+          self.clearSet(index)
+        firstLine = index * self.associativity
+        numValid = self.linesInUse[index]
+
+        # Use the first line with valid set to 0 if there is one: the next unused way, unless lines were invalidated one by one
+        if numValid < self.associativity:
+          line = firstLine + numValid
+          if self.valid[line]:
+            line = self.valid.index(0, firstLine, firstLine + self.associativity)
+          self.linesInUse[index] = numValid + 1
+          wasValid = False
 
-        if index == "":
-          index = 0
+        # All the lines are valid, the replacement policy chooses the line to evict
         else:
-          index = int(index, 2)
-        theSet = self.sets[index]
-
-        if len(tag) < 2:
-          tag = tag.zfill(2)
-
-        isMiss = True
-        doReplacement = True
-        hitMessage = "write_hit:"
-        addressMessage = "ram_address:"
-        
-        # Line matching happens before writing
-        for i in range(self.associativity):
-          if theSet.lines[i].valid == 1:
-            if tag == theSet.lines[i].tag:
-
-              # If its had a miss (write-allocate miss policy), output address and "no" for hit
-              if hadAMiss:
-                addressMessage += address
-                hitMessage += "no"
-              else:
-                addressMessage += "-1"
-                hitMessage += "yes"
-                self.numHits += 1
-              
-              theSet.timesUsed[i] += 1
-              isMiss = False
-              doReplacement = False
-
-              # Write-through hit policy: Write the data to cache and ram
-              if self.writeHitPolicy == "write_through":
-                theLine = theSet.lines[i]
-                theLine.setByte(offset, data[2:])
-                self.ram.setBlocks(address, theLine.blocks, offset)
-
-              # Write-back hit policy: Write the data ONLY to ram
-              else:
-                theLine = theSet.lines[i]
-                theLine.setByte(offset, data[2:])
-                theLine.dirty = 1
-              
-              # Print the info here if write-allocate miss policy, since its in the base case for its recursive calls
-              if self.writeMissPolicy == "write_allocate":
-                print("set:" + str(index))
-                print("tag:", end="")
-                if tag[0] == "0":
-                  print(tag[1])
-                else:
-                  print(tag)
-                print(hitMessage)
-                print("eviction_line:" + str(evictionLineNumber))
-                print(addressMessage)
-                print("data:0x" + data[2:])
-                print("dirty_bit:" + str(theSet.lines[int(evictionLineNumber)].dirty))
-
-              break
-        
-        # A cache read miss means use the write miss policy
-        if isMiss:
+          line = self.replacement.victim(index, blockAddress)
+          self.evict(index, line)
+          wasValid = True
+
+        self.replacement.fill(index, line, wasValid, blockAddress)
+
+        # Set the content of the blockSize contiguous bytes from memory to the line's data
+        start = line * self.blockSize
+        self.data[start:start + self.blockSize] = blockData
+        self.valid[line] = 1
+        self.dirty[line] = blockDirty
+        self.tags[line] = blockAddress >> self.numSetIndexBits
+        self.lineOf[blockAddress] = line
+        return line
+
+
+    # Drop the block held by a valid line before it is replaced. Levels above an inclusive level give up their copies
+    # first (their dirty data is newer), then dirty data is written back to the level below
+    def evict(self, index, line):
+        blockAddress = (self.tags[line] << self.numSetIndexBits) | index
+        del self.lineOf[blockAddress]
+        address = blockAddress << self.numBlockOffsetBits
+        if self.upperLevels:
+          self.backInvalidate(address, line)
+
+        dirty = self.dirty[line]
+        if dirty:
+          self.numWriteBacks += 1
+          self.numWriteBackBytes += self.blockSize
+        if dirty or self.notifyCleanEvictions:
+          start = line * self.blockSize
+          self.ram.evictBlock(address, bytes(self.data[start:start + self.blockSize]), dirty)
+
+
+    # Invalidate the copies of the block at address in the levels above, merging their dirty data into line
+    def backInvalidate(self, address, line):
+        start = line * self.blockSize
+        # Nearest level first, so the data of the levels closer to the processor (the newest) is merged last
+        for upper in self.upperLevels:
+          for subAddress in range(address, address + self.blockSize, upper.blockSize):
+            removed = upper.invalidateBlock(subAddress)
+            if removed is not None and removed[1]:
+              position = start + subAddress - address
+              self.data[position:position + upper.blockSize] = removed[0]
+              self.dirty[line] = 1
+
+
+    # Remove the block at address from the cache without writing it anywhere, returns its (data, dirty bit), None if it isn't cached
+    def invalidateBlock(self, address):
+        blockAddress = address >> self.numBlockOffsetBits
+        line = self.lineOf.pop(blockAddress, None)
+        if line is None:
+          return None
+        index = blockAddress & self.setIndexMask
+        start = line * self.blockSize
+        removed = (bytes(self.data[start:start + self.blockSize]), self.dirty[line])
+
+        self.valid[line] = 0
+        self.dirty[line] = 0
+        self.linesInUse[index] -= 1
+        self.replacement.invalidate(index, line)
+        return removed
+
+
+    # Backing-store interface (the same as MainMemory's), so that a Cache can be the ram of the level above it.
+    # Each request from the level above is one access of this level, counted as a hit or a miss
+
+    # The level above missed on the size bytes at address, returns their data and whether the copy handed up is dirty.
+    # An exclusive level hands its copy over (with its dirty bit) and doesn't allocate blocks it misses on
+    def fetchBlock(self, address, size):
+        blockAddress = address >> self.numBlockOffsetBits
+        index = blockAddress & self.setIndexMask
+        line = self.lineOf.get(blockAddress)
+
+        if line is None:
           self.numMisses += 1
-          hitMessage += "no"
-          
-          # No-write allocate miss policy: simply write the data to ram
-          if self.writeMissPolicy == "no_write_allocate":
-            blockToChange = self.ram.getBlocks(address, self.blockSize, offset)
-            blockToChange[offset] = data[2:]
-            self.ram.setBlocks(address, blockToChange, offset)
-            addressMessage += address
+          if self.inclusion == "exclusive":
+            self.numFillBytes += size
+            return self.ram.fetchBlock(address, size)
+          line = self.fill(index, blockAddress)
+        else:
+          self.numHits += 1
+          if self.inclusion == "exclusive":
+            return self.invalidateBlock(address)
+          self.replacement.hit(index, line)
 
-          # Write-allocate miss policy: load data from ram to cache and then write
-          else:
-            # Fill first available empty line with the data from ram (if possible), same process from cacheRead's simple miss procedure
-            for i in range(self.associativity):
-              if theSet.lines[i].valid == 0:
-                theLine = theSet.lines[i]
-
-                theLine.blocks = self.ram.getBlocks(address, self.blockSize, offset)
-                theLine.valid = 1
-                theLine.tag = tag
-
-                doReplacement = False
-                evictionLineNumber = str(i)
-
-                if self.replacementPolicy == "least_recently_used" or self.replacementPolicy == "least_frequently_used":
-                  lineNumber = str(i)
-                  theSet.use = theSet.use.replace(lineNumber, "")
-                  theSet.use += lineNumber
-                
-                if self.replacementPolicy == "least_frequently_used":
-                  theSet.timesUsed[i] = 0
-
-                break
-
-            # If we get here, all the lines are valid, perform a replacement using the policy (exact same as in cache read)
-            if doReplacement:
-
-              # RR
-              if self.replacementPolicy == "random_replacement":
-                evictionLineNumber = randint(0,self.associativity-1)
-                theSet.use = theSet.use.replace(str(evictionLineNumber),"") + str(evictionLineNumber)
-
-              # LRU
-              elif self.replacementPolicy == "least_recently_used":
-                evictionLineNumber = theSet.use[0]
-                theSet.use = theSet.use.replace(str(evictionLineNumber),"") + str(evictionLineNumber)
-
-              # LFU
-              else:
-                leastTimesUsed = min(theSet.timesUsed)
-                for i in range(len(theSet.timesUsed)):
-                  if theSet.timesUsed[i] == leastTimesUsed:
-                    evictionLineNumber = i
-                    break
-                theSet.use = theSet.use.replace(str(evictionLineNumber),"") + str(evictionLineNumber)
-
-              theLine = theSet.lines[int(evictionLineNumber)]
-              theLine.blocks = self.ram.getBlocks(address, self.blockSize, offset)
-              theLine.tag = tag
-
-            # Recur since write-allocate says to perform a cache write (preferrably a hit) once the data is loaded
-            self.cacheWrite(address, data, evictionLineNumber, True)
-        
-        # Print the info at the end ONLY for no-write-allocate miss policy, since recursion from write-allocate causes multiple prints
-        if self.writeMissPolicy == "no_write_allocate":
-          print("set:" + str(index))
-          print("tag:", end="")
-          if tag[0] == "0":
-            print(tag[1])
-          else:
-            print(tag)
-          print(hitMessage)
-          print("eviction_line:" + str(evictionLineNumber))
-          print(addressMessage)
-          print("data:0x" + data[2:])
-          print("dirty_bit:" + str(theSet.lines[int(evictionLineNumber)].dirty))
+        start = line * self.blockSize + (address & self.offsetMask)
+        return bytes(self.data[start:start + size]), 0
 
 
-    # Clear the cache
-    def cacheFlush(self):
-      self.sets = []
-      for i in range(self.numSets):
-        blankSet = Set(self.associativity, self.blockSize)
-        self.sets.append(blankSet)
-      print("cache_cleared")
+    # The level above writes data at address (write-through, no-write-allocate miss, or write-back), following this level's write policies.
+    # An exclusive level never allocates on writes, a block only enters it when the level above evicts it
+    def writeBlock(self, address, data):
+        blockAddress = address >> self.numBlockOffsetBits
+        index = blockAddress & self.setIndexMask
+        line = self.lineOf.get(blockAddress)
+
+        if line is None:
+          self.numMisses += 1
+          if self.writeMissPolicy == "no_write_allocate" or self.inclusion == "exclusive":
+            self.ram.writeBlock(address, data)
+            self.numWriteThroughBytes += len(data)
+            return
+          line = self.fill(index, blockAddress)
+        else:
+          self.numHits += 1
+          self.replacement.hit(index, line)
+
+        position = line * self.blockSize + (address & self.offsetMask)
+        self.data[position:position + len(data)] = data
+        if self.writeHitPolicy == "write_through":
+          self.ram.writeBlock(address, data)
+          self.numWriteThroughBytes += len(data)
+        else:
+          self.dirty[line] = 1
+
+
+    # The level above dropped the block at address: dirty data is written into this level, and an exclusive level takes in every block
+    def evictBlock(self, address, data, dirty):
+        if self.inclusion != "exclusive":
+          if dirty:
+            self.writeBlock(address, data)
+          return
+
+        # Victim insertion: the block's data comes from above, nothing is fetched
+        if dirty and self.writeHitPolicy == "write_through":
+          self.ram.writeBlock(address, data)
+          self.numWriteThroughBytes += len(data)
+          dirty = 0
+        blockAddress = address >> self.numBlockOffsetBits
+        index = blockAddress & self.setIndexMask
+        line = self.lineOf.get(blockAddress)
+        if line is None:
+          self.fill(index, blockAddress, data, dirty)
+        else:
+          start = line * self.blockSize
+          self.data[start:start + self.blockSize] = data
+          self.dirty[line] |= dirty
+          self.replacement.hit(index, line)
+
+
+    # Clear the cache, first writing back every dirty line if writeBack (otherwise their data is dropped)
+    def cacheFlush(self, writeBack=False):
+      if writeBack:
+        self.writeBackAll()
+      self.clearLines()
+      if self.events is not None:
+        self.events.cleared()
+
+
+    # Write every dirty line to the level below, leaving it valid and clean. A write-back can make an inclusive level below
+    # evict and back-invalidate lines of this one (their dirty data merged into it), so lines already gone are skipped
+    def writeBackAll(self):
+      for blockAddress, line in list(self.lineOf.items()):
+        if self.lineOf.get(blockAddress) == line and self.dirty[line]:
+          start = line * self.blockSize
+          self.ram.evictBlock(blockAddress << self.numBlockOffsetBits, bytes(self.data[start:start + self.blockSize]), 1)
+          self.dirty[line] = 0
+          self.numWriteBacks += 1
+          self.numWriteBackBytes += self.blockSize
+
+
+    # Allocate the flat line storage with every line invalid
+    def allocateLines(self):
+      self.tags = array("Q", bytes(8 * self.numLines))
+      self.valid = bytearray(self.numLines)
+      self.dirty = bytearray(self.numLines)
+      self.data = bytearray(self.numLines * self.blockSize)
+      # Number of valid lines in each set, and the valid lines indexed by the block they hold
+      self.linesInUse = array("Q", bytes(8 * self.numSets))
+      self.lineOf = {}
+
+      # Replacement metadata of every set (replacement.py), and a policy never used that clearSet copies a set's state from (made by the first flush)
+      self.replacement = REPLACEMENT_POLICIES[self.replacementPolicy](self.numSets, self.associativity)
+      self.emptyReplacement = None
+
+      # Generation of the cache (one more at every clear) and the one each set's lines and metadata belong to
+      self.generation = 0
+      self.setGeneration = array("Q", bytes(8 * self.numSets))
+      self.numStaleSets = 0
+
+
+    # Invalidate every line at once: the sets are cleared one by one when they are next used (clearSet).
+    # Their blocks are gone from the index right away, so nothing can hit on them
+    def clearLines(self):
+      self.generation += 1
+      self.numStaleSets = self.numSets
+      self.lineOf = {}
+      if self.stats is not None:
+        self.stats.flush()
+      if self.emptyReplacement is None:
+        self.emptyReplacement = REPLACEMENT_POLICIES[self.replacementPolicy](self.numSets, self.associativity)
+      copySharedState(self.replacement, self.emptyReplacement, self.numSets)
+
+
+    # Clear a set left over from an older generation: its lines empty and its replacement metadata as in a new cache
+    def clearSet(self, index):
+      associativity = self.associativity
+      firstLine = index * associativity
+      endLine = firstLine + associativity
+      self.tags[firstLine:endLine] = array("Q", bytes(8 * associativity))
+      self.valid[firstLine:endLine] = bytes(associativity)
+      self.dirty[firstLine:endLine] = bytes(associativity)
+      self.data[firstLine * self.blockSize:endLine * self.blockSize] = bytes(associativity * self.blockSize)
+      self.linesInUse[index] = 0
+      copySetState(self.replacement, self.emptyReplacement, index, index + 1, self.numSets)
+      self.setGeneration[index] = self.generation
+      self.numStaleSets -= 1
+
+
+    # Clear every set left over from an older generation, before the line arrays are read as a whole (views, dumps, checkpoints, batches)
+    def clearStaleSets(self):
+      if self.numStaleSets == 0:
+        return
+      # When every set is stale they are all cleared at once
+      if self.numStaleSets == self.numSets:
+        self.tags[:] = array("Q", bytes(8 * self.numLines))
+        self.valid[:] = bytes(self.numLines)
+        self.dirty[:] = bytes(self.numLines)
+        self.data[:] = bytes(self.numLines * self.blockSize)
+        self.linesInUse[:] = array("Q", bytes(8 * self.numSets))
+        copySetState(self.replacement, self.emptyReplacement, 0, self.numSets, self.numSets)
+        self.setGeneration[:] = array("Q", [self.generation]) * self.numSets
+        self.numStaleSets = 0
+        return
+      for index in range(self.numSets):
+        if self.setGeneration[index] != self.generation:
+          self.clearSet(index)
 
 
     # Display the cache content and status
@@ -364,7 +503,32 @@ class Cache:
 
       print("cache_content:")
       for i in range(self.numSets):
-        self.sets[i].printSet()
+        self.sets[i].printSet(self.tagDigits)
+
+      if self.stats is not None:
+        self.stats.printAll()
+      if self.prefetch is not None:
+        self.prefetch.printReport()
+      if self.timing is not None:
+        self.timing.printReport()
+
+
+    # Display the counters, and the miss breakdown, prefetcher counters, cycles and time of each phase when they are enabled (stats menu command)
+    def printStats(self):
+      numAccesses = self.numHits + self.numMisses
+      print("accesses:" + str(numAccesses))
+      print("hits:" + str(self.numHits))
+      print("misses:" + str(self.numMisses))
+      print("write_backs:" + str(self.numWriteBacks))
+      print("hit_rate:" + "{:.4f}".format(self.numHits / numAccesses if numAccesses > 0 else 0.0))
+      if self.stats is not None:
+        self.stats.printMissBreakdown()
+      if self.prefetch is not None:
+        self.prefetch.printReport()
+      if self.timing is not None:
+        self.timing.printReport()
+      if self.profiler is not None:
+        self.profiler.printReport(numAccesses)
 
 
     # Display the RAM content and status
@@ -374,15 +538,11 @@ class Cache:
 
     # Dump current state of cache (its blocks content) into cache.txt
     def cacheDump(self):
+      self.clearStaleSets()
       with open("cache.txt","w+") as f:
-        for i in range(len(self.sets)):
-          thisSet = self.sets[i]
-          for j in range(len(thisSet.lines)):
-            thisLine = thisSet.lines[j]
-            for k in range(len(thisLine.blocks)):
-              thisByte = thisLine.blocks[k]
-              f.write(thisByte + " ")
-            f.write("\n")
+        for line in range(self.numLines):
+          start = line * self.blockSize
+          f.write(self.data[start:start + self.blockSize].hex(" ").upper() + " \n")
 
 
     # Dump the RAM content into ram.txt
@@ -390,33 +550,14 @@ class Cache:
         self.ram.memoryDump()
 
 
-    # Get the tag, set index, and block offset bits from a hex address (formatted "##"")
-    def hexToBinaryString(self, address):
-      bina = ""
-      conversions = {"0":"0000","1":"0001","2":"0010","3":"0011","4":"0100","5":"0101","6":"0110","7":"0111","8":"1000","9":"1001",
-      "A": "1010","B":"1011","C":"1100","D":"1101","E":"1110","F":"1111"}
-
-      # Create the binary string from the 1 byte address
-      for i in range(len(address)):
-          bina += conversions[address[i].upper()]
-  
-      tag = bina[:self.numTagBits]
-      index = bina[self.numTagBits:self.numSetIndexBits + self.numTagBits]
-      offset = bina[self.numSetIndexBits + self.numTagBits:]
-
-      return tag, index, offset
-      
-
-    # Takes in a binary string with a length that is a multiple of 4 and translates it to hex
-    def fourBitsToHex(self, bits):
-      hexVal = ""
-      conversions = {"0000":"0","0001":"1","0010":"2","0011":"3","0100":"4","0101":"5","0110":"6","0111":"7","1000":"8","1001":"9",
-      "1010":"A","1011":"B","1100":"C","1101":"D","1110":"E","1111":"F"}
-
-      # Create the binary string from the 1 byte address
-      j = 4
-      for i in range(0, len(bits), 4):
-        hexVal = conversions[bits[i:j]]
-        j += 4
-
-      return hexVal
\ No newline at end of file
+    # Convert a hex address string to an integer, rejecting addresses wider than the address width
+    def parseAddress(self, address):
+      address = int(address, 16)
+      if address >> self.addressWidth:
+        raise ValueError("Address " + hex(address) + " does not fit in " + str(self.addressWidth) + " bits")
+      return address
+
+
+    # Format an integer address the way RAM addresses are written ("0x0A" for 8-bit addresses)
+    def formatAddress(self, address):
+      return self.ram.formatAddress(address)
@@ -8,12 +8,28 @@ E-mail: burdick.alex@tamu.edu, dean27@tamu.edu
 The simulator itself: the main program, which reads cache configuration values
 from the user, prompts the user with simulation options, and then performs
 various cache functionalities, including read, write, and clear.
+Given a trace file (--trace), it instead replays the trace's commands without
+prompting and prints a summary at the end, or with --mrc prints the LRU hit ratio
+of every cache size from one pass over the trace. Lower levels given with --level
+turn the configured cache into the L1 of a hierarchy (hierarchy.py).
 Also includes some helper functions
 '''
 
-from Cache import Cache
-from MainMemory import MainMemory
+from cache import Cache
+from hierarchy import CacheHierarchy, INCLUSION_POLICIES
+from mainmemory import MainMemory
+from replay import openAnyTrace, replayTrace, analyzeTrace, printSummary, traceAddresses, traceCommands
+from stackdistance import MissRatioAnalysis
+from events import openSink, EVENT_FORMATS
+from replacement import REPLACEMENT_POLICIES, POLICY_NUMBERS, policyName
+from prefetch import PREFETCHERS, PREFETCH_DEGREE
+from timing import HIT_LATENCIES, MISS_PENALTY, MEMORY_LATENCY, MEMORY_BANDWIDTH, WRITE_BUFFER_DEPTH
+from sampling import makeSampling
+from sharding import replaySharded
+import argparse
+import cProfile
 import sys
+import time
 
 # Checks the user's input for cacheSize, blockSize, and associativity when configuring cache
 def isCorrectInput(entry, lowBound, upBound):
@@ -25,130 +41,441 @@ def isCorrectInput(entry, lowBound, upBound):
     return True
 
 
-# Makes sure the address/data in hex provided by the user (for cache-read or cache-write) is valid
-def isValidByte(byte):
-  # Not valid if not in the form of "0x#"" or "0x##" (where # is an int/char)
-  if len(byte) > 4 or len(byte) < 3:
+# Makes sure an address in hex provided by the user (for cache-read or cache-write) fits in addressWidth bits
+def isValidAddress(address, addressWidth):
+  # Not valid if not in the form of "0x#" to "0x##..#" (up to one # per 4 address bits, where # is a hex int/char)
+  if len(address) < 3 or len(address) > 2 + (addressWidth + 3) // 4:
     return False
-  if byte[0:2] != "0x":
+  if address[0:2] != "0x":
     return False
 
-  # If first # is a char its hex value cant be greater than F
-  if byte[2].isalpha():
-    if byte[2].upper() > 'F':
+  # Also not valid if any # isn't a hex int/char
+  for digit in address[2:]:
+    if digit not in "0123456789abcdefABCDEF":
       return False
 
-  # Also not valid if not an int/char
-  elif not byte[2].isdigit():
-    return False
+  # Widths that aren't a multiple of 4 can still be too large with the top digit
+  return int(address, 16) < 2 ** addressWidth
+
+
+# Makes sure the data in hex provided by the user (for cache-write) is valid: "0x#" or "0x##"
+def isValidByte(byte):
+  return isValidAddress(byte, 8)
 
-  # If we have a second #, check the same things
-  if len(byte) == 4:
-    if byte[3].isalpha():
-      if byte[3].upper() > 'F':
-        return False
-    elif not byte[3].isdigit():
-      return False
 
-  return True
+# The cache configuration values in the order the user is prompted for them: (name, prompt, error message)
+CONFIG_FIELDS = [
+  ("cacheSize", "cache size", "Invalid cache size!"),
+  ("blockSize", "data block size", "Invalid block size!"),
+  ("associativity", "associativity", "Invalid associativity!"),
+  ("replacementPolicy", "replacement policy", "Invalid replacement policy!"),
+  ("writeHitPolicy", "write hit policy", "Invalid write hit policy!"),
+  ("writeMissPolicy", "write miss policy", "Invalid write miss policy!"),
+]
 
 
-# Start the simulator, initialize the physical memory with bytes in hexadecimal provided in input.txt
-print("*** Welcome to the cache simulator ***")
-print("initialize the RAM:")
-print("init-ram 0x00 0xFF")
-ourRam = MainMemory()
-ourRam.readFromFile(sys.argv[1])
-print("ram successfully initialized!")
+# Check each configuration value in prompt order, exiting on the first invalid one
+def checkConfigValue(config, name, addressWidth):
+  entry = config[name]
+  if name == "cacheSize":
+    isValid = isCorrectInput(entry, 8, 2 ** addressWidth)
+  elif name == "blockSize":
+    isValid = isCorrectInput(entry, 1, int(config["cacheSize"]))
+  # Direct-mapped: E = 1, Set-associative: 1 < E < C/B, Fully-associative: E = C/B
+  elif name == "associativity":
+    isValid = isCorrectInput(entry, 1, int(config["cacheSize"])/int(config["blockSize"]))
+  # Replacement policies by menu number or name (replacement.py)
+  elif name == "replacementPolicy":
+    isValid = entry in REPLACEMENT_POLICIES or isCorrectInput(entry, 1, len(POLICY_NUMBERS))
+  else:
+    isValid = isCorrectInput(entry, 1, 2)
+
+  if not isValid:
+    for field in CONFIG_FIELDS:
+      if field[0] == name:
+        sys.exit(field[2])
 
 
 # Get values from user on cache specifics (check validity)
-print("configure the cache:")
-
-# C
-cacheSize = input("cache size: ")
-if not isCorrectInput(cacheSize, 8, 256):
-  sys.exit("Invalid cache size!")
-
-# B
-blockSize = input("data block size: ")
-if not isCorrectInput(blockSize, 1, int(cacheSize)):
-  sys.exit("Invalid block size!")
-  
-'''
-E
-Direct-mapped: E = 1
-Set-associative: 1 < E < C/B
-Fully-associative: E = C/B
-'''
-associativity = input("associativity: ")
-if not isCorrectInput(associativity, 1, int(cacheSize)/int(blockSize)):
-  sys.exit("Invalid associativity!")
-
-replacementPolicy = input("replacement policy: ")
-if not isCorrectInput(replacementPolicy, 1, 3):
-  sys.exit("Invalid replacement policy!")
-writeHitPolicy = input("write hit policy: ")
-if not isCorrectInput(writeHitPolicy, 1, 2):
-  sys.exit("Invalid write hit policy!")
-writeMissPolicy = input("write miss policy: ")
-if not isCorrectInput(writeMissPolicy, 1, 2):
-  sys.exit("Invalid write miss policy!")
-
-# Easy testing
-'''
-cacheSize = 32
-blockSize = 8
-associativity = 1
-replacementPolicy = 1
-writeHitPolicy = 1
-writeMissPolicy = 1
-'''
+def configureFromUser(addressWidth):
+  print("configure the cache:")
+  config = {}
+  for name, prompt, message in CONFIG_FIELDS:
+    config[name] = input(prompt + ": ")
+    checkConfigValue(config, name, addressWidth)
+  return config
+
+
+# Read a cache configuration file, which uses the same names as the prompts ("cache size: 32"),
+# plus "address width"
+def readConfigFile(fileName):
+  config = {}
+  with open(fileName, "r") as configFile:
+    for line in configFile:
+      line = line.strip()
+      if line == "" or line[0] == "#":
+        continue
+      prompt, value = line.split(":", 1)
+      if prompt.strip() == "address width":
+        config["addressWidth"] = value.strip()
+        continue
+      for name, fieldPrompt, message in CONFIG_FIELDS:
+        if fieldPrompt == prompt.strip():
+          config[name] = value.strip()
+          break
+      else:
+        sys.exit("Unknown configuration value: " + prompt.strip())
+  return config
+
+
+# Command line: the RAM file, plus the trace and cache configuration for batch mode
+def readArguments():
+  parser = argparse.ArgumentParser(description="Cache simulator")
+  parser.add_argument("ramFile", help="text file with one hex byte per line used to initialize the RAM")
+  parser.add_argument("--ram-image", dest="ramImage", action="store_true", help="the RAM file is a binary RAM image (raw bytes from address 0)")
+  parser.add_argument("--mmap", action="store_true", help="with --ram-image: memory-map the image instead of reading it")
+  parser.add_argument("--dump-ram", dest="dumpRam", help="with --trace: write the RAM as a binary image to this file after the replay")
+  parser.add_argument("--trace", help="replay the cache-read/cache-write commands in this file ('-' for stdin, may be gzip/bz2/xz/zstd compressed or binary) instead of prompting")
+  parser.add_argument("--config", help="cache configuration file, one 'prompt: value' per line")
+  parser.add_argument("--verbose", action="store_true", help="print the output of every access while replaying a trace (same as --events human)")
+  parser.add_argument("--events", default="none", choices=EVENT_FORMATS, help="with --trace: output for every access, none (default) only prints the summary")
+  parser.add_argument("--events-file", dest="eventsFile", default="-", help="with --events: file the events are written to (default stdout)")
+  parser.add_argument("--address-width", dest="addressWidth", help="number of address bits (8 to 64, default 8 for a 256-byte RAM)")
+  parser.add_argument("--flush-write-back", dest="flushWriteBack", action="store_true", help="with --trace: cache-flush writes dirty lines back instead of dropping them")
+  parser.add_argument("--stats", action="store_true", help="classify misses (compulsory/capacity/conflict) and report the busiest sets (in the menu, every set in cache-view and stats)")
+  parser.add_argument("--profile", action="store_true", help="report the time spent in lookup, fill, replacement, RAM transfer, output and trace reading, and peak memory (in the menu, with stats)")
+  parser.add_argument("--cprofile", help="with --trace: run the replay under cProfile and write its statistics to this .prof file")
+  parser.add_argument("--prefetch", help="with --trace: comma-separated prefetchers for L1 (" + ", ".join(PREFETCHERS) + ")")
+  parser.add_argument("--prefetch-degree", dest="prefetchDegree", type=int, default=PREFETCH_DEGREE, help="with --prefetch: blocks each prefetcher asks for ahead")
+  parser.add_argument("--prefetch-buffer", dest="prefetchBuffer", type=int, default=0, help="with --prefetch: prefetch into a buffer of this many blocks instead of the cache")
+  parser.add_argument("--timing", action="store_true", help="count cycles and report the average memory access time, total cycles and memory bandwidth (in the menu, in cache-view and stats)")
+  parser.add_argument("--hit-latency", dest="hitLatency", default=",".join(str(latency) for latency in HIT_LATENCIES),
+    help="timing: comma-separated hit latencies in cycles of L1, L2... (levels further down take the last one)")
+  parser.add_argument("--miss-penalty", dest="missPenalty", type=int, default=MISS_PENALTY, help="timing: cycles added to every miss at every level")
+  parser.add_argument("--memory-latency", dest="memoryLatency", type=int, default=MEMORY_LATENCY, help="timing: cycles before data read from memory starts arriving")
+  parser.add_argument("--memory-bandwidth", dest="memoryBandwidth", type=int, default=MEMORY_BANDWIDTH, help="timing: bytes the memory moves per cycle")
+  parser.add_argument("--write-buffer", dest="writeBuffer", type=int, default=WRITE_BUFFER_DEPTH, help="timing: writes to memory the write buffer holds (0 for none)")
+  parser.add_argument("--restore", help="with --trace: start from this checkpoint (of a cache configured the same way) instead of an empty cache")
+  parser.add_argument("--checkpoint", help="with --trace: save the cache and RAM to this checkpoint file after the replay")
+  parser.add_argument("--sample-sets", dest="sampleSets", type=int, help="with --trace: only simulate one of this many L1 sets (chosen with --seed) and estimate the miss rate")
+  parser.add_argument("--sample-period", dest="samplePeriod", type=int, help="with --trace: only measure a window of every this many accesses and estimate the miss rate")
+  parser.add_argument("--sample-window", dest="sampleWindow", type=int, help="with --sample-period: accesses measured per period (default a tenth of it)")
+  parser.add_argument("--sample-warmup", dest="sampleWarmup", type=int, help="with --sample-period: accesses simulated without being measured before each window"
+    + " (default as many as a window); with 0 the windows start from a cache left a period behind and the estimate is biased")
+  parser.add_argument("--seed", type=int, default=0, help="with --sample-sets: seed of the choice of sets")
+  parser.add_argument("--workers", type=int, help="with --trace: replay in this many processes, each simulating a share of the sets (LRU, LFU, tree PLRU, FIFO, SRRIP and ARC)")
+  parser.add_argument("--mrc", action="store_true", help="with --trace: print LRU hit ratios for every cache size at the block size (needs only --block-size)")
+  parser.add_argument("--sets", default="1", help="with --mrc: comma-separated set counts to analyze (default 1, fully associative)")
+  parser.add_argument("--cache-size", dest="cacheSize")
+  parser.add_argument("--block-size", dest="blockSize")
+  parser.add_argument("--associativity", dest="associativity")
+  parser.add_argument("--replacement-policy", dest="replacementPolicy")
+  parser.add_argument("--write-hit-policy", dest="writeHitPolicy")
+  parser.add_argument("--write-miss-policy", dest="writeMissPolicy")
+  parser.add_argument("--level", action="append", default=[],
+    help="with --trace: a cache level below the configured one (L2, then L3...) as 'size,block size,associativity,replacement,write hit,write miss'")
+  parser.add_argument("--inclusion", default="non_inclusive", choices=INCLUSION_POLICIES, help="with --level: inclusion policy of the hierarchy")
+  return parser.parse_args()
+
+
+# Address width from the command line (or config file), exiting if it isn't usable
+def getAddressWidth(args, config):
+  addressWidth = "8"
+  if args.addressWidth is not None:
+    addressWidth = args.addressWidth
+  elif "addressWidth" in config:
+    addressWidth = config["addressWidth"]
+  if not isCorrectInput(addressWidth, 8, 64):
+    sys.exit("Invalid address width!")
+  return int(addressWidth)
+
+
+# Batch mode: configure from the command line/config file, replay the trace, print the summary
+def runBatch(args):
+  config = {}
+  if args.config is not None:
+    config = readConfigFile(args.config)
+  addressWidth = getAddressWidth(args, config)
+  # Command line flags override the config file
+  for name, prompt, message in CONFIG_FIELDS:
+    if getattr(args, name) is not None:
+      config[name] = getattr(args, name)
+    if name not in config:
+      sys.exit("Missing " + prompt + "!")
+    checkConfigValue(config, name, addressWidth)
+
+  ourRam = MainMemory(addressWidth)
+  loadRam(ourRam, args)
+
+  eventFormat = "human" if args.verbose and args.events == "none" else args.events
+  events = openSink(eventFormat, args.eventsFile, ourRam.formatAddress)
+
+  l1Config = [config[name] for name, prompt, message in CONFIG_FIELDS]
+  if args.level:
+    levelConfigs = [l1Config] + [readLevel(level, addressWidth) for level in args.level]
+    try:
+      ourCache = CacheHierarchy(ourRam, levelConfigs, args.inclusion, False, events)
+    except ValueError as error:
+      sys.exit(str(error))
+  else:
+    ourCache = Cache(ourRam, *l1Config, False, events)
+  # Statistics are about the accesses the processor makes, which are L1's
+  l1Cache = ourCache.levels[0] if args.level else ourCache
+  # A checkpoint replaces the cache's and the RAM's state (the RAM file loaded above included).
+  # The counters it holds are the warm-up's, the summary only counts this replay
+  if args.restore is not None:
+    try:
+      ourCache.restore(args.restore)
+    except (OSError, ValueError) as error:
+      sys.exit(str(error))
+    for level in (ourCache.levels if args.level else [ourCache]):
+      level.resetCounters()
+  # Optimal replacement reads the trace once beforehand for the next use of every access
+  if l1Cache.replacementPolicy == "optimal":
+    if args.trace == "-":
+      sys.exit("Optimal replacement needs a trace file, not stdin!")
+    try:
+      with openAnyTrace(args.trace) as traceFile:
+        l1Cache.setFuture(traceAddresses(traceFile))
+    except (OSError, ValueError) as error:
+      sys.exit(str(error))
+  if args.stats:
+    l1Cache.enableStats()
+  if args.prefetch is not None:
+    # Prefetch fills would be given the next use of the access that triggered them
+    if l1Cache.replacementPolicy == "optimal":
+      sys.exit("Optimal replacement can't be used with prefetching!")
+    try:
+      l1Cache.enablePrefetching(args.prefetch.split(","), args.prefetchDegree, args.prefetchBuffer)
+    except ValueError as error:
+      sys.exit(str(error))
+  if args.timing:
+    enableTiming(l1Cache, args)
+  if args.profile:
+    l1Cache.enableProfiling()
+  try:
+    sampling = makeSampling(l1Cache, args.sampleSets, args.samplePeriod, args.sampleWindow, args.sampleWarmup, args.seed)
+  except ValueError as error:
+    sys.exit(str(error))
+  # Optimal replacement's trace of next uses counts every access, skipped ones included
+  if sampling is not None and l1Cache.replacementPolicy == "optimal":
+    sys.exit("Optimal replacement can't be used with sampling!")
+
+  # Shards only see their own sets: nothing looking at the whole cache, or at every access in order, can be used with them
+  if args.workers is not None:
+    for used, name in ((args.level, "--level"), (args.stats, "--stats"), (args.prefetch is not None, "--prefetch"), (args.timing, "--timing"), (args.profile, "--profile"),
+        (eventFormat != "none", "--events/--verbose"), (sampling is not None, "sampling"), (args.restore is not None, "--restore")):
+      if used:
+        sys.exit(name + " can't be used with --workers!")
+
+  profile = cProfile.Profile() if args.cprofile is not None else None
+  # A trace that can't be opened, or a line that can't be replayed (malformed, address or data out of range), ends the run
+  try:
+    with openAnyTrace(args.trace) as traceFile:
+      start = time.perf_counter()
+      if profile is not None:
+        profile.enable()
+      if args.workers is not None:
+        numAccesses = replaySharded(ourCache, traceFile, args.workers, args.ramFile, args.ramImage, args.flushWriteBack)
+      elif sampling is not None:
+        sampling.replay(ourCache, traceCommands(traceFile, ourCache.addressWidth), args.flushWriteBack)
+        numAccesses = l1Cache.numHits + l1Cache.numMisses
+      else:
+        numAccesses = replayTrace(ourCache, traceFile, args.flushWriteBack)
+      if profile is not None:
+        profile.disable()
+      elapsed = time.perf_counter() - start
+  except (OSError, ValueError) as error:
+    sys.exit(str(error))
+  if profile is not None:
+    profile.dump_stats(args.cprofile)
+  if events is not None:
+    events.close()
+
+  # A hierarchy's overall counters are L1's, followed by every level's. When sampling they are the simulated accesses', then the estimate for the whole trace
+  printSummary(l1Cache, numAccesses, elapsed)
+  if sampling is not None:
+    sampling.printReport()
+  if args.stats:
+    l1Cache.stats.printReport()
+  if args.prefetch is not None:
+    l1Cache.prefetch.printReport()
+  if args.timing:
+    l1Cache.timing.printReport()
+  # Below L1, a hierarchy's levels are timed as L1's RAM transfer
+  if args.profile:
+    l1Cache.profiler.printReport(numAccesses, elapsed)
+  if args.level:
+    ourCache.printLevels()
+
+  if args.checkpoint is not None:
+    try:
+      ourCache.checkpoint(args.checkpoint)
+    except (OSError, ValueError) as error:
+      sys.exit(str(error))
+  if args.dumpRam is not None:
+    ourRam.dumpImage(args.dumpRam)
+
+
+# Count cycles on L1 (and the levels below it) with the latencies given on the command line
+def enableTiming(l1Cache, args):
+  try:
+    hitLatencies = [int(latency) for latency in args.hitLatency.split(",")]
+    l1Cache.enableTiming(hitLatencies, args.missPenalty, args.memoryLatency, args.memoryBandwidth, args.writeBuffer)
+  except ValueError as error:
+    sys.exit("Invalid timing parameters: " + str(error))
+
 
-ourCache = Cache(ourRam, cacheSize, blockSize, associativity, replacementPolicy, writeHitPolicy, writeMissPolicy)
-print("cache successfully configured!")
-
-
-# Indefinitely prompt user with menu until they type quit or an invalid option
-while True:
-  choice = input("*** Cache simulator menu ***\n"
-  "type one command:\n"
-  "1. cache-read\n"
-  "2. cache-write\n"
-  "3. cache-flush\n"
-  "4. cache-view\n"
-  "5. memory-view\n"
-  "6. cache-dump\n"
-  "7. memory-dump\n"
-  "8. quit\n"
-  "****************************\n")
-
-  choice = choice.split(" ")
-  numArgs = len(choice)
-
-  if choice[0] == "cache-read" and numArgs == 2 and isValidByte(choice[1]):
-    ourCache.cacheRead(choice[1])
-
-  elif choice[0] == "cache-write" and numArgs == 3 and isValidByte(choice[1]) and isValidByte(choice[2]):
-    ourCache.cacheWrite(choice[1], choice[2], -1, False)
-
-  elif choice[0] == "cache-flush" and numArgs == 1:
-    ourCache.cacheFlush()
-
-  elif choice[0] == "cache-view" and numArgs == 1:
-    ourCache.cacheView()
-
-  elif choice[0] == "memory-view" and numArgs == 1:
-    ourCache.memoryView()
-  
-  elif choice[0] == "cache-dump" and numArgs == 1:
-    ourCache.cacheDump()
-  
-  elif choice[0] == "memory-dump" and numArgs == 1:
-    ourCache.memoryDump()
-  
-  elif choice[0] == "quit" and numArgs == 1:
-    break
-  
+# Initialize the RAM from the RAM file: a text file of hex bytes, or a binary image with --ram-image (mapped with --mmap)
+def loadRam(ourRam, args):
+  if args.ramImage:
+    try:
+      ourRam.loadImage(args.ramFile, 0, args.mmap)
+    except (OSError, ValueError) as error:
+      sys.exit(str(error))
   else:
-    sys.exit("Invalid choice!")
\ No newline at end of file
+    ourRam.readFromFile(args.ramFile)
+
+
+# Configuration of a lower cache level from --level ("256,8,4,2,2,1"), checked like the prompted values
+def readLevel(level, addressWidth):
+  values = level.split(",")
+  if len(values) != len(CONFIG_FIELDS):
+    sys.exit("Invalid cache level: " + level)
+  config = {}
+  for i in range(len(CONFIG_FIELDS)):
+    name = CONFIG_FIELDS[i][0]
+    config[name] = values[i].strip()
+    checkConfigValue(config, name, addressWidth)
+  # The accesses reaching a lower level aren't known before the replay
+  if policyName(config["replacementPolicy"]) == "optimal":
+    sys.exit("Optimal replacement is only available for L1!")
+  return [config[name] for name, prompt, message in CONFIG_FIELDS]
+
+
+# Miss-ratio curve mode: one pass over the trace gives the hit ratio of every cache size at the block size
+def runMissRatioCurve(args):
+  blockSize = args.blockSize
+  if blockSize is None and args.config is not None:
+    blockSize = readConfigFile(args.config).get("blockSize")
+  if blockSize is None or not isCorrectInput(blockSize, 1, 2 ** 64) or int(blockSize) & (int(blockSize) - 1):
+    sys.exit("Invalid block size!")
+  setCounts = args.sets.split(",")
+  for numSets in setCounts:
+    if not isCorrectInput(numSets, 1, 2 ** 64) or int(numSets) & (int(numSets) - 1):
+      sys.exit("Invalid set count!")
+
+  analysis = MissRatioAnalysis(blockSize, setCounts)
+  try:
+    with openAnyTrace(args.trace) as traceFile:
+      analyzeTrace(analysis, traceFile)
+  except (OSError, ValueError) as error:
+    sys.exit(str(error))
+  analysis.printReport()
+
+
+# Indefinitely prompt user with menu until they type quit or an invalid option.
+# The stats command is only listed when statistics, timing or profiling were turned on (--stats, --timing, --profile)
+def runMenu(ourCache):
+  commands = ["cache-read", "cache-write", "cache-flush", "cache-view", "memory-view", "cache-dump", "memory-dump"]
+  if ourCache.stats is not None or ourCache.timing is not None or ourCache.profiler is not None:
+    commands.append("stats")
+  commands += ["checkpoint", "restore", "quit"]
+  menu = ("*** Cache simulator menu ***\n" + "type one command:\n"
+    + "".join(str(i + 1) + ". " + commands[i] + "\n" for i in range(len(commands))) + "****************************\n")
+
+  while True:
+    choice = input(menu)
+
+    choice = choice.split(" ")
+    numArgs = len(choice)
+
+    if choice[0] == "cache-read" and numArgs == 2 and isValidAddress(choice[1], ourCache.addressWidth):
+      ourCache.cacheRead(choice[1])
+
+    elif choice[0] == "cache-write" and numArgs == 3 and isValidAddress(choice[1], ourCache.addressWidth) and isValidByte(choice[2]):
+      ourCache.cacheWrite(choice[1], choice[2])
+
+    elif choice[0] == "cache-flush" and numArgs == 1:
+      ourCache.cacheFlush()
+
+    # Flush that writes the dirty lines back to RAM first
+    elif choice[0] == "cache-flush" and numArgs == 2 and choice[1] == "write-back":
+      ourCache.cacheFlush(True)
+
+    elif choice[0] == "cache-view" and numArgs == 1:
+      ourCache.cacheView()
+
+    elif choice[0] == "memory-view" and numArgs == 1:
+      ourCache.memoryView()
+
+    elif choice[0] == "cache-dump" and numArgs == 1:
+      ourCache.cacheDump()
+
+    elif choice[0] == "memory-dump" and numArgs == 1:
+      ourCache.memoryDump()
+
+    elif choice[0] == "stats" and numArgs == 1 and "stats" in commands:
+      ourCache.printStats()
+
+    # Save the cache and RAM to a file, or carry on from a file saved by a cache configured the same way
+    elif choice[0] == "checkpoint" and numArgs == 2:
+      try:
+        ourCache.checkpoint(choice[1])
+        print("checkpoint saved!")
+      except (OSError, ValueError) as error:
+        print(error)
+
+    elif choice[0] == "restore" and numArgs == 2:
+      try:
+        ourCache.restore(choice[1])
+        print("checkpoint restored!")
+      except (OSError, ValueError) as error:
+        print(error)
+
+    elif choice[0] == "quit" and numArgs == 1:
+      break
+
+    else:
+      sys.exit("Invalid choice!")
+
+
+def main():
+  args = readArguments()
+
+  # Batch mode: no prompts and no per-access output unless asked for
+  if args.trace is not None and args.mrc:
+    runMissRatioCurve(args)
+    return
+  if args.trace is not None:
+    runBatch(args)
+    return
+  addressWidth = getAddressWidth(args, {})
+
+  # Start the simulator, initialize the physical memory with bytes in hexadecimal provided in input.txt
+  print("*** Welcome to the cache simulator ***")
+  print("initialize the RAM:")
+  ourRam = MainMemory(addressWidth)
+  print("init-ram " + ourRam.formatAddress(0) + " " + ourRam.formatAddress(ourRam.memorySize - 1))
+  loadRam(ourRam, args)
+  print("ram successfully initialized!")
+
+  config = configureFromUser(addressWidth)
+  if policyName(config["replacementPolicy"]) == "optimal":
+    sys.exit("Optimal replacement needs a trace (--trace)!")
+  ourCache = Cache(ourRam, config["cacheSize"], config["blockSize"], config["associativity"],
+    config["replacementPolicy"], config["writeHitPolicy"], config["writeMissPolicy"])
+  # Statistics, timing and profiling are opt-in in the menu too, without them the menu's output is unchanged
+  if args.stats:
+    ourCache.enableStats()
+  if args.timing:
+    enableTiming(ourCache, args)
+  if args.profile:
+    ourCache.enableProfiling()
+  print("cache successfully configured!")
+
+  runMenu(ourCache)
+
+
+if __name__ == "__main__":
+  main()
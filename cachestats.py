@@ -0,0 +1,132 @@
+'''
+File: cachestats.py
+
+CacheStats class: opt-in per-set and per-line counters, and the classification of every
+miss as compulsory, capacity or conflict against a shadow fully-associative LRU cache
+'''
+
+from collections import OrderedDict
+from array import array
+
+# Number of sets listed (busiest first) in the batch report
+REPORT_NUM_SETS = 16
+
+class CacheStats:
+  def __init__(self, cache):
+    self.cache = cache
+    # The cache's own access, called before recording the outcome
+    self.cacheAccess = cache.access
+
+    # Misses by cause
+    self.numCompulsory = 0
+    self.numCapacity = 0
+    self.numConflict = 0
+
+    # Per set: hits, misses, and evictions of a valid line. Per line: hits, and blocks loaded into it
+    self.setHits = array("Q", bytes(8 * cache.numSets))
+    self.setMisses = array("Q", bytes(8 * cache.numSets))
+    self.setEvictions = array("Q", bytes(8 * cache.numSets))
+    self.lineHits = array("Q", bytes(8 * cache.numLines))
+    self.lineFills = array("Q", bytes(8 * cache.numLines))
+    self.flush()
+
+
+  # Zero every counter and start the shadow cache over, as when a checkpoint is restored
+  def resetCounters(self):
+    for counts in (self.setHits, self.setMisses, self.setEvictions, self.lineHits, self.lineFills):
+      counts[:] = array("Q", bytes(8 * len(counts)))
+    self.numCompulsory = 0
+    self.numCapacity = 0
+    self.numConflict = 0
+    self.flush()
+
+
+  # Forget the shadow cache's content and the blocks seen, as when the cache is cleared
+  def flush(self):
+    # Blocks of the shadow cache from least to most recently used
+    self.shadow = OrderedDict()
+    self.seen = set()
+
+
+  # Same arguments and result as Cache.access
+  def access(self, address, isWrite=False, newByte=None):
+    cache = self.cache
+    blockAddress = address >> cache.numBlockOffsetBits
+    index = blockAddress & cache.setIndexMask
+    # A miss in a full set evicts one of its lines (a set left over from before a flush is empty)
+    wasFull = cache.linesInUse[index] == cache.associativity and cache.setGeneration[index] == cache.generation
+    # Line a hit is in, taken before the access: prefetches made inside it (prefetching enabled before the
+    # statistics) can evict the block again. A block moved in from a prefetch buffer is only there after it
+    hitLine = cache.lineOf.get(blockAddress)
+    result = self.cacheAccess(address, isWrite, newByte)
+    if hitLine is None:
+      hitLine = cache.lineOf.get(blockAddress)
+
+    isFirstAccess = blockAddress not in self.seen
+    if isFirstAccess:
+      self.seen.add(blockAddress)
+
+    # The shadow cache is fully associative LRU and allocates on every access
+    shadow = self.shadow
+    shadowHit = blockAddress in shadow
+    if shadowHit:
+      shadow.move_to_end(blockAddress)
+    else:
+      shadow[blockAddress] = None
+      if len(shadow) > cache.numLines:
+        shadow.popitem(last=False)
+
+    if result.hit:
+      self.setHits[index] += 1
+      # Unknown only when a block moved in from the prefetch buffer was evicted by the access's own prefetches
+      if hitLine is not None:
+        self.lineHits[hitLine] += 1
+    else:
+      self.setMisses[index] += 1
+      if isFirstAccess:
+        self.numCompulsory += 1
+      elif not shadowHit:
+        self.numCapacity += 1
+      else:
+        self.numConflict += 1
+
+      # evictionLine is -1 when no line was allocated (no-write-allocate write miss)
+      if result.evictionLine != -1:
+        self.lineFills[index * cache.associativity + result.evictionLine] += 1
+        if wasFull:
+          self.setEvictions[index] += 1
+    return result
+
+
+  def printMissBreakdown(self):
+    print("compulsory_misses:" + str(self.numCompulsory))
+    print("capacity_misses:" + str(self.numCapacity))
+    print("conflict_misses:" + str(self.numConflict))
+
+
+  # Counters of one set, with the hits and fills of each of its lines (way order)
+  def setLine(self, index):
+    firstLine = index * self.cache.associativity
+    lastLine = firstLine + self.cache.associativity
+    return ("set:" + str(index) + " hits:" + str(self.setHits[index]) + " misses:" + str(self.setMisses[index])
+      + " evictions:" + str(self.setEvictions[index])
+      + " line_hits:" + ",".join(str(hits) for hits in self.lineHits[firstLine:lastLine])
+      + " line_fills:" + ",".join(str(fills) for fills in self.lineFills[firstLine:lastLine]))
+
+
+  # Everything, every set included (cache-view)
+  def printAll(self):
+    self.printMissBreakdown()
+    print("set_statistics:")
+    for index in range(self.cache.numSets):
+      print(self.setLine(index))
+
+
+  # Batch report: the breakdown and the REPORT_NUM_SETS sets with the most misses
+  def printReport(self):
+    self.printMissBreakdown()
+    busiest = sorted(range(self.cache.numSets), key=lambda index: (-self.setMisses[index], index))[:REPORT_NUM_SETS]
+    print("busiest_sets:")
+    for index in busiest:
+      if self.setHits[index] + self.setMisses[index] > 0:
+        print(self.setLine(index))
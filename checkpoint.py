@@ -0,0 +1,285 @@
+'''
+File: checkpoint.py
+
+Checkpoints: the state of a cache (every level of a hierarchy) and of its RAM saved to one
+binary file of raw arrays, and restored into a cache configured the same way
+'''
+
+from collections import OrderedDict
+from array import array
+import struct
+import sys
+
+MAGIC = b"CSCHKPT\x00"
+VERSION = 2
+# magic, version, number of cache levels, address width (bits), byte order of the arrays (0 little, 1 big), padding to 16 bytes
+HEADER = struct.Struct("<8sHHBB2x")
+# Per level: cache size, block size, associativity, write hit and write miss policies (numbers), length of the replacement policy's name
+LEVEL_HEADER = struct.Struct("<QQQBBH")
+# Per level: hits, misses, write-backs, fill bytes, write-through bytes, write-back bytes, length of the replacement state
+COUNTERS = struct.Struct("<7Q")
+# Per attribute of the replacement state: length of its name, kind, type code, number of items
+STATE_HEADER = struct.Struct("<HBcQ")
+# Kinds of attributes: an int, an array, a bytearray, a list of numbers, a list of dicts (or None) of integers
+STATE_INT = 0
+STATE_ARRAY = 1
+STATE_BYTES = 2
+STATE_NUMBERS = 3
+STATE_DICTS = 4
+# After a list of dicts' header: levels of keys, whether the innermost keys have values, number of rows
+DICTS_HEADER = struct.Struct("<BBQ")
+# Per RAM page: page number
+PAGE_HEADER = struct.Struct("<Q")
+COUNTER_NAMES = ["numHits", "numMisses", "numWriteBacks", "numFillBytes", "numWriteThroughBytes", "numWriteBackBytes"]
+
+
+# The levels of a cache or of a hierarchy, L1 first
+def levelsOf(cache):
+  return cache.levels if hasattr(cache, "levels") else [cache]
+
+
+# The data of a replacement policy (wrappers set on it, such as profiling's, and the trace of optimal replacement are left out)
+def policyState(policy):
+  return {name: value for name, value in vars(policy).items() if not callable(value) and name != "future"}
+
+
+# Write the state of cache (a Cache or a CacheHierarchy) and of its RAM to fileName
+def saveCheckpoint(cache, fileName):
+  levels = levelsOf(cache)
+  ram = levels[-1].ram
+  with open(fileName, "wb") as f:
+    f.write(HEADER.pack(MAGIC, VERSION, len(levels), ram.addressWidth, int(sys.byteorder == "big")))
+    for level in levels:
+      level.clearStaleSets()
+      if level.replacementPolicy == "optimal":
+        raise ValueError("A cache with optimal replacement can't be checkpointed, its state depends on the trace")
+      name = level.replacementPolicy.encode()
+      f.write(LEVEL_HEADER.pack(level.cacheSize, level.blockSize, level.associativity, policyNumber(level.writeHitPolicy, "write_through"),
+        policyNumber(level.writeMissPolicy, "write_allocate"), len(name)))
+      f.write(name)
+      state = encodePolicyState(level.replacement)
+      f.write(COUNTERS.pack(*[getattr(level, counter) for counter in COUNTER_NAMES], len(state)))
+      f.write(level.tags)
+      f.write(level.valid)
+      f.write(level.dirty)
+      f.write(level.linesInUse)
+      f.write(level.data)
+      f.write(state)
+
+    for pageNumber in ram.usedPages():
+      f.write(PAGE_HEADER.pack(pageNumber))
+      f.write(ram.readBlock(pageNumber << ram.pageBits, ram.pageSize))
+
+
+# The replacement state as raw typed buffers. Values that aren't ints or lists (tables fixed by the associativity) are left
+# out, the policy's constructor makes them again
+def encodePolicyState(policy):
+  parts = []
+  for name, value in policyState(policy).items():
+    if not isinstance(value, (int, array, bytearray, list)):
+      continue
+    if isinstance(value, int):
+      kind, typeCode, numItems, payload = STATE_INT, b"q", 1, struct.pack("<q", value)
+    elif isinstance(value, array):
+      kind, typeCode, numItems, payload = STATE_ARRAY, value.typecode.encode(), len(value), value.tobytes()
+    elif isinstance(value, bytearray):
+      kind, typeCode, numItems, payload = STATE_BYTES, b"B", len(value), bytes(value)
+    elif all(isinstance(item, (int, float)) for item in value):
+      numbers = array("d" if any(isinstance(item, float) for item in value) else "q", value)
+      kind, typeCode, numItems, payload = STATE_NUMBERS, numbers.typecode.encode(), len(value), numbers.tobytes()
+    else:
+      kind, typeCode, numItems, payload = STATE_DICTS, b"o" if any(isinstance(item, OrderedDict) for item in value) else b"d", len(value), encodeDicts(value)
+    encodedName = name.encode()
+    parts += [STATE_HEADER.pack(len(encodedName), kind, typeCode, numItems), encodedName, payload]
+  return b"".join(parts)
+
+
+# A list of dicts (or None): the number of rows of each (-1 for None), then the rows, the keys from the outermost dict in
+# followed by the innermost key's value unless it is None
+def encodeDicts(dicts):
+  sizes = array("q")
+  rows = array("Q")
+  numKeys = 0
+  hasValues = 0
+  for item in dicts:
+    if item is None:
+      sizes.append(-1)
+      continue
+    numRows = 0
+    for keys, value in dictRows(item, ()):
+      rows.extend(keys)
+      numKeys = len(keys)
+      if value is not None:
+        rows.append(value)
+        hasValues = 1
+      numRows += 1
+    sizes.append(numRows)
+  return DICTS_HEADER.pack(numKeys, hasValues, sum(size for size in sizes if size > 0)) + sizes.tobytes() + rows.tobytes()
+
+
+# The (keys, value) of every innermost entry of nested dicts, in iteration order
+def dictRows(mapping, keys):
+  for key, value in mapping.items():
+    if isinstance(value, dict):
+      yield from dictRows(value, keys + (key,))
+    else:
+      yield keys + (key,), value
+
+
+# The attributes written by encodePolicyState, checked against policy (of the same kind and size), ValueError if they don't fit it
+def decodePolicyState(policy, content):
+  state = {}
+  position = 0
+  try:
+    while position < len(content):
+      nameLength, kind, typeCode, numItems = STATE_HEADER.unpack_from(content, position)
+      position += STATE_HEADER.size
+      name = bytes(content[position:position + nameLength]).decode()
+      position += nameLength
+      current = getattr(policy, name, None)
+      typeCode = typeCode.decode()
+      if kind == STATE_DICTS:
+        value, position = decodeDicts(content, position, numItems, OrderedDict if typeCode == "o" else dict)
+      else:
+        value = array(typeCode)
+        size = numItems * value.itemsize
+        if position + size > len(content):
+          raise ValueError("truncated")
+        value.frombytes(content[position:position + size])
+        position += size
+        if kind == STATE_INT:
+          value = value[0]
+        elif kind == STATE_BYTES:
+          value = bytearray(value)
+        elif kind == STATE_NUMBERS:
+          value = value.tolist()
+      if (type(value) != type(current) or (not isinstance(value, int) and len(value) != len(current))
+          or (isinstance(value, array) and value.typecode != current.typecode)):
+        raise ValueError("doesn't match")
+      state[name] = value
+  except (struct.error, ValueError):
+    raise ValueError("Checkpoint's replacement state doesn't match the " + type(policy).__name__ + " policy")
+  return state
+
+
+# A list of numItems dicts written by encodeDicts starting at position, returns it and the position after it
+def decodeDicts(content, position, numItems, dictType):
+  numKeys, hasValues, numRows = DICTS_HEADER.unpack_from(content, position)
+  position += DICTS_HEADER.size
+  sizes = array("q")
+  sizes.frombytes(content[position:position + 8 * numItems])
+  position += 8 * numItems
+  width = numKeys + hasValues
+  rows = array("Q")
+  rows.frombytes(content[position:position + 8 * numRows * width])
+  position += 8 * numRows * width
+  if len(sizes) != numItems or len(rows) != numRows * width:
+    raise ValueError("truncated")
+
+  dicts = []
+  row = 0
+  for size in sizes:
+    if size < 0:
+      dicts.append(None)
+      continue
+    mapping = dictType()
+    for i in range(row, row + size):
+      entry = rows[i * width:(i + 1) * width]
+      inner = mapping
+      for key in entry[:numKeys - 1]:
+        if key not in inner:
+          inner[key] = dictType()
+        inner = inner[key]
+      inner[entry[numKeys - 1]] = entry[numKeys] if hasValues else None
+    row += size
+    dicts.append(mapping)
+  return dicts, position
+
+
+# Write hit/miss policies as their numbers in the menu (1 for first, 2 otherwise)
+def policyNumber(policy, first):
+  return 1 if policy == first else 2
+
+
+# Restore the state saved by saveCheckpoint into cache (configured as the one saved) and its RAM, ValueError if they don't match.
+# The statistics' counters start over and the prefetch buffer is emptied, prefetcher, timing and profiling counters go on
+def restoreCheckpoint(cache, fileName):
+  levels = levelsOf(cache)
+  ram = levels[-1].ram
+  with open(fileName, "rb") as f:
+    content = memoryview(f.read())
+
+  magic, version, numLevels, addressWidth, bigEndian = HEADER.unpack_from(content, 0)
+  if magic != MAGIC or version != VERSION:
+    raise ValueError(fileName + " is not a cache simulator checkpoint")
+  if numLevels != len(levels) or addressWidth != ram.addressWidth:
+    raise ValueError("Checkpoint doesn't match the cache configuration: " + str(numLevels) + " level(s) and "
+      + str(addressWidth) + "-bit addresses")
+  if bigEndian != (sys.byteorder == "big"):
+    raise ValueError("Checkpoint was made on a machine of another byte order")
+  position = HEADER.size
+
+  # Check every level before changing anything: (level, counters, where its arrays start)
+  saved = []
+  # The replacement state of each level
+  policies = []
+  try:
+    for level in levels:
+      cacheSize, blockSize, associativity, writeHitPolicy, writeMissPolicy, nameLength = LEVEL_HEADER.unpack_from(content, position)
+      position += LEVEL_HEADER.size
+      name = bytes(content[position:position + nameLength]).decode()
+      position += nameLength
+      if ((cacheSize, blockSize, associativity, name) != (level.cacheSize, level.blockSize, level.associativity, level.replacementPolicy)
+          or writeHitPolicy != policyNumber(level.writeHitPolicy, "write_through")
+          or writeMissPolicy != policyNumber(level.writeMissPolicy, "write_allocate")):
+        raise ValueError("Checkpoint doesn't match the cache configuration: " + str(cacheSize) + "," + str(blockSize) + ","
+          + str(associativity) + "," + name + "," + str(writeHitPolicy) + "," + str(writeMissPolicy))
+      counters = COUNTERS.unpack_from(content, position)
+      position += COUNTERS.size
+      saved.append((level, counters, position))
+      position += 8 * level.numLines + 2 * level.numLines + 8 * level.numSets + level.numLines * level.blockSize
+      if position + counters[-1] > len(content):
+        raise ValueError(fileName + " is truncated")
+      policies.append(decodePolicyState(level.replacement, content[position:position + counters[-1]]))
+      position += counters[-1]
+  except struct.error:
+    raise ValueError(fileName + " is truncated")
+  if position > len(content) or (len(content) - position) % (PAGE_HEADER.size + ram.pageSize) != 0:
+    raise ValueError(fileName + " is truncated")
+
+  for (level, counters, start), policy in zip(saved, policies):
+    # Start from an empty cache (which also empties the prefetch buffer), then load the arrays in place
+    level.clearLines()
+    level.clearStaleSets()
+    for i in range(len(COUNTER_NAMES)):
+      setattr(level, COUNTER_NAMES[i], counters[i])
+    for lineArray in (level.tags, level.valid, level.dirty, level.linesInUse, level.data):
+      size = memoryview(lineArray).nbytes
+      memoryview(lineArray).cast("B")[:] = content[start:start + size]
+      start += size
+    vars(level.replacement).update(policy)
+    if level.stats is not None:
+      level.stats.resetCounters()
+
+    # The block held by each valid line is its tag followed by its set index
+    tags = level.tags
+    setBits = level.numSetIndexBits
+    associativity = level.associativity
+    level.lineOf = {(tags[line] << setBits) | (line // associativity): line for line in range(level.numLines) if level.valid[line]}
+
+  # The RAM is replaced by the saved pages, a mapped image is let go
+  ram.image = None
+  ram.imageSize = 0
+  ram.pages = {}
+  if ram.pageBits == ram.addressWidth:
+    ram.pages[0] = bytearray(ram.pageSize)
+  while position < len(content):
+    pageNumber = PAGE_HEADER.unpack_from(content, position)[0]
+    position += PAGE_HEADER.size
+    ram.pages[pageNumber] = bytearray(content[position:position + ram.pageSize])
+    position += ram.pageSize
+
+  # The timing model measures each access by the counters it changed, they were replaced
+  for level in levels:
+    if level.timing is not None:
+      level.timing.syncCounters()
@@ -0,0 +1,120 @@
+'''
+File: events.py
+
+Event sinks: where a cache sends the outcome of every access and flush, printed for people
+(HumanSink) or written one record per access for other tools (JsonLinesSink, CsvSink)
+'''
+
+import sys
+
+EVENT_FORMATS = ["none", "human", "jsonl", "csv"]
+
+# Buffer size of the files structured events are written to
+EVENT_BUFFER_SIZE = 1 << 20
+
+# Columns of a CSV event record
+CSV_FIELDS = ["op", "address", "set", "tag", "hit", "eviction_line", "ram_address", "data", "dirty"]
+
+
+# Open a sink writing events in the given format to fileName ("-" for stdout), None for "none".
+# formatAddress is the cache's, used for the addresses of the human-readable output
+def openSink(eventFormat, fileName, formatAddress):
+  if eventFormat == "none":
+    return None
+  if eventFormat == "human":
+    return HumanSink(formatAddress, openStream(fileName, False))
+  if eventFormat == "jsonl":
+    return JsonLinesSink(openStream(fileName, True))
+  if eventFormat == "csv":
+    return CsvSink(openStream(fileName, True))
+  raise ValueError("Unknown event format: " + str(eventFormat))
+
+
+# The stream events are written to: stdout ("-"), or a file, with a large buffer if buffered
+def openStream(fileName, buffered):
+  if fileName == "-":
+    return sys.stdout
+  return open(fileName, "w", buffering=EVENT_BUFFER_SIZE if buffered else -1, newline="")
+
+
+class HumanSink:
+  def __init__(self, formatAddress, stream=None):
+    self.formatAddress = formatAddress
+    self.stream = stream if stream is not None else sys.stdout
+
+
+  # Formatted output of an access, same for reads and writes apart from the hit label and dirty bit
+  def access(self, result):
+    lines = ["set:" + str(result.setIndex), "tag:" + "{:X}".format(result.tag)]
+    if result.isWrite:
+      lines.append("write_hit:" + ("yes" if result.hit else "no"))
+    else:
+      lines.append("hit:" + ("yes" if result.hit else "no"))
+    lines.append("eviction_line:" + str(result.evictionLine))
+    if result.ramAddress == -1:
+      lines.append("ram_address:-1")
+    else:
+      lines.append("ram_address:" + self.formatAddress(result.ramAddress))
+    lines.append("data:0x" + "{:02X}".format(result.data))
+    if result.isWrite:
+      lines.append("dirty_bit:" + str(result.dirty))
+    lines.append("")
+    self.stream.write("\n".join(lines))
+
+
+  def cleared(self):
+    self.stream.write("cache_cleared\n")
+
+
+  def close(self):
+    closeStream(self.stream)
+
+
+class JsonLinesSink:
+  def __init__(self, stream):
+    self.stream = stream
+
+
+  # One JSON object per line, built directly since every field is a number or a boolean
+  def access(self, result):
+    self.stream.write('{"op":"' + ("write" if result.isWrite else "read") + '","address":' + str(result.address)
+      + ',"set":' + str(result.setIndex) + ',"tag":' + str(result.tag) + ',"hit":' + ("true" if result.hit else "false")
+      + ',"eviction_line":' + str(result.evictionLine) + ',"ram_address":' + str(result.ramAddress)
+      + ',"data":' + str(result.data) + ',"dirty":' + str(result.dirty) + "}\n")
+
+
+  def cleared(self):
+    self.stream.write('{"op":"flush"}\n')
+
+
+  def close(self):
+    closeStream(self.stream)
+
+
+class CsvSink:
+  def __init__(self, stream):
+    self.stream = stream
+    self.stream.write(",".join(CSV_FIELDS) + "\n")
+
+
+  def access(self, result):
+    self.stream.write(("write," if result.isWrite else "read,") + str(result.address) + "," + str(result.setIndex)
+      + "," + str(result.tag) + (",1" if result.hit else ",0") + "," + str(result.evictionLine)
+      + "," + str(result.ramAddress) + "," + str(result.data) + "," + str(result.dirty) + "\n")
+
+
+  # A flush only has its op
+  def cleared(self):
+    self.stream.write("flush" + "," * (len(CSV_FIELDS) - 1) + "\n")
+
+
+  def close(self):
+    closeStream(self.stream)
+
+
+# Flush what is buffered and close the stream, unless it is stdout
+def closeStream(stream):
+  if stream is sys.stdout:
+    stream.flush()
+  else:
+    stream.close()
@@ -0,0 +1,117 @@
+'''
+File: hierarchy.py
+
+CacheHierarchy class: chained Cache levels (L1, L2, L3...), each the ram of the level above,
+sharing blocks as the inclusion policy says (non_inclusive, inclusive or exclusive)
+'''
+
+from cache import Cache
+from events import HumanSink
+from checkpoint import saveCheckpoint, restoreCheckpoint
+
+# non_inclusive: blocks are loaded into every level that misses on them, each level evicts on its own
+# inclusive: as non_inclusive, and a block evicted from a level is invalidated in every level above it
+# exclusive: a block is in one level at most, levels below L1 are victim caches of the level above
+INCLUSION_POLICIES = ["non_inclusive", "inclusive", "exclusive"]
+
+class CacheHierarchy:
+  def __init__(self, ram, levelConfigs, inclusionPolicy="non_inclusive", verbose=True, events=None):
+    if inclusionPolicy not in INCLUSION_POLICIES:
+      raise ValueError("Unknown inclusion policy: " + str(inclusionPolicy))
+    if not levelConfigs:
+      raise ValueError("A cache hierarchy needs at least one level")
+    self.ram = ram
+    self.inclusionPolicy = inclusionPolicy
+    self.addressWidth = ram.addressWidth
+
+    # Build from the last level up, so each level can be given the one below it as its ram.
+    # levelConfigs holds (C, B, E, replacementPolicy, writeHitPolicy, writeMissPolicy) for L1, L2...
+    self.levels = []
+    below = ram
+    for config in reversed(levelConfigs):
+      level = Cache(below, *config, verbose=False)
+      level.inclusion = inclusionPolicy
+      self.levels.insert(0, level)
+      below = level
+
+    for i in range(1, len(self.levels)):
+      upper = self.levels[i - 1]
+      level = self.levels[i]
+      # A block of the level above has to fit in one block of the level below, exclusive levels swap whole blocks
+      if level.blockSize < upper.blockSize or (inclusionPolicy == "exclusive" and level.blockSize != upper.blockSize):
+        raise ValueError("Data block size of L" + str(i + 1) + " doesn't match the block size of L" + str(i))
+      if inclusionPolicy == "inclusive":
+        level.upperLevels = self.levels[i - 1::-1]
+      elif inclusionPolicy == "exclusive":
+        upper.notifyCleanEvictions = True
+
+    # Only L1 answers the processor, so only its accesses are sent to the event sink (see Cache)
+    if events is None and verbose:
+      events = HumanSink(self.levels[0].formatAddress)
+    self.levels[0].events = events
+
+
+  @property
+  def events(self):
+    return self.levels[0].events
+
+
+  # Read/write through L1, the levels below are accessed as L1 needs them (same arguments and result as Cache.access)
+  def access(self, address, isWrite=False, newByte=None):
+    return self.levels[0].access(address, isWrite, newByte)
+
+
+  def cacheRead(self, address):
+    return self.levels[0].cacheRead(address)
+
+
+  def cacheWrite(self, address, data):
+    return self.levels[0].cacheWrite(address, data)
+
+
+  # Clear every level, from L1 down so that with writeBack each level's dirty lines are written into the level below before it is cleared
+  def cacheFlush(self, writeBack=False):
+    for level in self.levels:
+      if writeBack:
+        level.writeBackAll()
+      level.clearLines()
+    if self.events is not None:
+      self.events.cleared()
+
+
+  # Save every level's state and the RAM's to a checkpoint file, or restore them from one (checkpoint.py)
+  def checkpoint(self, fileName):
+    saveCheckpoint(self, fileName)
+
+
+  def restore(self, fileName):
+    restoreCheckpoint(self, fileName)
+
+
+  # Display every level's configuration and content
+  def cacheView(self):
+    print("inclusion_policy:" + self.inclusionPolicy)
+    for i in range(len(self.levels)):
+      print("level:L" + str(i + 1))
+      self.levels[i].cacheView()
+
+
+  def memoryView(self):
+    self.ram.memoryView()
+
+
+  def memoryDump(self):
+    self.ram.memoryDump()
+
+
+  # Per-level counters: how many of the accesses reaching each level it absorbed, and its traffic with the level below
+  def printLevels(self):
+    print("inclusion_policy:" + self.inclusionPolicy)
+    for i in range(len(self.levels)):
+      level = self.levels[i]
+      numAccesses = level.numHits + level.numMisses
+      hitRate = level.numHits / numAccesses if numAccesses > 0 else 0.0
+      print("L" + str(i + 1) + " accesses:" + str(numAccesses) + " hits:" + str(level.numHits) + " misses:" + str(level.numMisses)
+        + " write_backs:" + str(level.numWriteBacks) + " hit_rate:" + "{:.4f}".format(hitRate)
+        + " fill_bytes:" + str(level.numFillBytes) + " write_through_bytes:" + str(level.numWriteThroughBytes)
+        + " write_back_bytes:" + str(level.numWriteBackBytes))
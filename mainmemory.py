@@ -5,13 +5,47 @@ Date: 04/30/2020
 Section: 511
 E-mail: burdick.alex@tamu.edu, dean27@tamu.edu
 
-MainMemory class: represents a 256-byte RAM with each word being 1 byte.
-Assigns hex data values from a text file to their corresponding hex addresses 
+MainMemory class: represents a RAM of 2^addressWidth bytes (256 bytes by default) with
+each word being 1 byte. Assigns hex data values from a text file (or the bytes of a
+binary RAM image) to their corresponding addresses.
+Memory is stored in fixed-size pages of bytes, so block reads and writes are slice copies.
+Memories up to FLAT_MEMORY_SIZE bytes are one page (a single bytearray); larger ones are
+sparse, pages are only allocated when written and bytes never loaded or written read as 00.
+A RAM image can be memory-mapped instead of read: its pages are then read straight from
+the mapping and only copied into memory when written
 '''
 
+import mmap
+
+# Memories up to this many bytes are shown/dumped in full, larger ones only show the bytes in use
+FULL_LISTING_SIZE = 2 ** 16
+# Memories up to this many bytes are a single bytearray, larger ones are split into pages of 2^PAGE_BITS bytes
+FLAT_MEMORY_SIZE = 2 ** 24
+PAGE_BITS = 12
+# Bytes read from a RAM image file at a time
+IMAGE_CHUNK_SIZE = 1 << 20
+
 class MainMemory:
-    def __init__(self):
-      self.content = {}
+    def __init__(self, addressWidth=8):
+      self.addressWidth = int(addressWidth)
+      self.memorySize = 2 ** self.addressWidth
+      # Number of hex digits in an address, used when formatting addresses
+      self.addressDigits = max(2, (self.addressWidth + 3) // 4)
+
+      # Page number -> bytearray of pageSize bytes, a flat memory is page 0
+      if self.memorySize <= FLAT_MEMORY_SIZE:
+        self.pageBits = self.addressWidth
+      else:
+        self.pageBits = PAGE_BITS
+      self.pageSize = 2 ** self.pageBits
+      self.pageMask = self.pageSize - 1
+      self.pages = {}
+      if self.memorySize <= FLAT_MEMORY_SIZE:
+        self.pages[0] = bytearray(self.pageSize)
+
+      # Memory-mapped RAM image (see loadImage) backing the pages that haven't been written
+      self.image = None
+      self.imageSize = 0
 
     def readFromFile(self, fileName):
       # If file name is invalid, ask user for new file name
@@ -24,89 +58,193 @@ class MainMemory:
           continue
         break
 
-      # Get a list of the lines from the file and update dictionary, assuming file has valid data entries
+      # Get a list of the lines from the file and update memory, assuming file has valid data entries.
+      # Lines are either consecutive data bytes starting at 0x00, or "address:data" pairs (as written by memoryDump for large memories)
       data = dataFile.read().splitlines()
-
-      # Addresses 0-15 need a filler "0" in the address
-      for i in range(16):
-        convertedAddress = str(hex(i))
-        address = convertedAddress[0:2] + "0" + convertedAddress[-1].upper()
-        self.content[address] = str(data[i]).upper()
-
-      for i in range(16, 256):
-        address = "0x" + hex(i)[2:].upper()
-        self.content[address] = str(data[i]).upper()
-
-      dataFile.close()
-    
-
-    # Get the blockSize blocks of data starting at address - offset
-    def getBlocks(self, address, blockSize, offset):
-      # Convert hex address to decimal, which is the particular starting RAM addresss
-      startKey = int(address[2:], 16)
-      startKey -= offset
-      endKey = startKey + blockSize
-      fullBlock = []
-
-      for i in range(startKey, endKey):  # (start key, end key)
-        # Convert int addresss back to hex and add its data to full block
-        hexKey = "0x"
-        if i < 16:
-          hexKey += "0"
-        hexKey += hex(i)[2:].upper()
-        fullBlock.append(self.content[hexKey])
-
-      return fullBlock
-
-
-    # Set the blockSize blocks of data starting at address - offset
-    def setBlocks(self, address, newBlock, offset):
-      ramKeys = list(self.content.keys())
-      start = 0
-
-      for i in range(len(ramKeys)):
-        if(ramKeys[i] == address):
-          start = i
+      address = 0
+      for line in data:
+        line = line.strip()
+        if line == "":
+          continue
+        if ":" in line:
+          address, line = line.split(":")
+          address = int(address, 16)
+        if address >= self.memorySize:
           break
+        self.writeBlock(address, bytes((int(line, 16),)))
+        address += 1
 
-      start -= offset
-      end = start + len(newBlock)
-
-      j = 0
-      for i in range(start, end):  # (start key, end key)
-        self.content[ramKeys[i]] = newBlock[j]
-        j+=1
+      dataFile.close()
 
 
-    # Dump the memory content into ram.txt
+    # Load a binary RAM image (raw bytes, the first one at address). With useMmap the image file is mapped instead of read,
+    # which only works for images at address 0 and replaces everything in memory
+    def loadImage(self, fileName, address=0, useMmap=False):
+      with open(fileName, "rb") as imageFile:
+        imageFile.seek(0, 2)
+        imageSize = imageFile.tell()
+        if address + imageSize > self.memorySize:
+          raise ValueError("RAM image " + fileName + " doesn't fit in " + str(self.memorySize) + " bytes")
+
+        if useMmap and imageSize > 0:
+          if address != 0 or self.image is not None:
+            raise ValueError("Only one RAM image can be mapped, at address 0")
+          self.image = mmap.mmap(imageFile.fileno(), 0, access=mmap.ACCESS_READ)
+          self.imageSize = imageSize
+          self.pages = {}
+          return
+
+        imageFile.seek(0)
+        while True:
+          chunk = imageFile.read(IMAGE_CHUNK_SIZE)
+          if not chunk:
+            break
+          self.writeBlock(address, chunk)
+          address += len(chunk)
+
+
+    # Write the memory as a binary RAM image: every byte from address 0 up to the last page in use (unused pages are left as holes)
+    def dumpImage(self, fileName):
+      with open(fileName, "wb") as imageFile:
+        end = 0
+        for pageNumber in self.usedPages():
+          start = pageNumber << self.pageBits
+          imageFile.seek(start)
+          imageFile.write(self.readBlock(start, self.pageSize))
+          end = start + self.pageSize
+        imageFile.truncate(end)
+
+
+    # Numbers of the pages that hold data (written, or part of the mapped image) in increasing order
+    def usedPages(self):
+      return sorted(set(self.pages) | set(range((self.imageSize + self.pageMask) >> self.pageBits)))
+
+
+    # A new page holding the image's bytes for pageNumber (zeros past the image's end)
+    def imagePage(self, pageNumber):
+      page = bytearray(self.pageSize)
+      start = pageNumber << self.pageBits
+      if start < self.imageSize:
+        content = self.image[start:start + self.pageSize]
+        page[0:len(content)] = content
+      return page
+
+
+    # The bytes at offset..offset+size of one page, without allocating it
+    def readPage(self, pageNumber, offset, size):
+      page = self.pages.get(pageNumber)
+      if page is not None:
+        return page[offset:offset + size]
+      start = (pageNumber << self.pageBits) + offset
+      if start >= self.imageSize:
+        return bytes(size)
+      content = self.image[start:start + size]
+      if len(content) < size:
+        content += bytes(size - len(content))
+      return content
+
+
+    # Format an integer address the way RAM addresses are written ("0x0A" for a 256-byte RAM)
+    def formatAddress(self, address):
+      return "0x" + "{:X}".format(address).zfill(self.addressDigits)
+
+
+    # Backing-store interface shared with cache levels (see hierarchy.py), blocks of data are bytes
+
+    # The size bytes starting at address
+    def readBlock(self, address, size):
+      pageNumber = address >> self.pageBits
+      offset = address & self.pageMask
+      # Blocks are aligned and no larger than a page, so they nearly always sit in one page
+      if offset + size <= self.pageSize:
+        return self.readPage(pageNumber, offset, size)
+
+      pieces = []
+      while size > 0:
+        pieceSize = min(size, self.pageSize - offset)
+        pieces.append(self.readPage(pageNumber, offset, pieceSize))
+        size -= pieceSize
+        pageNumber += 1
+        offset = 0
+      return b"".join(pieces)
+
+
+    # Store the bytes of data starting at address, allocating the pages written
+    def writeBlock(self, address, data):
+      pageNumber = address >> self.pageBits
+      offset = address & self.pageMask
+      written = 0
+      while written < len(data):
+        pieceSize = min(len(data) - written, self.pageSize - offset)
+        page = self.pages.get(pageNumber)
+        if page is None:
+          page = self.imagePage(pageNumber)
+          self.pages[pageNumber] = page
+        page[offset:offset + pieceSize] = data[written:written + pieceSize]
+        written += pieceSize
+        pageNumber += 1
+        offset = 0
+
+
+    # A cache missed on the size bytes at address: their data, and whether they are dirty (never, memory is the last level)
+    def fetchBlock(self, address, size):
+      return self.readBlock(address, size), 0
+
+
+    # A cache dropped the block at address: only dirty data needs storing
+    def evictBlock(self, address, data, dirty):
+      if dirty:
+        self.writeBlock(address, data)
+
+
+    # A copy to simulate on separately: written pages are copied, a mapped image is shared (it is never written)
+    def copy(self):
+      ram = MainMemory.__new__(MainMemory)
+      ram.__dict__.update(self.__dict__)
+      ram.pages = {pageNumber: bytearray(page) for pageNumber, page in self.pages.items()}
+      return ram
+
+
+    # The addresses shown/dumped: every address for small memories, otherwise only those that hold a nonzero byte
+    def listedAddresses(self):
+      if self.memorySize <= FULL_LISTING_SIZE:
+        return range(self.memorySize)
+      addresses = []
+      for pageNumber in self.usedPages():
+        start = pageNumber << self.pageBits
+        page = self.readBlock(start, self.pageSize)
+        for offset in range(self.pageSize):
+          if page[offset]:
+            addresses.append(start + offset)
+      return addresses
+
+
+    # Dump the memory content into ram.txt (as "address:data" lines for large memories)
     def memoryDump(self):
+      isFull = self.memorySize <= FULL_LISTING_SIZE
       with open("ram.txt","w+") as f:
-        ramKeys = list(self.content.keys())
-        for i in range(len(ramKeys)):
-          if(i == len(ramKeys) - 1):
-            f.write(self.content[ramKeys[i]])
-          else:
-            f.write(self.content[ramKeys[i]] + "\n")
+        lines = []
+        if isFull:
+          for byte in self.readBlock(0, self.memorySize):
+            lines.append("{:02X}".format(byte))
+        else:
+          for address in self.listedAddresses():
+            lines.append(self.formatAddress(address) + ":" + "{:02X}".format(self.readBlock(address, 1)[0]))
+        f.write("\n".join(lines))
 
 
     # Displays the memory content and status
     def memoryView(self):
-      ramKeys = list(self.content.keys())
-      print("memory_size:" + str(len(ramKeys)))
+      print("memory_size:" + str(self.memorySize))
       print("memory_content:")
       print("Address:Data")
-      rest = ""
-      
-      for i in range(len(ramKeys)):
-        if (i == 0):
-          print(ramKeys[i] + ":",end="")
-          rest += self.content[ramKeys[i]] + " "
-        elif (i % 8 == 0):
-          print(rest[:-1])
-          rest = ""
-          print(ramKeys[i] + ":",end="")
-          rest += self.content[ramKeys[i]] + " "
-        else:
-          rest += self.content[ramKeys[i]] + " "
-      print(rest)
 
+      # Group bytes in rows of 8, starting at 8-byte aligned addresses
+      rowAddresses = []
+      for address in self.listedAddresses():
+        rowAddress = address - address % 8
+        if not rowAddresses or rowAddresses[-1] != rowAddress:
+          rowAddresses.append(rowAddress)
+
+      for rowAddress in rowAddresses:
+        print(self.formatAddress(rowAddress) + ":" + self.readBlock(rowAddress, 8).hex(" ").upper())
@@ -0,0 +1,220 @@
+'''
+File: prefetch.py
+
+Hardware prefetchers (next line, stride, stream) and the PrefetchUnit that loads the blocks
+they ask for into the cache or a prefetch buffer and counts how useful they were
+'''
+
+from collections import OrderedDict
+
+# Blocks each prefetcher asks for ahead of the accesses
+PREFETCH_DEGREE = 2
+# A prefetched block accessed within this many accesses of its prefetch arrived late
+LATE_DISTANCE = 4
+# Address bits of the regions the stride prefetcher tracks separately (4 KiB pages), and the number it tracks
+STRIDE_REGION_BITS = 12
+STRIDE_TABLE_SIZE = 64
+# Number of streams the stream prefetcher follows, and of recent miss blocks it looks for neighbours in
+NUM_STREAMS = 4
+MISS_HISTORY_SIZE = 16
+
+
+class NextLinePrefetcher:
+  def __init__(self, cache, degree=PREFETCH_DEGREE):
+    self.degree = degree
+
+
+  def candidates(self, blockAddress, hit, firstUse):
+    if hit and not firstUse:
+      return []
+    return [blockAddress + i for i in range(1, self.degree + 1)]
+
+
+class StridePrefetcher:
+  def __init__(self, cache, degree=PREFETCH_DEGREE):
+    self.degree = degree
+    self.regionShift = max(0, STRIDE_REGION_BITS - cache.numBlockOffsetBits)
+    # Region -> [last block, stride, confidence (0 to 3)], least recently used region first
+    self.table = OrderedDict()
+
+
+  def candidates(self, blockAddress, hit, firstUse):
+    region = blockAddress >> self.regionShift
+    entry = self.table.get(region)
+    if entry is None:
+      self.table[region] = [blockAddress, 0, 0]
+      if len(self.table) > STRIDE_TABLE_SIZE:
+        self.table.popitem(last=False)
+      return []
+    self.table.move_to_end(region)
+
+    stride = blockAddress - entry[0]
+    entry[0] = blockAddress
+    if stride == 0:
+      return []
+    if stride == entry[1]:
+      entry[2] = min(3, entry[2] + 1)
+    elif entry[2] > 0:
+      entry[2] -= 1
+    else:
+      entry[1] = stride
+    if entry[2] < 2:
+      return []
+    return [blockAddress + entry[1] * i for i in range(1, self.degree + 1)]
+
+
+class StreamBufferPrefetcher:
+  def __init__(self, cache, degree=PREFETCH_DEGREE):
+    self.degree = degree
+    # Streams as [next demand block expected, direction (1 or -1)], least recently used first
+    self.streams = []
+    self.missHistory = OrderedDict()
+
+
+  def candidates(self, blockAddress, hit, firstUse):
+    # An access to the block a stream expects advances it, keeping degree blocks prefetched ahead
+    for stream in self.streams:
+      if stream[0] == blockAddress:
+        self.streams.remove(stream)
+        self.streams.append(stream)
+        stream[0] = blockAddress + stream[1]
+        return [blockAddress + stream[1] * self.degree]
+    if hit:
+      return []
+
+    # A miss next to a recent miss starts a stream in their direction
+    direction = 0
+    if blockAddress - 1 in self.missHistory:
+      direction = 1
+    elif blockAddress + 1 in self.missHistory:
+      direction = -1
+    self.missHistory[blockAddress] = None
+    if len(self.missHistory) > MISS_HISTORY_SIZE:
+      self.missHistory.popitem(last=False)
+    if direction == 0:
+      return []
+    if len(self.streams) == NUM_STREAMS:
+      self.streams.pop(0)
+    self.streams.append([blockAddress + direction, direction])
+    return [blockAddress + direction * i for i in range(1, self.degree + 1)]
+
+
+PREFETCHERS = {
+  "next_line": NextLinePrefetcher,
+  "stride": StridePrefetcher,
+  "stream": StreamBufferPrefetcher,
+}
+
+
+class PrefetchUnit:
+  def __init__(self, cache, names, degree=PREFETCH_DEGREE, bufferSize=0):
+    self.cache = cache
+    self.names = names
+    self.prefetchers = []
+    for name in names:
+      if name not in PREFETCHERS:
+        raise ValueError("Unknown prefetcher: " + str(name))
+      self.prefetchers.append(PREFETCHERS[name](cache, degree))
+    # Per prefetcher: issued (requests for blocks already cached, buffered or on their way are dropped), useful (later accessed),
+    # late (useful, but accessed within LATE_DISTANCE accesses of the prefetch), polluting (evicted before any use)
+    self.counters = [[0, 0, 0, 0] for prefetcher in self.prefetchers]
+    self.numBlocks = 2 ** cache.addressWidth >> cache.numBlockOffsetBits
+
+    # Prefetch buffer (bufferSize blocks, none for prefetching into the cache): block -> (data, dirty bit), oldest first
+    self.bufferSize = bufferSize
+    self.buffer = OrderedDict()
+    # Prefetched blocks not used yet: block -> (index of the prefetcher, access number it was issued at)
+    self.pending = {}
+    self.numAccesses = 0
+
+    self.cacheAccess = cache.access
+    self.cacheEvict = cache.evict
+    self.cacheClearLines = cache.clearLines
+    cache.access = self.access
+    cache.evict = self.evict
+    cache.clearLines = self.clearLines
+
+
+  # Same arguments and result as Cache.access
+  def access(self, address, isWrite=False, newByte=None):
+    cache = self.cache
+    blockAddress = address >> cache.numBlockOffsetBits
+    # A block found in the prefetch buffer goes into the cache before the access, which then hits
+    if blockAddress in self.buffer:
+      data, dirty = self.buffer.pop(blockAddress)
+      cache.fill(blockAddress & cache.setIndexMask, blockAddress, data, dirty)
+    result = self.cacheAccess(address, isWrite, newByte)
+
+    firstUse = False
+    issue = self.pending.pop(blockAddress, None)
+    # A prefetched block can be gone without an eviction (invalidated by another level): not counted
+    if issue is not None and result.hit:
+      counters = self.counters[issue[0]]
+      counters[1] += 1
+      if self.numAccesses - issue[1] < LATE_DISTANCE:
+        counters[2] += 1
+      firstUse = True
+
+    for i in range(len(self.prefetchers)):
+      for candidate in self.prefetchers[i].candidates(blockAddress, result.hit, firstUse):
+        self.issue(i, candidate)
+    self.numAccesses += 1
+    return result
+
+
+  # Prefetch a block for prefetcher i, unless it is outside the memory or already cached, buffered or pending
+  def issue(self, i, blockAddress):
+    cache = self.cache
+    if blockAddress < 0 or blockAddress >= self.numBlocks:
+      return
+    if blockAddress in cache.lineOf or blockAddress in self.buffer or blockAddress in self.pending:
+      return
+    self.counters[i][0] += 1
+    self.pending[blockAddress] = (i, self.numAccesses)
+    if self.bufferSize == 0:
+      cache.fill(blockAddress & cache.setIndexMask, blockAddress)
+      return
+
+    self.buffer[blockAddress] = cache.ram.fetchBlock(blockAddress << cache.numBlockOffsetBits, cache.blockSize)
+    cache.numFillBytes += cache.blockSize
+    if len(self.buffer) > self.bufferSize:
+      oldest = next(iter(self.buffer))
+      self.dropBuffered(oldest)
+
+
+  # Drop a block from the buffer, handing its data back to the level below when it needs it (as Cache.evict)
+  def dropBuffered(self, blockAddress):
+    cache = self.cache
+    data, dirty = self.buffer.pop(blockAddress)
+    self.countPolluting(blockAddress)
+    if dirty or cache.notifyCleanEvictions:
+      cache.ram.evictBlock(blockAddress << cache.numBlockOffsetBits, data, dirty)
+
+
+  def countPolluting(self, blockAddress):
+    issue = self.pending.pop(blockAddress, None)
+    if issue is not None:
+      self.counters[issue[0]][3] += 1
+
+
+  # Same arguments as Cache.evict
+  def evict(self, index, line):
+    cache = self.cache
+    self.countPolluting((cache.tags[line] << cache.numSetIndexBits) | index)
+    self.cacheEvict(index, line)
+
+
+  # The buffer empties with the cache, prefetched blocks dropped by a flush aren't counted as polluting
+  def clearLines(self):
+    self.cacheClearLines()
+    self.pending = {}
+    for blockAddress in list(self.buffer):
+      self.dropBuffered(blockAddress)
+
+
+  def printReport(self):
+    for i in range(len(self.prefetchers)):
+      issued, useful, late, polluting = self.counters[i]
+      accuracy = useful / issued if issued > 0 else 0.0
+      print("prefetcher:" + self.names[i] + " issued:" + str(issued) + " useful:" + str(useful) + " late:" + str(late)
+        + " polluting:" + str(polluting) + " accuracy:" + "{:.4f}".format(accuracy))
@@ -0,0 +1,101 @@
+'''
+File: profiling.py
+
+Profiler class: opt-in wall-clock time of each phase of the simulation, timed by wrapping
+the methods of a cache, its replacement policy, its RAM and its event sink
+'''
+
+import sys
+import time
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+PHASES = ["lookup", "fill", "replacement", "ram_transfer", "output"]
+
+# Methods timed for each phase: of the cache, of its replacement bookkeeping, of its RAM, and of its event sink
+CACHE_METHODS = {"access": "lookup", "fill": "fill", "evict": "replacement"}
+POLICY_METHODS = ["hit", "fill", "victim", "invalidate"]
+RAM_METHODS = ["fetchBlock", "writeBlock", "evictBlock"]
+EVENT_METHODS = ["access", "cleared"]
+
+
+# Largest resident memory of the process so far in KiB, None where it can't be measured
+def peakMemoryKiB():
+  if resource is None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Linux reports KiB, macOS bytes
+  if sys.platform == "darwin":
+    return peak // 1024
+  return peak
+
+
+class Profiler:
+  def __init__(self):
+    # Exclusive time of each phase
+    self.times = dict.fromkeys(PHASES, 0.0)
+    # Time of all the accesses made (inclusive of every phase they call)
+    self.accessTime = 0.0
+    # Time of the timed calls made by the call currently timed
+    self.nested = 0.0
+    self.depth = 0
+
+
+  # Time the cache's phases from now on
+  def attach(self, cache):
+    self.cache = cache
+    for name, phase in CACHE_METHODS.items():
+      setattr(cache, name, self.timed(phase, getattr(cache, name)))
+    for name in RAM_METHODS:
+      setattr(cache.ram, name, self.timed("ram_transfer", getattr(cache.ram, name)))
+    if cache.events is not None:
+      for name in EVENT_METHODS:
+        setattr(cache.events, name, self.timed("output", getattr(cache.events, name)))
+
+    self.wrapPolicy()
+
+
+  def wrapPolicy(self):
+    policy = self.cache.replacement
+    for name in POLICY_METHODS:
+      setattr(policy, name, self.timed("replacement", getattr(policy, name)))
+
+
+  # function, recording its time minus that of the timed calls it makes under phase
+  def timed(self, phase, function):
+    times = self.times
+    perfCounter = time.perf_counter
+    def timedFunction(*args):
+      outerNested = self.nested
+      self.nested = 0.0
+      self.depth += 1
+      start = perfCounter()
+      try:
+        return function(*args)
+      finally:
+        elapsed = perfCounter() - start
+        times[phase] += elapsed - self.nested
+        self.nested = outerNested + elapsed
+        self.depth -= 1
+        if phase == "lookup" and self.depth == 0:
+          self.accessTime += elapsed
+    return timedFunction
+
+
+  # Time of every phase and peak memory. With elapsed (a replay's run time, whose accesses per second the summary has), the time
+  # outside every phase is reported as other (trace reading and the replay loop), otherwise the accesses per second of simulation
+  def printReport(self, numAccesses, elapsed=None):
+    total = 0.0
+    for phase in PHASES:
+      print(phase + "_seconds:" + "{:.6f}".format(self.times[phase]))
+      total += self.times[phase]
+    if elapsed is not None:
+      print("other_seconds:" + "{:.6f}".format(max(0.0, elapsed - total)))
+    elif self.accessTime > 0:
+      print("accesses_per_second:" + str(int(numAccesses / self.accessTime)))
+    peak = peakMemoryKiB()
+    if peak is not None:
+      print("peak_memory_kib:" + str(peak))
@@ -0,0 +1,540 @@
+'''
+File: replacement.py
+
+Replacement policies: the bookkeeping of every set of a cache and the choice of the line a
+full set evicts, looked up by name (REPLACEMENT_POLICIES) or by their number in the menu
+'''
+
+from array import array
+from collections import OrderedDict
+from copy import copy
+from heapq import heapify, heappop, heappush
+from random import randint
+
+# Replacement policies by name, and their names by menu number (1 first)
+REPLACEMENT_POLICIES = {}
+POLICY_NUMBERS = []
+
+# Largest RRPV of the RRIP policies (2 bits): lines with it are evicted first
+MAX_RRPV = 3
+# BRRIP inserts one block in BRRIP_LONG_INTERVAL with a long (rather than distant) re-reference interval
+BRRIP_LONG_INTERVAL = 32
+
+
+# Make a policy available by name and as the next menu number
+def registerPolicy(name, policyClass):
+  REPLACEMENT_POLICIES[name] = policyClass
+  POLICY_NUMBERS.append(name)
+
+
+# Name of a policy given by name or by menu number, ValueError if there is no such policy
+def policyName(value):
+  value = str(value).strip()
+  if value in REPLACEMENT_POLICIES:
+    return value
+  if value.isdigit() and 1 <= int(value) <= len(POLICY_NUMBERS):
+    return POLICY_NUMBERS[int(value) - 1]
+  raise ValueError("Unknown replacement policy: " + value)
+
+
+# Whether an attribute of a policy holds per-set state: a sequence with the same number of items for every set
+def isPerSet(value, numSets):
+  return isinstance(value, (array, bytearray, list)) and len(value) % numSets == 0
+
+
+# The part of a sequence laid out set by set that belongs to sets first to end - 1
+def setSlice(sequence, first, end, numSets):
+  perSet = len(sequence) // numSets
+  return sequence[first * perSet:end * perSet]
+
+
+# Give sets first to end - 1 of policy the state they have in source (a policy of the same kind and size).
+# The items of lists are copied, so that the per-set lists or heaps of the two policies aren't shared
+def copySetState(policy, source, first, end, numSets):
+  for name, value in vars(source).items():
+    if isPerSet(value, numSets):
+      part = setSlice(value, first, end, numSets)
+      if isinstance(part, list):
+        part = [copy(item) for item in part]
+      perSet = len(value) // numSets
+      getattr(policy, name)[first * perSet:end * perSet] = part
+
+
+# Give policy the values shared by the sets that source has (e.g. BRRIP's count of fills), wrappers set on it and optimal's future aside
+def copySharedState(policy, source, numSets):
+  for name, value in vars(source).items():
+    if not callable(value) and name != "future" and not isinstance(value, (array, bytearray, list)):
+      setattr(policy, name, copy(value))
+
+
+# Every policy is built with (numSets, associativity) and has
+#   hit(setIndex, line): line was accessed
+#   fill(setIndex, line, wasValid, blockAddress): a block was loaded into line (which held another block if wasValid)
+#   victim(setIndex, blockAddress): the line a full set evicts to load the block at blockAddress (address >> b)
+#   invalidate(setIndex, line): line no longer holds a block
+
+# Any line of the set, at random
+class RandomReplacement:
+  def __init__(self, numSets, associativity):
+    self.associativity = associativity
+
+
+  def hit(self, setIndex, line):
+    pass
+
+
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    pass
+
+
+  # Any line of the set
+  def victim(self, setIndex, blockAddress):
+    return setIndex * self.associativity + randint(0, self.associativity - 1)
+
+
+  def invalidate(self, setIndex, line):
+    pass
+
+# True LRU: a doubly linked list per set stored in flat arrays
+class RecencyList:
+  def __init__(self, numSets, associativity):
+    self.numSets = numSets
+    self.associativity = associativity
+    numLines = numSets * associativity
+
+    # Neighbors of each line in its set's list, -1 at the ends: prev is the next less recently used line, next the next more recently used
+    # Lines start out in way order, way 0 being the least recently used
+    self.prev = array("q", range(-1, numLines - 1))
+    self.next = array("q", range(1, numLines + 1))
+    self.prev[0::associativity] = array("q", [-1]) * numSets
+    self.next[associativity - 1::associativity] = array("q", [-1]) * numSets
+
+    # Least (head) and most (tail) recently used line of each set
+    self.head = array("q", range(0, numLines, associativity))
+    self.tail = array("q", range(associativity - 1, numLines, associativity))
+
+
+  # Make line the most recently used line of its set
+  def hit(self, setIndex, line):
+    tail = self.tail[setIndex]
+    if line == tail:
+      return
+    prev = self.prev
+    next = self.next
+
+    # Unlink the line, it isn't the tail so it has a next line
+    before = prev[line]
+    after = next[line]
+    if before == -1:
+      self.head[setIndex] = after
+    else:
+      next[before] = after
+    prev[after] = before
+
+    # Relink it after the old tail
+    prev[line] = tail
+    next[line] = -1
+    next[tail] = line
+    self.tail[setIndex] = line
+
+
+  # Line no longer holds a block: make it the least recently used line of its set, where unused lines wait
+  def invalidate(self, setIndex, line):
+    head = self.head[setIndex]
+    if line == head:
+      return
+    prev = self.prev
+    next = self.next
+
+    # Unlink the line, it isn't the head so it has a previous line
+    before = prev[line]
+    after = next[line]
+    next[before] = after
+    if after == -1:
+      self.tail[setIndex] = before
+    else:
+      prev[after] = before
+
+    # Relink it before the old head
+    prev[line] = -1
+    next[line] = head
+    prev[head] = line
+    self.head[setIndex] = line
+
+
+  # A filled line is the most recently used one in its set
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    self.hit(setIndex, line)
+
+
+  # The least recently used line
+  def victim(self, setIndex, blockAddress):
+    return self.head[setIndex]
+
+
+  # Way numbers of the set from least to most recently used
+  def order(self, setIndex):
+    ways = []
+    line = self.head[setIndex]
+    while line != -1:
+      ways.append(line - setIndex * self.associativity)
+      line = self.next[line]
+    return ways
+
+
+# LFU: the least used line, lines grouped by use count
+class FrequencyBuckets:
+  def __init__(self, numSets, associativity):
+    self.numSets = numSets
+    self.associativity = associativity
+
+    # Use count of each line
+    self.counts = array("Q", bytes(8 * numSets * associativity))
+    # Per set: use count -> the lines with that count, oldest first (dicts keep insertion order)
+    self.buckets = [None] * numSets
+    # Smallest use count of a line in each set
+    self.minCount = array("Q", bytes(8 * numSets))
+
+
+  # Count one more use of line
+  def hit(self, setIndex, line):
+    buckets = self.buckets[setIndex]
+    count = self.counts[line]
+    bucket = buckets[count]
+    del bucket[line]
+    if not bucket:
+      del buckets[count]
+      if self.minCount[setIndex] == count:
+        self.minCount[setIndex] = count + 1
+
+    count += 1
+    self.counts[line] = count
+    if count in buckets:
+      buckets[count][line] = None
+    else:
+      buckets[count] = {line: None}
+
+
+  # A new block was loaded into line, its use count starts over
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    buckets = self.buckets[setIndex]
+    if buckets is None:
+      buckets = {}
+      self.buckets[setIndex] = buckets
+    elif wasValid:
+      count = self.counts[line]
+      del buckets[count][line]
+      if not buckets[count]:
+        del buckets[count]
+
+    self.counts[line] = 0
+    if 0 in buckets:
+      buckets[0][line] = None
+    else:
+      buckets[0] = {line: None}
+    self.minCount[setIndex] = 0
+
+
+  # Line no longer holds a block: take it out of its bucket (the set's smallest count is set again by its next fill)
+  def invalidate(self, setIndex, line):
+    buckets = self.buckets[setIndex]
+    count = self.counts[line]
+    del buckets[count][line]
+    if not buckets[count]:
+      del buckets[count]
+    self.counts[line] = 0
+
+
+  # The least used line, the oldest of those on a tie
+  def victim(self, setIndex, blockAddress):
+    return next(iter(self.buckets[setIndex][self.minCount[setIndex]]))
+
+
+  # Use counts of the set's lines in way order
+  def setCounts(self, setIndex):
+    firstLine = setIndex * self.associativity
+    return list(self.counts[firstLine:firstLine + self.associativity])
+
+
+# Tree pseudo-LRU: E - 1 bits per set pointing towards the victim
+class TreePLRU:
+  def __init__(self, numSets, associativity):
+    self.associativity = associativity
+    # The tree's leaves are the ways, rounded up to a power of two (missing ways are never chosen)
+    self.depth = (associativity - 1).bit_length()
+    self.numNodes = (1 << self.depth) - 1
+    # numNodes bits per set, in heap order (the children of node n are 2n + 1 and 2n + 2): 1 when the victim is on the right
+    self.bits = bytearray(numSets * self.numNodes)
+
+    # For each way, the nodes from the root down to it with the bit pointing away from it (hit) and towards it (invalidate).
+    # Tuples: they are fixed by the associativity, not state of the sets
+    awayPaths = []
+    towardsPaths = []
+    for way in range(associativity):
+      away = []
+      towards = []
+      node = 0
+      for level in range(self.depth):
+        direction = (way >> (self.depth - 1 - level)) & 1
+        away.append((node, direction ^ 1))
+        towards.append((node, direction))
+        node = 2 * node + 1 + direction
+      awayPaths.append(away)
+      towardsPaths.append(towards)
+    self.awayPaths = tuple(awayPaths)
+    self.towardsPaths = tuple(towardsPaths)
+
+
+  # Point every node on the line's path away from it
+  def hit(self, setIndex, line):
+    bits = self.bits
+    base = setIndex * self.numNodes
+    for node, direction in self.awayPaths[line - setIndex * self.associativity]:
+      bits[base + node] = direction
+
+
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    self.hit(setIndex, line)
+
+
+  # Follow the bits down from the root
+  def victim(self, setIndex, blockAddress):
+    bits = self.bits
+    base = setIndex * self.numNodes
+    node = 0
+    way = 0
+    for level in range(self.depth):
+      shift = self.depth - 1 - level
+      direction = bits[base + node]
+      # The right subtree may only hold missing ways
+      if direction and (way | (1 << shift)) >= self.associativity:
+        direction = 0
+      way |= direction << shift
+      node = 2 * node + 1 + direction
+    return setIndex * self.associativity + way
+
+
+  # Point every node on the line's path towards it, so it is the next victim
+  def invalidate(self, setIndex, line):
+    bits = self.bits
+    base = setIndex * self.numNodes
+    for node, direction in self.towardsPaths[line - setIndex * self.associativity]:
+      bits[base + node] = direction
+
+
+# Same lists as LRU, but only fills move a line to the end of its set's list
+class FirstInFirstOut(RecencyList):
+  def hit(self, setIndex, line):
+    pass
+
+
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    RecencyList.hit(self, setIndex, line)
+
+
+# Translation tables adding 0 to MAX_RRPV to every RRPV of a set at once
+AGING_TABLES = [bytes(min(value + delta, 255) for value in range(256)) for delta in range(MAX_RRPV + 1)]
+
+# Static re-reference interval prediction: 2-bit RRPVs, lines with MAX_RRPV are evicted first
+class StaticRRIP:
+  def __init__(self, numSets, associativity):
+    self.associativity = associativity
+    # Re-reference prediction value of each line: 0 re-referenced soon, MAX_RRPV in the distant future (unused lines too)
+    self.rrpv = bytearray([MAX_RRPV]) * (numSets * associativity)
+
+
+  def hit(self, setIndex, line):
+    self.rrpv[line] = 0
+
+
+  # New blocks are predicted a long re-reference interval, so blocks used only once leave before the reused ones
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    self.rrpv[line] = MAX_RRPV - 1
+
+
+  # The first line with a distant RRPV, after aging the whole set until one has it
+  def victim(self, setIndex, blockAddress):
+    firstLine = setIndex * self.associativity
+    values = self.rrpv[firstLine:firstLine + self.associativity]
+    largest = max(values)
+    if largest < MAX_RRPV:
+      self.rrpv[firstLine:firstLine + self.associativity] = values.translate(AGING_TABLES[MAX_RRPV - largest])
+    return firstLine + values.index(largest)
+
+
+  def invalidate(self, setIndex, line):
+    self.rrpv[line] = MAX_RRPV
+
+
+# As SRRIP, but blocks are inserted distant apart from one in BRRIP_LONG_INTERVAL (counted, so runs are reproducible),
+# which keeps a working set larger than the cache from flushing it
+class BimodalRRIP(StaticRRIP):
+  def __init__(self, numSets, associativity):
+    StaticRRIP.__init__(self, numSets, associativity)
+    self.numFills = 0
+
+
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    self.rrpv[line] = MAX_RRPV - 1 if self.numFills % BRRIP_LONG_INTERVAL == 0 else MAX_RRPV
+    self.numFills += 1
+
+
+# ARC: per set, balances recency and frequency with ghost lists of recently evicted blocks
+class AdaptiveReplacement:
+  def __init__(self, numSets, associativity):
+    self.associativity = associativity
+    # Per set (made by its first fill): lines holding a block used once (t1) and more than once (t2) as line -> block,
+    # and the blocks last evicted from each (ghosts b1 and b2), all least recently used first
+    self.t1 = [None] * numSets
+    self.t2 = [None] * numSets
+    self.b1 = [None] * numSets
+    self.b2 = [None] * numSets
+    # Target size of t1 in each set, moved towards the list whose ghosts are being missed on
+    self.target = [0.0] * numSets
+
+
+  def hit(self, setIndex, line):
+    t1 = self.t1[setIndex]
+    if line in t1:
+      self.t2[setIndex][line] = t1.pop(line)
+    else:
+      self.t2[setIndex].move_to_end(line)
+
+
+  # A miss on a ghost of b1 means t1 was too small, one of b2 that t2 was
+  def adapt(self, setIndex, blockAddress):
+    b1 = self.b1[setIndex]
+    b2 = self.b2[setIndex]
+    if blockAddress in b1:
+      self.target[setIndex] = min(self.associativity, self.target[setIndex] + max(len(b2) / len(b1), 1))
+    elif blockAddress in b2:
+      self.target[setIndex] = max(0.0, self.target[setIndex] - max(len(b1) / len(b2), 1))
+
+
+  # A block coming back from a ghost list has been used before, so it goes into t2
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    if self.t1[setIndex] is None:
+      self.t1[setIndex] = OrderedDict()
+      self.t2[setIndex] = OrderedDict()
+      self.b1[setIndex] = OrderedDict()
+      self.b2[setIndex] = OrderedDict()
+    t1 = self.t1[setIndex]
+    t2 = self.t2[setIndex]
+    b1 = self.b1[setIndex]
+    b2 = self.b2[setIndex]
+    # The set's target was already adapted when its victim was chosen
+    if not wasValid:
+      self.adapt(setIndex, blockAddress)
+    t1.pop(line, None)
+    t2.pop(line, None)
+
+    if blockAddress in b1:
+      del b1[blockAddress]
+      t2[line] = blockAddress
+    elif blockAddress in b2:
+      del b2[blockAddress]
+      t2[line] = blockAddress
+    else:
+      t1[line] = blockAddress
+
+    # t1 and its ghosts remember E blocks at most, the four lists 2E
+    while b1 and len(t1) + len(b1) > self.associativity:
+      b1.popitem(last=False)
+    while b2 and len(t1) + len(t2) + len(b1) + len(b2) > 2 * self.associativity:
+      b2.popitem(last=False)
+
+
+  # The least recently used line of t1 when t1 is over its target, of t2 otherwise, its block becoming a ghost
+  def victim(self, setIndex, blockAddress):
+    self.adapt(setIndex, blockAddress)
+    t1 = self.t1[setIndex]
+    t2 = self.t2[setIndex]
+    target = self.target[setIndex]
+    if t1 and (not t2 or len(t1) > target or (len(t1) == target and blockAddress in self.b2[setIndex])):
+      line, block = t1.popitem(last=False)
+      self.b1[setIndex][block] = None
+    else:
+      line, block = t2.popitem(last=False)
+      self.b2[setIndex][block] = None
+    return line
+
+
+  def invalidate(self, setIndex, line):
+    if self.t1[setIndex] is not None:
+      self.t1[setIndex].pop(line, None)
+      self.t2[setIndex].pop(line, None)
+
+
+# Next use of a block that isn't used again
+NEVER_USED = 2 ** 63 - 1
+
+# For every access of a trace, when the block it accesses is next accessed, built in one backward pass over the trace
+class NextUseIndex:
+  def __init__(self, blockAddresses):
+    numAccesses = len(blockAddresses)
+    self.nextUse = array("q", bytes(8 * numAccesses))
+    lastUse = {}
+    for i in range(numAccesses - 1, -1, -1):
+      block = blockAddresses[i]
+      self.nextUse[i] = lastUse.get(block, NEVER_USED)
+      lastUse[block] = i
+    # Access of the trace being made, advanced by the cache after every access (Cache.setFuture)
+    self.position = 0
+
+
+# Belady's MIN: evicts the line whose block is used again furthest in the future. Offline only, it needs the trace's
+# NextUseIndex (future, set by Cache.setFuture). Each set has a max-heap of (next use, line) entries, where the entries
+# of lines that were accessed again or invalidated are skipped when they reach the top, and dropped when the heap grows too large
+class BeladyOptimal:
+  def __init__(self, numSets, associativity):
+    self.associativity = associativity
+    self.future = None
+    # Next use of the block held by each line, -1 for unused lines
+    self.keys = array("q", [-1]) * (numSets * associativity)
+    self.heaps = [[] for i in range(numSets)]
+
+
+  def hit(self, setIndex, line):
+    key = self.future.nextUse[self.future.position]
+    self.keys[line] = key
+    heap = self.heaps[setIndex]
+    heappush(heap, (-key, line))
+    if len(heap) > 4 * self.associativity:
+      self.compact(setIndex)
+
+
+  def fill(self, setIndex, line, wasValid, blockAddress):
+    if self.future is None:
+      raise ValueError("Optimal replacement needs the trace's future, see Cache.setFuture")
+    self.hit(setIndex, line)
+
+
+  # Rebuild a set's heap from the current keys of its lines
+  def compact(self, setIndex):
+    firstLine = setIndex * self.associativity
+    heap = [(-self.keys[line], line) for line in range(firstLine, firstLine + self.associativity) if self.keys[line] >= 0]
+    heapify(heap)
+    self.heaps[setIndex] = heap
+
+
+  def victim(self, setIndex, blockAddress):
+    heap = self.heaps[setIndex]
+    while True:
+      key, line = heappop(heap)
+      if self.keys[line] == -key:
+        return line
+
+
+  def invalidate(self, setIndex, line):
+    self.keys[line] = -1
+
+
+registerPolicy("random_replacement", RandomReplacement)
+registerPolicy("least_recently_used", RecencyList)
+registerPolicy("least_frequently_used", FrequencyBuckets)
+registerPolicy("tree_plru", TreePLRU)
+registerPolicy("first_in_first_out", FirstInFirstOut)
+registerPolicy("srrip", StaticRRIP)
+registerPolicy("brrip", BimodalRRIP)
+registerPolicy("adaptive_replacement_cache", AdaptiveReplacement)
+registerPolicy("optimal", BeladyOptimal)
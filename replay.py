@@ -0,0 +1,116 @@
+'''
+File: replay.py
+
+Trace replay: streams the commands of a trace file (text or binary) through a cache without
+prompting, and prints a summary of the run
+'''
+
+from tracereader import openTrace, readTrace
+from binarytrace import BinaryTrace, isBinaryTrace, OP_READ, OP_WRITE
+from array import array
+
+
+# Open a trace file of either kind: a BinaryTrace for binary traces, otherwise a stream for readTrace ('-' for stdin)
+def openAnyTrace(fileName):
+  if isBinaryTrace(fileName):
+    return BinaryTrace(fileName)
+  return openTrace(fileName)
+
+
+# The (command, address, data) tuples of a trace of either kind (the addresses of a text trace checked against addressWidth)
+def traceCommands(traceFile, addressWidth=64):
+  if isinstance(traceFile, BinaryTrace):
+    return traceFile.commands()
+  return readTrace(traceFile, addressWidth)
+
+
+# Addresses of every access of a trace (from openAnyTrace) in order, flushes left out: the future of optimal replacement (Cache.setFuture)
+def traceAddresses(traceFile):
+  addresses = array("Q")
+  for command, address, data in traceCommands(traceFile):
+    if command != "cache-flush":
+      addresses.append(address)
+  return addresses
+
+
+# Replay every command in the trace (from openAnyTrace), returns the number of accesses made.
+# With flushWriteBack, flushes write the dirty lines back instead of dropping them
+def replayTrace(cache, traceFile, flushWriteBack=False):
+  if isinstance(traceFile, BinaryTrace):
+    return replayBinaryTrace(cache, traceFile, flushWriteBack)
+  numAccesses = 0
+  access = cache.access
+  events = cache.events
+
+  for command, address, data in readTrace(traceFile, cache.addressWidth):
+    if command == "cache-flush":
+      cache.cacheFlush(flushWriteBack)
+      continue
+
+    result = access(address, data is not None, data)
+    if events is not None:
+      events.access(result)
+    numAccesses += 1
+
+  return numAccesses
+
+
+# Replay a binary trace by reading its columns in place, nothing is parsed
+def replayBinaryTrace(cache, trace, flushWriteBack=False):
+  access = cache.access
+  events = cache.events
+  addresses = trace.addresses
+  ops = trace.ops
+  data = trace.data
+  addressLimit = 2 ** cache.addressWidth
+  # Addresses as wide as the cache's can't be out of range
+  checkAddresses = trace.addressWidth > cache.addressWidth
+  numFlushes = 0
+
+  for i in range(trace.numRecords):
+    op = ops[i]
+    if op == OP_READ:
+      address = addresses[i]
+      isWrite = False
+      newByte = None
+    elif op == OP_WRITE:
+      address = addresses[i]
+      isWrite = True
+      newByte = data[i]
+    else:
+      cache.cacheFlush(flushWriteBack)
+      numFlushes += 1
+      continue
+    if checkAddresses and address >= addressLimit:
+      raise ValueError("Address " + hex(address) + " does not fit in " + str(cache.addressWidth) + " bits")
+
+    result = access(address, isWrite, newByte)
+    if events is not None:
+      events.access(result)
+
+  return trace.numRecords - numFlushes
+
+
+# Feed the addresses of every access in the trace to a MissRatioAnalysis (stackdistance.py)
+def analyzeTrace(analysis, traceFile):
+  for command, address, data in traceCommands(traceFile):
+    if command == "cache-flush":
+      analysis.flush()
+    else:
+      analysis.access(address)
+
+
+# Summary of a replay: the access counts, the memory traffic, and how fast the trace went through the cache
+def printSummary(cache, numAccesses, elapsed):
+  print("accesses:" + str(numAccesses))
+  print("number_of_cache_hits:" + str(cache.numHits))
+  print("number_of_cache_misses:" + str(cache.numMisses))
+  print("number_of_write_backs:" + str(cache.numWriteBacks))
+  print("fill_bytes:" + str(cache.numFillBytes))
+  print("write_through_bytes:" + str(cache.numWriteThroughBytes))
+  print("write_back_bytes:" + str(cache.numWriteBackBytes))
+  if numAccesses > 0:
+    print("hit_rate:" + "{:.4f}".format(cache.numHits / numAccesses))
+  print("elapsed_seconds:" + "{:.3f}".format(elapsed))
+  if elapsed > 0:
+    print("accesses_per_second:" + str(int(numAccesses / elapsed)))
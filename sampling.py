@@ -0,0 +1,168 @@
+'''
+File: sampling.py
+
+Sampled simulation: only some sets (SetSampling) or windows of accesses (TimeSampling) of a
+trace are simulated, and the miss rate is estimated with a 95% confidence interval
+'''
+
+from array import array
+import math
+import random
+
+# Normal quantile of a two-sided 95% confidence interval
+CONFIDENCE_Z = 1.96
+
+
+# The sampling of a cache (its L1) given one set in sampleSets, or windows of sampleWindow accesses every samplePeriod
+# after sampleWarmup accesses of warming (None for TimeSampling's default); None when neither is given, the whole trace is simulated
+def makeSampling(cache, sampleSets=None, samplePeriod=None, sampleWindow=None, sampleWarmup=None, seed=0):
+  if sampleSets is not None and samplePeriod is not None:
+    raise ValueError("Set sampling and time sampling can't be combined")
+  if sampleSets is not None:
+    if sampleSets < 1:
+      raise ValueError("The set sampling ratio has to be at least 1")
+    return SetSampling(cache, sampleSets, seed)
+  if samplePeriod is not None:
+    return TimeSampling(samplePeriod, sampleWindow if sampleWindow is not None else max(1, samplePeriod // 10), sampleWarmup)
+  return None
+
+
+# Miss rate estimated from the (accesses, misses) of sampled units out of numUnits units, and the half width of its 95% interval
+# (None with fewer than two units sampled)
+def estimateMissRate(unitAccesses, unitMisses, numUnits):
+  numSampled = len(unitAccesses)
+  totalAccesses = sum(unitAccesses)
+  if totalAccesses == 0:
+    return 0.0, None
+  missRate = sum(unitMisses) / totalAccesses
+  if numSampled < 2:
+    return missRate, None
+  spread = sum((misses - missRate * accesses) ** 2 for accesses, misses in zip(unitAccesses, unitMisses)) / (numSampled - 1)
+  meanAccesses = totalAccesses / numSampled
+  finiteCorrection = max(0.0, 1 - numSampled / numUnits)
+  return missRate, CONFIDENCE_Z * math.sqrt(finiteCorrection * spread / numSampled) / meanAccesses
+
+
+class SetSampling:
+  def __init__(self, cache, ratio, seed=0):
+    self.numSets = cache.numSets
+    self.numBlockOffsetBits = cache.numBlockOffsetBits
+    self.setIndexMask = cache.setIndexMask
+    # The sets simulated, flagged in sampled
+    numSampled = max(1, cache.numSets // ratio)
+    self.sampledSets = sorted(random.Random(seed).sample(range(cache.numSets), numSampled))
+    self.sampled = bytearray(cache.numSets)
+    for index in self.sampledSets:
+      self.sampled[index] = 1
+    self.setAccesses = array("Q", bytes(8 * cache.numSets))
+    self.setMisses = array("Q", bytes(8 * cache.numSets))
+    self.numAccesses = 0
+
+
+  # Replay the (command, address, data) tuples of a trace through cache (a Cache or a CacheHierarchy whose L1 was sampled), returns the number of accesses in the trace
+  def replay(self, cache, commands, flushWriteBack=False):
+    access = cache.access
+    events = cache.events
+    sampled = self.sampled
+    shift = self.numBlockOffsetBits
+    mask = self.setIndexMask
+    addressLimit = 2 ** cache.addressWidth
+    for command, address, data in commands:
+      if command == "cache-flush":
+        cache.cacheFlush(flushWriteBack)
+        continue
+      if address >= addressLimit:
+        raise ValueError("Address " + hex(address) + " does not fit in " + str(cache.addressWidth) + " bits")
+      self.numAccesses += 1
+      index = (address >> shift) & mask
+      if not sampled[index]:
+        continue
+      result = access(address, data is not None, data)
+      self.setAccesses[index] += 1
+      if not result.hit:
+        self.setMisses[index] += 1
+      if events is not None:
+        events.access(result)
+    return self.numAccesses
+
+
+  def estimate(self):
+    return estimateMissRate([self.setAccesses[index] for index in self.sampledSets], [self.setMisses[index] for index in self.sampledSets], self.numSets)
+
+
+  def printReport(self):
+    print("sampling:sets sampled_sets:" + str(len(self.sampledSets)) + "/" + str(self.numSets))
+    printEstimate(self.numAccesses, sum(self.setAccesses), self.estimate())
+
+
+class TimeSampling:
+  # warmup None warms the cache up for as many accesses as a window, as far as the period leaves room
+  def __init__(self, period, window, warmup=None):
+    if warmup is None:
+      warmup = max(0, min(window, period - window))
+    if window < 1 or window + warmup > period:
+      raise ValueError("A sampling window (and its warm-up) has to fit in the sampling period")
+    self.period = period
+    self.window = window
+    self.warmup = warmup
+    # Accesses and misses of each window measured
+    self.windowAccesses = []
+    self.windowMisses = []
+    self.numAccesses = 0
+
+
+  def replay(self, cache, commands, flushWriteBack=False):
+    access = cache.access
+    events = cache.events
+    # Position in the period where warming starts and where measuring starts
+    warmStart = self.period - self.window - self.warmup
+    measureStart = self.period - self.window
+    addressLimit = 2 ** cache.addressWidth
+    for command, address, data in commands:
+      if command == "cache-flush":
+        cache.cacheFlush(flushWriteBack)
+        continue
+      if address >= addressLimit:
+        raise ValueError("Address " + hex(address) + " does not fit in " + str(cache.addressWidth) + " bits")
+      position = self.numAccesses % self.period
+      self.numAccesses += 1
+      if position < warmStart:
+        continue
+      result = access(address, data is not None, data)
+      if position < measureStart:
+        continue
+      if position == measureStart:
+        self.windowAccesses.append(0)
+        self.windowMisses.append(0)
+      self.windowAccesses[-1] += 1
+      if not result.hit:
+        self.windowMisses[-1] += 1
+      if events is not None:
+        events.access(result)
+    return self.numAccesses
+
+
+  def estimate(self):
+    # The trace holds this many windows, any of which could have been measured
+    numWindows = max(1, (self.numAccesses + self.window - 1) // self.window)
+    return estimateMissRate(self.windowAccesses, self.windowMisses, numWindows)
+
+
+  def printReport(self):
+    print("sampling:time windows:" + str(len(self.windowAccesses)) + " period:" + str(self.period) + " window:" + str(self.window)
+      + " warmup:" + str(self.warmup))
+    if self.warmup == 0:
+      print("sampling_warning:no warm-up before the windows, the miss rate is overestimated beyond its confidence interval")
+    printEstimate(self.numAccesses, sum(self.windowAccesses), self.estimate())
+
+
+# The estimate extrapolated to the whole trace
+def printEstimate(numAccesses, numMeasured, estimate):
+  missRate, halfWidth = estimate
+  print("measured_accesses:" + str(numMeasured) + " of:" + str(numAccesses))
+  print("estimated_miss_rate:" + "{:.4f}".format(missRate))
+  print("estimated_hit_rate:" + "{:.4f}".format(1 - missRate))
+  print("estimated_misses:" + str(round(missRate * numAccesses)))
+  if halfWidth is not None:
+    print("miss_rate_ci95:" + "{:.4f}".format(halfWidth))
+    print("estimated_misses_ci95:" + str(round(halfWidth * numAccesses)))
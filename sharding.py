@@ -0,0 +1,156 @@
+'''
+File: sharding.py
+
+Set-sharded replay: a trace split by set index is replayed on one configuration by several
+worker processes, and their lines, replacement state, counters and RAM writes merged back
+'''
+
+from cache import Cache
+from mainmemory import MainMemory
+from binarytrace import BinaryTrace, OP_READ, OP_WRITE, OP_FLUSH
+from checkpoint import policyState, COUNTER_NAMES
+from replacement import isPerSet, setSlice
+from replay import traceCommands
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+import os
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
+# Replacement policies whose state of a set only depends on the accesses to that set
+SHARDABLE_POLICIES = ["least_recently_used", "least_frequently_used", "tree_plru", "first_in_first_out", "srrip",
+  "adaptive_replacement_cache"]
+# The cache's line storage, each array laid out set by set
+LINE_ARRAYS = ["tags", "valid", "dirty", "data", "linesInUse"]
+
+
+# First set of shard k of numShards (shard k holds the sets i with i * numShards // numSets == k)
+def firstSet(k, numShards, numSets):
+  return -(-k * numSets // numShards)
+
+
+# Split a trace into numShards (addresses, ops, data) arrays, as sweep.loadTrace lays out a trace, returns them and the number of accesses
+def partitionTrace(cache, traceFile, numShards):
+  if np is not None and isinstance(traceFile, BinaryTrace):
+    return partitionColumns(cache, traceFile, numShards)
+  shards = [(array("Q"), bytearray(), bytearray()) for k in range(numShards)]
+  shift = cache.numBlockOffsetBits
+  mask = cache.setIndexMask
+  setBits = cache.numSetIndexBits
+  addressLimit = 2 ** cache.addressWidth
+  numAccesses = 0
+  for command, address, data in traceCommands(traceFile, cache.addressWidth):
+    if command == "cache-flush":
+      for addresses, ops, values in shards:
+        addresses.append(0)
+        ops.append(OP_FLUSH)
+        values.append(0)
+      continue
+    if address >= addressLimit:
+      raise ValueError("Address " + hex(address) + " does not fit in " + str(cache.addressWidth) + " bits")
+    addresses, ops, values = shards[(((address >> shift) & mask) * numShards) >> setBits]
+    addresses.append(address)
+    ops.append(OP_READ if data is None else OP_WRITE)
+    values.append(0 if data is None else data)
+    numAccesses += 1
+  return shards, numAccesses
+
+
+# partitionTrace on the columns of a binary trace with NumPy, a selection per shard instead of a loop over the trace
+def partitionColumns(cache, trace, numShards):
+  # Copies of the columns (addresses widened to 64 bits), so no view of the mapped file outlives the call and keeps the trace from closing
+  addressColumn, opColumn, dataColumn = trace.arrays()
+  addresses = addressColumn.astype(np.uint64)
+  ops = opColumn.copy()
+  data = dataColumn.copy()
+  del addressColumn, opColumn, dataColumn
+  isFlush = ops == OP_FLUSH
+  numAccesses = len(ops) - int(np.count_nonzero(isFlush))
+  if numAccesses > 0 and trace.addressWidth > cache.addressWidth:
+    largest = int(addresses[~isFlush].max())
+    if largest >= 2 ** cache.addressWidth:
+      raise ValueError("Address " + hex(largest) + " does not fit in " + str(cache.addressWidth) + " bits")
+
+  setIndexes = (addresses >> np.uint64(cache.numBlockOffsetBits)) & np.uint64(cache.setIndexMask)
+  shardOf = (setIndexes * np.uint64(numShards)) >> np.uint64(cache.numSetIndexBits)
+  # Flushes are recorded with address and data 0, as partitionTrace does
+  addresses = np.where(isFlush, np.uint64(0), addresses)
+  data = np.where(isFlush, np.uint8(0), data)
+  shards = []
+  for k in range(numShards):
+    selected = (shardOf == k) | isFlush
+    shardAddresses = array("Q")
+    shardAddresses.frombytes(addresses[selected].tobytes())
+    shards.append((shardAddresses, bytearray(ops[selected].tobytes()), bytearray(data[selected].tobytes())))
+  return shards, numAccesses
+
+
+# Worker: replay one shard on a cache configured by config (Cache's arguments after the RAM), returns what mergeShard needs
+def replayShard(config, ramFile, addressWidth, isRamImage, first, end, shard, flushWriteBack):
+  ram = MainMemory(addressWidth)
+  if isRamImage:
+    ram.loadImage(ramFile, 0, True)
+  else:
+    ram.readFromFile(ramFile)
+  cache = Cache(ram, *config, False)
+  access = cache.access
+  addresses, ops, data = shard
+  # Blocks whose bytes in RAM the shard's writes may have changed (write-through, write-back or no-write-allocate)
+  writtenBlocks = set()
+  for i in range(len(ops)):
+    op = ops[i]
+    if op == OP_READ:
+      access(addresses[i])
+    elif op == OP_WRITE:
+      access(addresses[i], True, data[i])
+      writtenBlocks.add(addresses[i] >> cache.numBlockOffsetBits)
+    else:
+      cache.cacheFlush(flushWriteBack)
+
+  cache.clearStaleSets()
+  counters = [getattr(cache, name) for name in COUNTER_NAMES]
+  lines = {name: setSlice(getattr(cache, name), first, end, cache.numSets) for name in LINE_ARRAYS}
+  # Sequences laid out set by set are the policy's per-set state, the rest is the same in every worker (tables, sizes)
+  policy = {name: setSlice(value, first, end, cache.numSets) for name, value in policyState(cache.replacement).items()
+    if isPerSet(value, cache.numSets)}
+  blocks = {blockAddress: ram.readBlock(blockAddress << cache.numBlockOffsetBits, cache.blockSize) for blockAddress in writtenBlocks}
+  return counters, lines, policy, cache.lineOf, blocks
+
+
+# Copy a worker's result for sets first to end - 1 into cache and its RAM, adding its counters to the cache's
+def mergeShard(cache, result, first, end):
+  counters, lines, policy, lineOf, blocks = result
+  cache.clearStaleSets()
+  for i in range(len(COUNTER_NAMES)):
+    setattr(cache, COUNTER_NAMES[i], getattr(cache, COUNTER_NAMES[i]) + counters[i])
+  for owner, state in ((cache, lines), (cache.replacement, policy)):
+    for name, part in state.items():
+      sequence = getattr(owner, name)
+      perSet = len(sequence) // cache.numSets
+      sequence[first * perSet:end * perSet] = part
+  cache.lineOf.update(lineOf)
+  for blockAddress, data in blocks.items():
+    cache.ram.writeBlock(blockAddress << cache.numBlockOffsetBits, data)
+
+
+# Replay a trace (from openAnyTrace) on cache with numWorkers processes, each starting from the RAM file (a RAM image when isRamImage),
+# returns the number of accesses. The cache has to start out empty, its RAM loaded from the same file
+def replaySharded(cache, traceFile, numWorkers, ramFile, isRamImage=False, flushWriteBack=False):
+  if cache.replacementPolicy not in SHARDABLE_POLICIES:
+    raise ValueError(cache.replacementPolicy + " replacement can't be sharded, its sets aren't independent")
+  numShards = max(1, min(numWorkers, cache.numSets))
+  shards, numAccesses = partitionTrace(cache, traceFile, numShards)
+  config = [cache.cacheSize, cache.blockSize, cache.associativity, cache.replacementPolicy,
+    1 if cache.writeHitPolicy == "write_through" else 2, 1 if cache.writeMissPolicy == "write_allocate" else 2]
+  bounds = [firstSet(k, numShards, cache.numSets) for k in range(numShards + 1)]
+
+  with ProcessPoolExecutor(max_workers=numShards) as pool:
+    futures = [pool.submit(replayShard, config, os.path.abspath(ramFile), cache.addressWidth, isRamImage, bounds[k], bounds[k + 1],
+      shards[k], flushWriteBack) for k in range(numShards)]
+    del shards
+    for k in range(numShards):
+      mergeShard(cache, futures[k].result(), bounds[k], bounds[k + 1])
+  return numAccesses
@@ -0,0 +1,138 @@
+'''
+File: stackdistance.py
+
+Miss-ratio curves from LRU stack distances: one pass over a trace gives the hit ratio of
+every associativity for each number of sets
+'''
+
+from math import log2
+
+class StackDistanceCounter:
+  def __init__(self, capacity=1024):
+    # Fenwick tree over access times (1-based), a 1 marks the latest access to some block
+    self.capacity = capacity
+    self.tree = [0] * (capacity + 1)
+    self.clock = 0
+    self.numMarked = 0
+    # Block -> time of its latest access
+    self.lastAccess = {}
+
+
+  # Record an access to block, returns its stack distance (-1 for the first access to the block)
+  def access(self, block):
+    if self.clock == self.capacity:
+      self.compact()
+
+    tree = self.tree
+    capacity = self.capacity
+    self.clock += 1
+    now = self.clock
+    last = self.lastAccess.get(block)
+    distance = -1
+
+    if last is not None:
+      # Distinct blocks used since: marks after the latest access = all marks - marks up to it
+      marksUpTo = 0
+      i = last
+      while i > 0:
+        marksUpTo += tree[i]
+        i &= i - 1
+      distance = self.numMarked - marksUpTo
+
+      # Move the block's mark from its last access to now
+      i = last
+      while i <= capacity:
+        tree[i] -= 1
+        i += i & -i
+    else:
+      self.numMarked += 1
+
+    i = now
+    while i <= capacity:
+      tree[i] += 1
+      i += i & -i
+    self.lastAccess[block] = now
+    return distance
+
+
+  # Out of times: renumber the marked accesses 1..n (keeping their order) and rebuild the tree with room to grow
+  def compact(self):
+    blocks = sorted(self.lastAccess, key=self.lastAccess.get)
+    self.capacity = max(1024, 2 * len(blocks))
+    self.tree = [0] * (self.capacity + 1)
+    for time in range(1, len(blocks) + 1):
+      self.lastAccess[blocks[time - 1]] = time
+      self.tree[time] = 1
+    # Linear-time build: push each node's sum up to its parent
+    for i in range(1, self.capacity + 1):
+      parent = i + (i & -i)
+      if parent <= self.capacity:
+        self.tree[parent] += self.tree[i]
+    self.clock = len(blocks)
+
+
+class MissRatioAnalysis:
+  def __init__(self, blockSize, setCounts=(1,)):
+    self.blockSize = int(blockSize)
+    self.numBlockOffsetBits = int(log2(self.blockSize))
+    self.setCounts = [int(numSets) for numSets in setCounts]
+    self.numAccesses = 0
+    # For each set count: a histogram of stack distances and the number of first accesses
+    self.histograms = [[] for numSets in self.setCounts]
+    self.numColdAccesses = [0] * len(self.setCounts)
+    self.flush()
+
+
+  # Forget all history, as after a cache flush: every block's next access is a first access
+  def flush(self):
+    # For each set count: one counter per set, made when the set is first used
+    self.counters = [{} for numSets in self.setCounts]
+
+
+  # Record one access at an integer address
+  def access(self, address):
+    block = address >> self.numBlockOffsetBits
+    self.numAccesses += 1
+    for i in range(len(self.setCounts)):
+      setIndex = block % self.setCounts[i]
+      counter = self.counters[i].get(setIndex)
+      if counter is None:
+        counter = StackDistanceCounter()
+        self.counters[i][setIndex] = counter
+      distance = counter.access(block)
+
+      if distance == -1:
+        self.numColdAccesses[i] += 1
+      else:
+        histogram = self.histograms[i]
+        while len(histogram) <= distance:
+          histogram.append(0)
+        histogram[distance] += 1
+
+
+  # Hit ratio for each associativity with the i-th set count: entry E - 1 is the hit ratio of an E-way LRU cache
+  def hitRatios(self, i):
+    ratios = []
+    hits = 0
+    for count in self.histograms[i]:
+      hits += count
+      ratios.append(hits / self.numAccesses if self.numAccesses > 0 else 0.0)
+    return ratios
+
+
+  # Print the hit ratio of every power of two associativity for each set count, up to the one that catches every reuse
+  def printReport(self):
+    print("accesses:" + str(self.numAccesses))
+    print("data_block_size:" + str(self.blockSize))
+    for i in range(len(self.setCounts)):
+      numSets = self.setCounts[i]
+      ratios = self.hitRatios(i)
+      print("sets:" + str(numSets) + " cold_misses:" + str(self.numColdAccesses[i]))
+      associativity = 1
+      while True:
+        ratio = ratios[min(associativity, len(ratios)) - 1] if ratios else 0.0
+        print("cache-size:" + str(numSets * associativity * self.blockSize) + " associativity:" + str(associativity)
+          + " hit_ratio:" + "{:.4f}".format(ratio) + " miss_ratio:" + "{:.4f}".format(1 - ratio))
+        if associativity >= len(ratios):
+          break
+        associativity *= 2
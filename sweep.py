@@ -0,0 +1,293 @@
+'''
+File: sweep.py
+
+Parameter sweep: replays one trace on every combination of the given cache configuration
+values in a pool of worker processes, and writes the results as CSV or JSON
+'''
+
+from cache import Cache
+from mainmemory import MainMemory
+from tracereader import readTrace
+from binarytrace import BinaryTrace, OP_READ, OP_WRITE, OP_FLUSH
+from replay import openAnyTrace
+from sampling import makeSampling
+from replacement import POLICY_NUMBERS, policyName
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from array import array
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+# The configuration values swept over, in the order Cache takes them
+SWEEP_FIELDS = ["cacheSize", "blockSize", "associativity", "replacementPolicy", "writeHitPolicy", "writeMissPolicy"]
+
+# Set in each worker by initWorker: the shared trace and the RAM every configuration starts from
+workerTrace = None
+workerRam = None
+
+
+# Parse a trace (a file from tracereader.openTrace) into flat arrays: addresses (8 bytes each), ops and data (1 byte each).
+# ValueError if an address doesn't fit in addressWidth bits
+def loadTrace(traceFile, addressWidth=64):
+  addresses = array("Q")
+  ops = bytearray()
+  data = bytearray()
+  for command, address, value in readTrace(traceFile, addressWidth):
+    if command == "cache-flush":
+      addresses.append(0)
+      ops.append(OP_FLUSH)
+      data.append(0)
+    else:
+      addresses.append(address)
+      ops.append(OP_READ if value is None else OP_WRITE)
+      data.append(0 if value is None else value)
+  return addresses, ops, data
+
+
+# Make sure every address of a binary trace fits in addressWidth bits (flushes are stored with address 0)
+def checkBinaryTrace(trace, addressWidth):
+  if trace.addressWidth > addressWidth:
+    largest = max(trace.addresses, default=0)
+    if largest >= 2 ** addressWidth:
+      raise ValueError("Address " + hex(largest) + " does not fit in " + str(addressWidth) + " bits")
+
+
+# Copy the trace arrays into one shared memory block laid out as [addresses | ops | data]
+def shareTrace(addresses, ops, data):
+  numRecords = len(ops)
+  sharedTrace = shared_memory.SharedMemory(create=True, size=max(1, 10 * numRecords))
+  sharedTrace.buf[0:8 * numRecords] = addresses.tobytes()
+  sharedTrace.buf[8 * numRecords:9 * numRecords] = ops
+  sharedTrace.buf[9 * numRecords:10 * numRecords] = data
+  return sharedTrace
+
+
+# Views of the three trace arrays inside a shared memory block, nothing is copied
+def traceViews(sharedTrace, numRecords):
+  buffer = sharedTrace.buf
+  return (buffer[0:8 * numRecords].cast("Q"), buffer[8 * numRecords:9 * numRecords],
+    buffer[9 * numRecords:10 * numRecords])
+
+
+# Worker start-up: attach to the shared trace (or map the binary trace file) and load the RAM once (a RAM image is mapped)
+def initWorker(traceName, numRecords, ramFile, addressWidth, isTraceFile=False, isRamImage=False):
+  global workerTrace, workerRam
+  if isTraceFile:
+    trace = BinaryTrace(traceName)
+    workerTrace = (trace, (trace.addresses, trace.ops, trace.data))
+  else:
+    sharedTrace = shared_memory.SharedMemory(name=traceName)
+    workerTrace = (sharedTrace, traceViews(sharedTrace, numRecords))
+  workerRam = MainMemory(addressWidth)
+  if isRamImage:
+    workerRam.loadImage(ramFile, 0, True)
+  else:
+    workerRam.readFromFile(ramFile)
+
+
+# The (command, address, data) tuples of the trace arrays, as replay.traceCommands gives them
+def arrayCommands(addresses, ops, data):
+  for i in range(len(ops)):
+    op = ops[i]
+    if op == OP_READ:
+      yield "cache-read", addresses[i], None
+    elif op == OP_WRITE:
+      yield "cache-write", addresses[i], data[i]
+    else:
+      yield "cache-flush", None, None
+
+
+# Replay the shared trace on one configuration, returns the configuration with its counters and run time.
+# samplingArgs are makeSampling's arguments after the cache when the configuration is only sampled
+def runConfig(config, samplingArgs=None):
+  addresses, ops, data = workerTrace[1]
+  ourCache = Cache(workerRam.copy(), *[config[name] for name in SWEEP_FIELDS], False)
+  sampling = makeSampling(ourCache, *samplingArgs) if samplingArgs is not None else None
+  if ourCache.replacementPolicy == "optimal":
+    ourCache.setFuture([addresses[i] for i in range(len(ops)) if ops[i] != OP_FLUSH])
+  access = ourCache.access
+
+  start = time.perf_counter()
+  numAccesses = 0
+  if sampling is not None:
+    sampling.replay(ourCache, arrayCommands(addresses, ops, data))
+    numAccesses = ourCache.numHits + ourCache.numMisses
+  else:
+    for i in range(len(ops)):
+      op = ops[i]
+      if op == OP_READ:
+        access(addresses[i])
+      elif op == OP_WRITE:
+        access(addresses[i], True, data[i])
+      else:
+        ourCache.cacheFlush()
+        continue
+      numAccesses += 1
+  elapsed = time.perf_counter() - start
+
+  result = dict(config)
+  result["accesses"] = numAccesses
+  result["hits"] = ourCache.numHits
+  result["misses"] = ourCache.numMisses
+  result["writeBacks"] = ourCache.numWriteBacks
+  result["fillBytes"] = ourCache.numFillBytes
+  result["writeThroughBytes"] = ourCache.numWriteThroughBytes
+  result["writeBackBytes"] = ourCache.numWriteBackBytes
+  result["hitRate"] = ourCache.numHits / numAccesses if numAccesses > 0 else 0.0
+  result["seconds"] = elapsed
+  if sampling is not None:
+    missRate, halfWidth = sampling.estimate()
+    result["estimatedMissRate"] = missRate
+    result["missRateCi95"] = halfWidth
+  return result
+
+
+# Whether a configuration can be built: a known replacement policy, power of two sizes with at least one set
+def isValidConfig(config, addressWidth):
+  try:
+    policyName(config["replacementPolicy"])
+  except ValueError:
+    return False
+  cacheSize = int(config["cacheSize"])
+  blockSize = int(config["blockSize"])
+  associativity = int(config["associativity"])
+  for value in (cacheSize, blockSize):
+    if value < 1 or value & (value - 1):
+      return False
+  if associativity < 1 or cacheSize % (blockSize * associativity) != 0:
+    return False
+  numSets = cacheSize // (blockSize * associativity)
+  return numSets & (numSets - 1) == 0 and cacheSize <= 2 ** addressWidth
+
+
+# Every combination of the given values, skipping those that can't be built
+def buildGrid(values, addressWidth):
+  grid = []
+  for combination in itertools.product(*[values[name] for name in SWEEP_FIELDS]):
+    config = dict(zip(SWEEP_FIELDS, combination))
+    if isValidConfig(config, addressWidth):
+      grid.append(config)
+  return grid
+
+
+# Run every configuration of the grid in the worker pool, reporting progress as they finish
+def runSweep(grid, traceFile, ramFile, addressWidth=8, numWorkers=None, isRamImage=False, samplingArgs=None):
+  # Binary traces are already laid out as flat arrays, the workers map the file instead of a shared copy
+  if isinstance(traceFile, BinaryTrace):
+    checkBinaryTrace(traceFile, addressWidth)
+    sharedTrace = None
+    initArgs = (os.path.abspath(traceFile.fileName), traceFile.numRecords, ramFile, addressWidth, True, isRamImage)
+  else:
+    addresses, ops, data = loadTrace(traceFile, addressWidth)
+    sharedTrace = shareTrace(addresses, ops, data)
+    initArgs = (sharedTrace.name, len(ops), ramFile, addressWidth, False, isRamImage)
+    del addresses, ops, data
+
+  results = []
+  try:
+    with ProcessPoolExecutor(max_workers=numWorkers, initializer=initWorker, initargs=initArgs) as pool:
+      futures = [pool.submit(runConfig, config, samplingArgs) for config in grid]
+      for future in as_completed(futures):
+        result = future.result()
+        results.append(result)
+        print("[" + str(len(results)) + "/" + str(len(grid)) + "] "
+          + " ".join(name + "=" + str(result[name]) for name in SWEEP_FIELDS)
+          + " hit_rate=" + "{:.4f}".format(result["hitRate"]) + " seconds=" + "{:.3f}".format(result["seconds"]), file=sys.stderr)
+  finally:
+    if sharedTrace is not None:
+      sharedTrace.close()
+      sharedTrace.unlink()
+
+  # Report in grid order, not completion order
+  results.sort(key=configOrder)
+  return results
+
+
+# Sort key of a configuration: its values, with the replacement policy as its number in the menu
+def configOrder(config):
+  return [POLICY_NUMBERS.index(policyName(config[name])) if name == "replacementPolicy" else int(config[name]) for name in SWEEP_FIELDS]
+
+
+# Write the results table as JSON (.json) or CSV (anything else)
+def writeResults(results, fileName):
+  with open(fileName, "w", newline="") as f:
+    if fileName.endswith(".json"):
+      json.dump(results, f, indent=2)
+    else:
+      fieldNames = SWEEP_FIELDS + ["accesses", "hits", "misses", "writeBacks", "fillBytes", "writeThroughBytes", "writeBackBytes", "hitRate", "seconds"]
+      if results and "estimatedMissRate" in results[0]:
+        fieldNames += ["estimatedMissRate", "missRateCi95"]
+      writer = csv.DictWriter(f, fieldnames=fieldNames)
+      writer.writeheader()
+      writer.writerows(results)
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Cache configuration sweep")
+  parser.add_argument("ramFile", help="text file with one hex byte per line used to initialize the RAM")
+  parser.add_argument("--ram-image", dest="ramImage", action="store_true", help="the RAM file is a binary RAM image, mapped by every worker")
+  parser.add_argument("--trace", required=True, help="trace of cache-read/cache-write commands ('-' for stdin, may be compressed or binary)")
+  parser.add_argument("--address-width", dest="addressWidth", type=int, default=8, help="number of address bits (8 to 64, default 8)")
+  parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per CPU)")
+  parser.add_argument("--output", default="sweep.csv", help="results file, .json for JSON, otherwise CSV")
+  parser.add_argument("--sample-sets", dest="sampleSets", type=int, help="only simulate one of this many sets of each configuration and estimate its miss rate")
+  parser.add_argument("--sample-period", dest="samplePeriod", type=int, help="only measure a window of every this many accesses and estimate the miss rate")
+  parser.add_argument("--sample-window", dest="sampleWindow", type=int, help="with --sample-period: accesses measured per period (default a tenth of it)")
+  parser.add_argument("--sample-warmup", dest="sampleWarmup", type=int, help="with --sample-period: accesses simulated without being measured before each window"
+    + " (default as many as a window); with 0 the windows start from a cache left a period behind and the estimate is biased")
+  parser.add_argument("--seed", type=int, default=0, help="with --sample-sets: seed of the choice of sets")
+  parser.add_argument("--cache-size", dest="cacheSize", required=True)
+  parser.add_argument("--block-size", dest="blockSize", required=True)
+  parser.add_argument("--associativity", dest="associativity", required=True)
+  parser.add_argument("--replacement-policy", dest="replacementPolicy", default="2", help="replacement policies, as names or numbers in the menu")
+  parser.add_argument("--write-hit-policy", dest="writeHitPolicy", default="2")
+  parser.add_argument("--write-miss-policy", dest="writeMissPolicy", default="1")
+  args = parser.parse_args()
+
+  if args.addressWidth < 8 or args.addressWidth > 64:
+    sys.exit("Invalid address width!")
+
+  values = {}
+  for name in SWEEP_FIELDS:
+    try:
+      # Policies by name or number, both are kept as names
+      if name == "replacementPolicy":
+        values[name] = [policyName(value) for value in getattr(args, name).split(",")]
+      else:
+        values[name] = [int(value) for value in getattr(args, name).split(",")]
+    except ValueError as error:
+      sys.exit(str(error))
+  grid = buildGrid(values, args.addressWidth)
+  if not grid:
+    sys.exit("No valid cache configurations!")
+  samplingArgs = None
+  if args.sampleSets is not None or args.samplePeriod is not None:
+    samplingArgs = (args.sampleSets, args.samplePeriod, args.sampleWindow, args.sampleWarmup, args.seed)
+    # Checked once here rather than failing in every worker
+    try:
+      makeSampling(Cache(MainMemory(args.addressWidth), *[grid[0][name] for name in SWEEP_FIELDS], False), *samplingArgs)
+    except ValueError as error:
+      sys.exit(str(error))
+    # Optimal replacement's trace of next uses counts every access, skipped ones included
+    if any(policyName(config["replacementPolicy"]) == "optimal" for config in grid):
+      sys.exit("Optimal replacement can't be used with sampling!")
+
+  start = time.perf_counter()
+  try:
+    with openAnyTrace(args.trace) as traceFile:
+      results = runSweep(grid, traceFile, os.path.abspath(args.ramFile), args.addressWidth, args.workers, args.ramImage, samplingArgs)
+  except (OSError, ValueError) as error:
+    sys.exit(str(error))
+
+  writeResults(results, args.output)
+  print("configurations:" + str(len(results)) + " elapsed_seconds:" + "{:.3f}".format(time.perf_counter() - start)
+    + " results:" + args.output)
+
+
+if __name__ == "__main__":
+  main()
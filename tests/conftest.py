@@ -0,0 +1,7 @@
+# The simulator's modules sit at the top of the repository, next to the RAM file the tests load
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+RAM_FILE = os.path.join(REPO_DIR, "input.txt")
@@ -0,0 +1,32 @@
+# Traces and cache state shared by the tests
+import random
+
+from checkpoint import policyState, COUNTER_NAMES
+
+
+# Write a text trace of numAccesses random reads and writes (and a few flushes) over addressWidth bits, returns its path
+def writeTrace(path, numAccesses, addressWidth=8, seed=0, flushes=True):
+  r = random.Random(seed)
+  digits = (addressWidth + 3) // 4
+  with open(path, "w") as f:
+    for i in range(numAccesses):
+      address = r.randrange(2 ** addressWidth)
+      if flushes and r.random() < 0.002:
+        f.write("cache-flush\n")
+      elif r.random() < 0.3:
+        f.write("cache-write 0x" + format(address, "0" + str(digits) + "X") + " 0x" + format(r.randrange(256), "02X") + "\n")
+      else:
+        f.write("cache-read 0x" + format(address, "0" + str(digits) + "X") + "\n")
+  return str(path)
+
+
+# Everything a replay leaves behind: counters, lines, replacement state and the RAM's content
+def cacheState(cache):
+  cache.clearStaleSets()
+  lines = [bytes(cache.tags), bytes(cache.valid), bytes(cache.dirty), bytes(cache.data), bytes(cache.linesInUse)]
+  # A page of zeros reads the same whether it was allocated or not (upper levels of a hierarchy sit on the next level instead)
+  ram = {}
+  if hasattr(cache.ram, "usedPages"):
+    ram = {pageNumber: bytes(cache.ram.readPage(pageNumber, 0, cache.ram.pageSize)) for pageNumber in cache.ram.usedPages()}
+    ram = {pageNumber: page for pageNumber, page in ram.items() if any(page)}
+  return [getattr(cache, name) for name in COUNTER_NAMES], lines, policyState(cache.replacement), cache.lineOf, ram
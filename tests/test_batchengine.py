@@ -0,0 +1,57 @@
+# The NumPy batch engines against one Cache.access per address
+import random
+
+import numpy as np
+import pytest
+
+from cache import Cache
+from mainmemory import MainMemory
+from batchengine import simulateScalar
+from conftest import RAM_FILE
+from helpers import cacheState
+
+
+def makeCache(cacheSize, blockSize, associativity, writeHitPolicy, writeMissPolicy):
+  ram = MainMemory(16)
+  ram.readFromFile(RAM_FILE)
+  return Cache(ram, cacheSize, blockSize, associativity, "least_recently_used", writeHitPolicy, writeMissPolicy, False)
+
+
+# Both caches are warmed up with the same writes (dirty lines before the batch), then run the batch, then flush with write-back
+def compareEngines(config, numAccesses, seed):
+  r = random.Random(seed)
+  warmUp = [(r.randrange(2 ** 16), r.randrange(256)) for i in range(numAccesses // 4)]
+  addresses = np.array([r.randrange(2 ** 16) for i in range(numAccesses)], dtype=np.uint64)
+  ops = np.array([r.random() < 0.3 for i in range(numAccesses)], dtype=np.uint8)
+
+  caches = [makeCache(*config), makeCache(*config)]
+  results = []
+  for cache in caches:
+    for address, value in warmUp:
+      cache.access(address, True, value)
+  results.append(caches[0].simulateBatch(addresses, ops))
+  results.append(simulateScalar(caches[1], addresses, ops))
+
+  assert results[0].hits.tolist() == results[1].hits.tolist()
+  assert (results[0].numHits, results[0].numMisses, results[0].numWriteBacks) == (results[1].numHits, results[1].numMisses, results[1].numWriteBacks)
+  assert cacheState(caches[0]) == cacheState(caches[1])
+  for cache in caches:
+    cache.cacheFlush(True)
+  assert cacheState(caches[0]) == cacheState(caches[1])
+
+
+# Direct-mapped (no per-access loop) and LRU with enough sets for the set-parallel engine
+@pytest.mark.parametrize("config", [(256, 8, 1, 2, 1), (256, 8, 1, 2, 2), (256, 8, 1, 1, 1), (16384, 8, 4, 2, 1), (16384, 8, 4, 2, 2),
+  (16384, 8, 4, 1, 1)])
+@pytest.mark.parametrize("seed", range(3))
+def test_random_trace(config, seed):
+  compareEngines(config, 20000, seed)
+
+
+# A line dirty before the batch, evicted in it and loaded again into the same line: its data still has to reach RAM
+def test_dirty_line_evicted_and_reloaded():
+  cache = makeCache(64, 8, 1, 2, 1)
+  cache.access(0, True, 0x99)
+  cache.simulateBatch(np.array([64, 0], dtype=np.uint64))
+  cache.cacheFlush(True)
+  assert cache.ram.readBlock(0, 1) == b"\x99"
@@ -0,0 +1,45 @@
+# Batch mode of cachesimulator.py run as a command
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR, RAM_FILE
+
+CONFIG = ["--cache-size", "64", "--block-size", "8", "--associativity", "2", "--replacement-policy", "2", "--write-hit-policy", "1",
+  "--write-miss-policy", "1"]
+
+
+def runBatch(traceFile, *flags):
+  return subprocess.run([sys.executable, "cachesimulator.py", RAM_FILE, "--trace", str(traceFile)] + CONFIG + list(flags),
+    cwd=REPO_DIR, capture_output=True, text=True)
+
+
+def test_summary(tmp_path):
+  traceFile = tmp_path / "trace.txt"
+  traceFile.write_text("cache-read 0x10\ncache-write 0x11 0xAB\ncache-read 0x10\n")
+  run = runBatch(traceFile)
+  assert run.returncode == 0
+  assert "number_of_cache_hits:2" in run.stdout
+
+
+# Traces that can't be replayed end the run with a message, not a traceback
+@pytest.mark.parametrize("trace, message", [
+  ("cache-read 0x10\ncache-jump 0x11\n", "Invalid trace command on line 2"),
+  ("cache-read 0x1F0\n", "Address 0x1f0 does not fit in 8 bits"),
+  ("cache-write 0x11 0x1FF\n", "Data 0x1ff does not fit in 8 bits on line 1"),
+])
+def test_bad_trace(tmp_path, trace, message):
+  traceFile = tmp_path / "trace.txt"
+  traceFile.write_text(trace)
+  run = runBatch(traceFile)
+  assert run.returncode == 1
+  assert message in run.stderr
+  assert "Traceback" not in run.stderr
+
+
+def test_missing_trace(tmp_path):
+  run = runBatch(tmp_path / "missing.txt")
+  assert run.returncode == 1
+  assert "No such file" in run.stderr
+  assert "Traceback" not in run.stderr
@@ -0,0 +1,95 @@
+# Checkpoints: restoring and carrying on has to end where an uninterrupted replay does
+import random
+
+import pytest
+
+from cache import Cache
+from hierarchy import CacheHierarchy
+from mainmemory import MainMemory
+from replacement import POLICY_NUMBERS
+from conftest import RAM_FILE
+from helpers import cacheState
+
+CHECKPOINT_POLICIES = [name for name in POLICY_NUMBERS if name != "optimal"]
+
+
+def accesses(seed, numAccesses):
+  r = random.Random(seed)
+  return [(r.randrange(2 ** 12), r.randrange(256) if r.random() < 0.3 else None) for i in range(numAccesses)]
+
+
+def replay(cache, trace):
+  for address, data in trace:
+    cache.access(address, data is not None, data)
+
+
+def makeCache(policy, associativity=4, numSets=1):
+  ram = MainMemory(12)
+  ram.readFromFile(RAM_FILE)
+  return Cache(ram, 8 * associativity * numSets, 8, associativity, policy, 2, 1, False)
+
+
+def levelStates(cache):
+  return [cacheState(level) for level in (cache.levels if hasattr(cache, "levels") else [cache])]
+
+
+def compareWithRestore(makeOne, tmp_path):
+  warmUp = accesses(1, 3000)
+  rest = accesses(2, 3000)
+  uninterrupted = makeOne()
+  replay(uninterrupted, warmUp)
+  uninterrupted.checkpoint(str(tmp_path / "warm.ck"))
+  # Random replacement draws from the module's generator
+  random.seed(0)
+  replay(uninterrupted, rest)
+
+  restored = makeOne()
+  replay(restored, accesses(3, 500))
+  restored.restore(str(tmp_path / "warm.ck"))
+  random.seed(0)
+  replay(restored, rest)
+  assert levelStates(restored) == levelStates(uninterrupted)
+
+
+# numSets 1 and 16: with one set every attribute of a policy is laid out set by set
+@pytest.mark.parametrize("policy", CHECKPOINT_POLICIES)
+@pytest.mark.parametrize("numSets", [1, 16])
+def test_restore_then_continue(tmp_path, policy, numSets):
+  compareWithRestore(lambda: makeCache(policy, 4, numSets), tmp_path)
+
+
+@pytest.mark.parametrize("inclusion", ["non_inclusive", "inclusive", "exclusive"])
+def test_hierarchy(tmp_path, inclusion):
+  def makeHierarchy():
+    ram = MainMemory(12)
+    ram.readFromFile(RAM_FILE)
+    return CacheHierarchy(ram, [(128, 8, 2, "least_recently_used", 2, 1), (512, 8, 4, "adaptive_replacement_cache", 2, 1)], inclusion, False)
+  compareWithRestore(makeHierarchy, tmp_path)
+
+
+def test_statistics_start_over(tmp_path):
+  cache = makeCache("least_recently_used", 2, 4)
+  cache.enableStats()
+  cache.checkpoint(str(tmp_path / "empty.ck"))
+  replay(cache, accesses(1, 200))
+  cache.restore(str(tmp_path / "empty.ck"))
+  assert sum(cache.stats.setMisses) == 0 and cache.stats.numCompulsory == 0
+
+
+def test_mismatched_configuration(tmp_path):
+  makeCache("least_recently_used", 4, 16).checkpoint(str(tmp_path / "lru.ck"))
+  with pytest.raises(ValueError):
+    makeCache("least_recently_used", 2, 16).restore(str(tmp_path / "lru.ck"))
+
+
+# A damaged file is rejected before anything is changed
+def test_truncated(tmp_path):
+  cache = makeCache("adaptive_replacement_cache", 4, 16)
+  replay(cache, accesses(1, 500))
+  cache.checkpoint(str(tmp_path / "arc.ck"))
+  content = (tmp_path / "arc.ck").read_bytes()
+  (tmp_path / "short.ck").write_bytes(content[:len(content) // 2])
+  before = cacheState(cache)
+  with pytest.raises(ValueError):
+    cache.restore(str(tmp_path / "short.ck"))
+  assert cacheState(cache) == before
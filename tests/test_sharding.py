@@ -0,0 +1,43 @@
+# Sharded replay against a serial replay of the same trace
+import pytest
+
+from cache import Cache
+from mainmemory import MainMemory
+from binarytrace import convertTrace
+from tracereader import openTrace
+from replay import openAnyTrace, replayTrace
+from sharding import replaySharded, SHARDABLE_POLICIES
+from conftest import RAM_FILE
+from helpers import writeTrace, cacheState
+
+
+def replayBoth(traceFile, addressWidth, policy, numWorkers=2):
+  states = []
+  for sharded in (False, True):
+    ram = MainMemory(addressWidth)
+    ram.readFromFile(RAM_FILE)
+    cache = Cache(ram, 1024, 16, 4, policy, 2, 1, False)
+    with openAnyTrace(traceFile) as trace:
+      if sharded:
+        numAccesses = replaySharded(cache, trace, numWorkers, RAM_FILE, False, True)
+      else:
+        numAccesses = replayTrace(cache, trace, True)
+    states.append((numAccesses, cacheState(cache)))
+  return states
+
+
+@pytest.mark.parametrize("policy", SHARDABLE_POLICIES)
+def test_text_trace(tmp_path, policy):
+  serial, sharded = replayBoth(writeTrace(tmp_path / "trace.txt", 5000, 8), 8, policy)
+  assert sharded == serial
+
+
+# Binary traces narrower than 64 bits, their address column is read with its own width
+@pytest.mark.parametrize("addressWidth", [8, 16, 32])
+def test_binary_trace(tmp_path, addressWidth):
+  textFile = writeTrace(tmp_path / "trace.txt", 5000, addressWidth)
+  binaryFile = str(tmp_path / "trace.bin")
+  with openTrace(textFile) as trace:
+    convertTrace(trace, binaryFile, addressWidth)
+  serial, sharded = replayBoth(binaryFile, addressWidth, "least_recently_used", 3)
+  assert sharded == serial
@@ -0,0 +1,72 @@
+# sweep.py: configurations it accepts and traces it refuses
+import csv
+import subprocess
+import sys
+
+import pytest
+
+from conftest import REPO_DIR, RAM_FILE
+from binarytrace import BinaryTrace, convertTrace
+from tracereader import openTrace
+from sweep import isValidConfig, loadTrace, checkBinaryTrace
+
+
+def runSweep(tmp_path, trace, *flags):
+  traceFile = tmp_path / "trace.txt"
+  traceFile.write_text(trace)
+  return subprocess.run([sys.executable, "sweep.py", RAM_FILE, "--trace", str(traceFile), "--workers", "1", "--cache-size", "32,64",
+    "--block-size", "8", "--associativity", "2", "--output", str(tmp_path / "results.csv")] + list(flags),
+    cwd=REPO_DIR, capture_output=True, text=True)
+
+
+def config(policy):
+  return {"cacheSize": 64, "blockSize": 8, "associativity": 2, "replacementPolicy": policy, "writeHitPolicy": 1, "writeMissPolicy": 1}
+
+
+def test_valid_config():
+  assert isValidConfig(config(2), 8)
+  assert isValidConfig(config("least_frequently_used"), 8)
+  assert not isValidConfig(config(99), 8)
+  assert not isValidConfig(config("most_recently_fun"), 8)
+
+
+def test_load_trace_range(tmp_path):
+  (tmp_path / "trace.txt").write_text("cache-read 0x10\ncache-read 0x1F0\n")
+  with openTrace(str(tmp_path / "trace.txt")) as traceFile:
+    with pytest.raises(ValueError, match="line 2"):
+      loadTrace(traceFile, 8)
+
+
+def test_binary_trace_range(tmp_path):
+  (tmp_path / "trace.txt").write_text("cache-read 0x10\ncache-write 0x1F0 0x01\n")
+  with openTrace(str(tmp_path / "trace.txt")) as traceFile:
+    convertTrace(traceFile, str(tmp_path / "trace.bin"), 16)
+  with BinaryTrace(str(tmp_path / "trace.bin")) as trace:
+    checkBinaryTrace(trace, 16)
+    with pytest.raises(ValueError, match="0x1f0"):
+      checkBinaryTrace(trace, 8)
+
+
+def test_policy_names(tmp_path):
+  run = runSweep(tmp_path, "cache-read 0x10\ncache-read 0x10\n", "--replacement-policy", "least_recently_used,3")
+  assert run.returncode == 0, run.stderr
+  with open(tmp_path / "results.csv") as f:
+    results = list(csv.DictReader(f))
+  assert [(row["cacheSize"], row["replacementPolicy"], row["hits"]) for row in results] == [
+    ("32", "least_recently_used", "1"), ("32", "least_frequently_used", "1"),
+    ("64", "least_recently_used", "1"), ("64", "least_frequently_used", "1")]
+
+
+# Bad arguments and traces end the sweep with a message, not a traceback
+@pytest.mark.parametrize("trace, flags, message", [
+  ("cache-read 0x1F0\n", [], "Address 0x1f0 does not fit in 8 bits"),
+  ("cache-read 0x10\n", ["--address-width", "4"], "Invalid address width!"),
+  ("cache-read 0x10\n", ["--address-width", "65"], "Invalid address width!"),
+  ("cache-read 0x10\n", ["--replacement-policy", "lru"], "Unknown replacement policy: lru"),
+  ("cache-read 0x10\n", ["--replacement-policy", "42"], "Unknown replacement policy: 42"),
+])
+def test_bad_arguments(tmp_path, trace, flags, message):
+  run = runSweep(tmp_path, trace, *flags)
+  assert run.returncode == 1
+  assert message in run.stderr
+  assert "Traceback" not in run.stderr
@@ -0,0 +1,64 @@
+# Cycle timing model
+import pytest
+
+from cache import Cache
+from hierarchy import CacheHierarchy
+from mainmemory import MainMemory
+from conftest import RAM_FILE
+
+
+def makeCache():
+  ram = MainMemory(8)
+  ram.readFromFile(RAM_FILE)
+  return Cache(ram, 64, 8, 2, "least_recently_used", 2, 1, False)
+
+
+def test_amat_single_level():
+  cache = makeCache()
+  cache.enableTiming([1], 2, 100, 8, 4)
+  cache.access(0x10)
+  cache.access(0x11)
+  # Miss: hit latency, miss penalty, memory latency and one cycle for 8 bytes; then a hit
+  assert cache.timing.cycles == (1 + 2 + 100 + 1) + 1
+  assert cache.timing.readBytes == 8
+
+
+def test_amat_hierarchy():
+  ram = MainMemory(8)
+  ram.readFromFile(RAM_FILE)
+  hierarchy = CacheHierarchy(ram, [(32, 8, 1, 2, 2, 1), (128, 8, 2, 2, 2, 1)], "non_inclusive", False)
+  l1 = hierarchy.levels[0]
+  l1.enableTiming([1, 10], 0, 100, 8, 4)
+  l1.access(0x10)
+  # 0x30 evicts 0x10 from L1 only, so the next access to 0x10 hits in L2
+  l1.access(0x30)
+  l1.access(0x10)
+  assert l1.timing.cycles == 2 * (1 + 10 + 100 + 1) + (1 + 10)
+
+
+# After a restore the counters change without an access, the next access must only count what it did itself
+def test_restore_then_continue(tmp_path):
+  cache = makeCache()
+  cache.enableTiming()
+  cache.access(0x10)
+  cache.checkpoint(str(tmp_path / "warm.ck"))
+  cache.access(0x20)
+  cache.access(0x30)
+  cache.restore(str(tmp_path / "warm.ck"))
+  readBytes = cache.timing.readBytes
+  cache.access(0x40)
+  assert cache.timing.readBytes == readBytes + 8
+
+
+def test_reset_counters():
+  cache = makeCache()
+  cache.enableTiming()
+  cache.access(0x10)
+  cache.resetCounters()
+  cache.access(0x20)
+  assert cache.timing.readBytes == 16
+
+
+def test_invalid_parameters():
+  with pytest.raises(ValueError):
+    makeCache().enableTiming([1], 0, 100, 0, 4)
@@ -0,0 +1,46 @@
+# Parsing and range checks of text traces
+import io
+
+import pytest
+
+from tracereader import readTrace
+from binarytrace import convertTrace, BinaryTrace
+
+
+def parse(text, addressWidth=8):
+  return list(readTrace(io.BytesIO(text.encode()), addressWidth))
+
+
+def test_commands():
+  assert parse("# warm-up\ncache-read 0x10\n\ncache-write 0xFF 0x00\ncache-flush\ncache-write 0x0 0xFF") == [
+    ("cache-read", 0x10, None), ("cache-write", 0xFF, 0), ("cache-flush", None, None), ("cache-write", 0, 0xFF)]
+
+
+@pytest.mark.parametrize("line, message", [
+  ("cache-read 0x100", "Address 0x100 does not fit in 8 bits on line 2"),
+  ("cache-read -0x1", "Address -0x1 does not fit in 8 bits on line 2"),
+  ("cache-write -0x1 0x10", "Address -0x1 does not fit in 8 bits on line 2"),
+  ("cache-write 0x10 0x100", "Data 0x100 does not fit in 8 bits on line 2"),
+  ("cache-write 0x10 -0x1", "Data -0x1 does not fit in 8 bits on line 2"),
+  ("cache-write 0x10", "Invalid trace command on line 2"),
+  ("cache-read 0xZZ", "Invalid trace command on line 2"),
+])
+def test_rejected_line(line, message):
+  with pytest.raises(ValueError, match=message):
+    parse("cache-read 0x00\n" + line + "\n")
+
+
+def test_wider_addresses():
+  assert parse("cache-read 0xFFFF", 16) == [("cache-read", 0xFFFF, None)]
+
+
+def test_convert_checks_records(tmp_path):
+  with pytest.raises(ValueError, match="Data -0x2 does not fit in 8 bits on line 1"):
+    convertTrace(io.BytesIO(b"cache-write 0x10 -0x2\n"), str(tmp_path / "trace.bin"), 8)
+
+
+def test_convert_round_trip(tmp_path):
+  text = "cache-read 0x1234\ncache-flush\ncache-write 0xFFFF 0x7F\n"
+  convertTrace(io.BytesIO(text.encode()), str(tmp_path / "trace.bin"), 16)
+  with BinaryTrace(str(tmp_path / "trace.bin")) as trace:
+    assert list(trace.commands()) == parse(text, 16)
@@ -0,0 +1,137 @@
+'''
+File: timing.py
+
+TimingModel class: cycles of every access of a cache or hierarchy (hit latencies, miss
+penalty, memory latency and bandwidth, a write buffer), AMAT and memory bandwidth
+'''
+
+from mainmemory import MainMemory
+from collections import deque
+
+# Hit latency (cycles) of L1, L2, L3... levels further down take the last one
+HIT_LATENCIES = [1, 10, 30]
+# Cycles added to every miss at every level (detecting the miss and allocating the line)
+MISS_PENALTY = 0
+# Cycles before the first byte read from memory arrives, and bytes the memory moves per cycle
+MEMORY_LATENCY = 100
+MEMORY_BANDWIDTH = 8
+# Writes the write buffer holds
+WRITE_BUFFER_DEPTH = 4
+
+
+class TimingModel:
+  def __init__(self, cache, hitLatencies=HIT_LATENCIES, missPenalty=MISS_PENALTY, memoryLatency=MEMORY_LATENCY,
+      memoryBandwidth=MEMORY_BANDWIDTH, writeBufferDepth=WRITE_BUFFER_DEPTH):
+    if not hitLatencies or min(hitLatencies) < 0 or missPenalty < 0 or memoryLatency < 0 or memoryBandwidth <= 0 or writeBufferDepth < 0:
+      raise ValueError("Latencies and the write buffer depth can't be negative, and the memory bandwidth has to be positive")
+    self.cache = cache
+    # The levels from the cache down to the memory, with their hit latencies
+    self.levels = [cache]
+    while not isinstance(self.levels[-1].ram, MainMemory):
+      self.levels.append(self.levels[-1].ram)
+    self.hitLatencies = [hitLatencies[min(i, len(hitLatencies) - 1)] for i in range(len(self.levels))]
+    self.missPenalty = missPenalty
+    self.memoryLatency = memoryLatency
+    self.memoryBandwidth = memoryBandwidth
+    self.writeBufferDepth = writeBufferDepth
+
+    self.numAccesses = 0
+    self.cycles = 0
+    self.stallCycles = 0
+    self.readBytes = 0
+    self.writeBytes = 0
+    # Cycle each buffered write will be done at, oldest first
+    self.buffer = deque()
+    # The levels' miss counters and the last level's traffic counters, as of the end of the last access
+    self.snapshot = self.counters()
+
+    self.cacheAccess = cache.access
+    cache.access = self.access
+
+
+  # Misses of every level, then the bytes the last level read and wrote
+  def counters(self):
+    last = self.levels[-1]
+    return [level.numMisses for level in self.levels], last.numFillBytes, last.numWriteThroughBytes, last.numWriteBackBytes
+
+
+  # Take the levels' counters as they are now, after they were changed outside of an access (a checkpoint restored, counters reset)
+  def syncCounters(self):
+    self.snapshot = self.counters()
+
+
+  # Cycles the memory takes to move size bytes
+  def transferCycles(self, size):
+    return -(-size // self.memoryBandwidth)
+
+
+  # Same arguments and result as Cache.access
+  def access(self, address, isWrite=False, newByte=None):
+    result = self.cacheAccess(address, isWrite, newByte)
+    oldMisses, oldFill, oldWriteThrough, oldWriteBack = self.snapshot
+    self.snapshot = self.counters()
+    misses, fill, writeThrough, writeBack = self.snapshot
+
+    # Writes reaching the memory are buffered as the access starts, a write-back coming before the fill that caused it
+    for size in (writeBack - oldWriteBack, writeThrough - oldWriteThrough):
+      if size > 0:
+        self.bufferWrite(size)
+
+    cycles = self.hitLatencies[0]
+    if not result.hit:
+      # Down the levels until one hits, or the memory when the last one misses
+      reachedMemory = True
+      for level in range(1, len(self.levels)):
+        cycles += self.missPenalty + self.hitLatencies[level]
+        if misses[level] == oldMisses[level]:
+          reachedMemory = False
+          break
+      readSize = fill - oldFill
+      if reachedMemory and readSize > 0:
+        cycles += self.missPenalty + self.read(readSize)
+    elif fill > oldFill:
+      # Prefetches only keep the memory busy
+      self.read(fill - oldFill)
+
+    self.cycles += cycles
+    self.numAccesses += 1
+    return result
+
+
+  # Read size bytes from memory now, returns the cycles until they have all arrived. Buffered writes not done yet wait for the read
+  def read(self, size):
+    transfer = self.transferCycles(size)
+    self.readBytes += size
+    now = self.cycles
+    self.buffer = deque(done + transfer if done > now else done for done in self.buffer)
+    return self.memoryLatency + transfer
+
+
+  # Put a write of size bytes in the write buffer, waiting for the oldest write to be done when it is full
+  def bufferWrite(self, size):
+    transfer = self.transferCycles(size)
+    self.writeBytes += size
+    buffer = self.buffer
+    if self.writeBufferDepth == 0:
+      self.stall(self.memoryLatency + transfer)
+      return
+    while buffer and buffer[0] <= self.cycles:
+      buffer.popleft()
+    if len(buffer) == self.writeBufferDepth:
+      self.stall(buffer.popleft() - self.cycles)
+    start = max(self.cycles, buffer[-1]) if buffer else self.cycles
+    buffer.append(start + transfer)
+
+
+  def stall(self, cycles):
+    self.cycles += cycles
+    self.stallCycles += cycles
+
+
+  def printReport(self):
+    print("total_cycles:" + str(self.cycles))
+    print("amat_cycles:" + "{:.4f}".format(self.cycles / self.numAccesses if self.numAccesses > 0 else 0.0))
+    print("memory_read_bytes:" + str(self.readBytes))
+    print("memory_write_bytes:" + str(self.writeBytes))
+    print("bandwidth_bytes_per_cycle:" + "{:.4f}".format((self.readBytes + self.writeBytes) / self.cycles if self.cycles > 0 else 0.0))
+    print("write_buffer_stall_cycles:" + str(self.stallCycles))
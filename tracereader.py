@@ -0,0 +1,105 @@
+'''
+File: tracereader.py
+
+Streaming trace input: commands read in large chunks from plain or compressed (gzip, bz2,
+xz, zstd) trace files or stdin, and checked against the address width
+'''
+
+import bz2
+import gzip
+import lzma
+import sys
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+# Bytes read (after decompression) per chunk
+CHUNK_SIZE = 1 << 20
+
+# First bytes of each compressed format
+GZIP_MAGIC = b"\x1f\x8b"
+BZ2_MAGIC = b"BZh"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+# Open a trace file ("-" for stdin) for reading, decompressing it if needed. The result is a binary file object to pass to readTrace
+def openTrace(fileName):
+  if fileName == "-":
+    # Closing the trace must not close stdin itself
+    stream = open(sys.stdin.fileno(), "rb", closefd=False)
+  else:
+    stream = open(fileName, "rb")
+  start = stream.peek(len(XZ_MAGIC))[:len(XZ_MAGIC)]
+
+  if start.startswith(GZIP_MAGIC):
+    return gzip.GzipFile(fileobj=stream)
+  if start.startswith(BZ2_MAGIC):
+    return bz2.BZ2File(stream)
+  if start.startswith(XZ_MAGIC):
+    return lzma.LZMAFile(stream)
+  if start.startswith(ZSTD_MAGIC):
+    if zstandard is None:
+      stream.close()
+      raise ValueError("Reading zstd traces needs the zstandard package (pip install zstandard)")
+    return zstandard.ZstdDecompressor().stream_reader(stream, closefd=True)
+  return stream
+
+
+# The lines of a binary file object, read CHUNK_SIZE bytes at a time: yields the lines of each chunk as lists of bytes
+def readChunks(traceFile):
+  rest = b""
+  while True:
+    chunk = traceFile.read(CHUNK_SIZE)
+    if not chunk:
+      break
+    lines = (rest + chunk).split(b"\n")
+    # The last line may go on in the next chunk
+    rest = lines.pop()
+    yield lines
+  if rest:
+    yield [rest]
+
+
+# Parse the commands of a trace (a binary file object, see openTrace) into (command, address, data) with integer address/data.
+# Flushes come out as ("cache-flush", None, None). Addresses have to fit in addressWidth bits, data in a byte
+def readTrace(traceFile, addressWidth=64):
+  lineNumber = 0
+  addressLimit = 2 ** addressWidth
+
+  for lines in readChunks(traceFile):
+    for line in lines:
+      lineNumber += 1
+      fields = line.split()
+
+      # Skip blank lines and comments
+      if not fields or fields[0].startswith(b"#"):
+        continue
+
+      command = fields[0]
+      problem = "Invalid trace command"
+      try:
+        if command == b"cache-read" and len(fields) == 2:
+          address = int(fields[1], 16)
+          if 0 <= address < addressLimit:
+            yield "cache-read", address, None
+            continue
+          problem = "Address " + hex(address) + " does not fit in " + str(addressWidth) + " bits"
+        elif command == b"cache-write" and len(fields) == 3:
+          address = int(fields[1], 16)
+          data = int(fields[2], 16)
+          if 0 <= address < addressLimit and 0 <= data < 256:
+            yield "cache-write", address, data
+            continue
+          if 0 <= address < addressLimit:
+            problem = "Data " + hex(data) + " does not fit in 8 bits"
+          else:
+            problem = "Address " + hex(address) + " does not fit in " + str(addressWidth) + " bits"
+        elif command == b"cache-flush" and len(fields) == 1:
+          yield "cache-flush", None, None
+          continue
+      except ValueError:
+        pass
+      raise ValueError(problem + " on line " + str(lineNumber) + ": " + line.decode(errors="replace").strip())